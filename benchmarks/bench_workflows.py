@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Times thunder provisioning and teardown workflows against FakeAWS, an
+in-memory AWS stand-in with a fixed latency per API call, and reports the
+wall time and the API calls each one made. No AWS account is needed.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Never talk to a real account, even if credentials are configured
+os.environ["AWS_ACCESS_KEY_ID"] = "benchmark"
+os.environ["AWS_SECRET_ACCESS_KEY"] = "benchmark"
+os.environ.pop("AWS_PROFILE", None)
+os.environ["XDG_CONFIG_HOME"] = tempfile.mkdtemp(prefix="thunder-bench-")
+
+from fake_aws import FakeAWS  # noqa: E402
+from thunder import Thunder, ClientPool, ApiStats  # noqa: E402
+
+REGION = "us-east-1"
+IMAGE_ID = "ami-0benchmark"
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--latency", type=float, default=0.05, help="seconds per API call")
+parser.add_argument("--quick", action="store_true", help="smaller sizes, for CI smoke runs")
+parser.add_argument("-k", "--only", type=str, nargs="*", help="run benchmarks matching these")
+parser.add_argument("--json", type=str, help="also write the results to this file")
+parser.add_argument("-v", "--verbose", action="store_true", help="show thunder logs")
+args = parser.parse_args()
+logging.getLogger("thunder").setLevel(logging.INFO if args.verbose else logging.WARNING)
+
+
+class Bench:
+    """A fake AWS account, a pool whose clients talk to it and a fresh project"""
+
+    _projects = 0
+
+    def __init__(self, latency: float):
+        self.fake = FakeAWS(latency=latency)
+        self.pool = ClientPool(stats=ApiStats())
+        self.fake.install(self.pool.session().events)
+        self.latency = latency
+
+    def thunder(self, **kwargs) -> Thunder:
+        Bench._projects += 1
+        return Thunder(f"bench{Bench._projects}", REGION, pool=self.pool, **kwargs)
+
+    def setup(self, fn):
+        """Runs fn without latency, for preparing state outside of the timed section"""
+        self.fake.latency = 0.0
+        try:
+            return fn()
+        finally:
+            self.fake.latency = self.latency
+
+
+def bench_create_instances(b: Bench, n: int):
+    t = b.thunder()
+    return lambda: t.create_instances(IMAGE_ID, count=(n, n))
+
+
+def bench_create_instances_warm(b: Bench, n: int):
+    t = b.thunder(warm_pool_size=n)
+    # The first call launches everything and fills the pool for the timed one
+    b.setup(lambda: (t.create_instances(IMAGE_ID, count=(n, n)), t.warm_pool.wait()))
+    return lambda: t.create_instances(IMAGE_ID, count=(n, n))
+
+
+def bench_filter_instances(b: Bench, n: int):
+    t = b.thunder()
+    b.setup(lambda: t.create_instances(IMAGE_ID, count=(n, n)))
+    return lambda: list(t.filter_instances())
+
+
+def bench_require_security_group(b: Bench, n: int):
+    t = b.thunder()
+    b.setup(lambda: [t.require_security_group([port]) for port in range(1000, 1000 + n)])
+    # A new object, so nothing is in its in-memory cache
+    fresh = Thunder(t.project_name, REGION, pool=b.pool)
+    ports = list(range(1000, 1000 + n, max(1, n // 20))) + [999]
+    return lambda: [fresh.require_security_group([port]) for port in ports]
+
+
+def bench_delete_project(b: Bench, n: int):
+    t = b.thunder()
+
+    def setup():
+        instances = t.create_instances(IMAGE_ID, count=(n, n))
+        ami_id = t.create_ami(instances[0])
+        lb_name, _ = t.create_load_balancer()
+        lc_name = t.create_launch_config(ami_id)
+        t.create_auto_scaling(lc_name, lb_name)
+
+    b.setup(setup)
+    return lambda: t.delete_project()
+
+
+def bench_apply_unchanged(b: Bench, n: int):
+    t = b.thunder()
+    spec = {
+        "instances": {"image_id": IMAGE_ID, "count": n},
+        "load_balancer": {},
+        "launch_config": {"ami_id": IMAGE_ID},
+        "auto_scaling": {"min_size": 2, "max_size": 10, "desired": 2},
+    }
+    b.setup(lambda: t.apply(spec))
+    return lambda: t.apply(spec)
+
+
+BENCHMARKS = (
+    ("create_instances", bench_create_instances, (1, 10, 50), (1, 5)),
+    ("create_instances_warm", bench_create_instances_warm, (1, 10, 50), (1, 5)),
+    ("filter_instances", bench_filter_instances, (100, 1000, 5000), (100, 1000)),
+    ("require_security_group", bench_require_security_group, (10, 100, 1000), (10, 100)),
+    ("delete_project", bench_delete_project, (1, 10, 100), (1, 10)),
+    ("apply_unchanged", bench_apply_unchanged, (1, 10, 100), (1, 10)),
+)
+
+results = []
+print(f"{'benchmark':<28} {'n':>6} {'wall':>9} {'calls':>6}  top operations")
+for name, fn, sizes, quick_sizes in BENCHMARKS:
+    if args.only and not any(pattern in name for pattern in args.only):
+        continue
+    for n in quick_sizes if args.quick else sizes:
+        b = Bench(args.latency)
+        run = fn(b, n)
+        b.pool.stats.reset()
+
+        start = time.perf_counter()
+        run()
+        wall = time.perf_counter() - start
+
+        snapshot = b.pool.stats.snapshot()
+        calls = {op: s["calls"] for op, s in snapshot.items()}
+        total = sum(calls.values())
+        top = sorted(calls.items(), key=lambda i: -i[1])[:3]
+        top_str = ", ".join(f"{op}={count}" for op, count in top)
+        print(f"{name:<28} {n:>6} {wall:>8.2f}s {total:>6}  {top_str}")
+        results.append({"benchmark": name, "n": n, "wall": wall, "calls": calls})
+
+if args.json:
+    with open(args.json, "w") as f:
+        json.dump({"latency": args.latency, "results": results}, f, indent=2)
@@ -0,0 +1,746 @@
+"""
+In-memory stand-in for the EC2, ELB, ELBv2, autoscaling and CloudWatch APIs used by thunder.
+
+It answers botocore calls from the before-call event, the same mechanism
+botocore's Stubber uses, but keeps real state so polling loops and waiters
+behave like they would against AWS. Every call sleeps latency seconds.
+"""
+import base64
+import binascii
+import datetime
+import itertools
+import threading
+import time
+from collections import Counter
+
+from botocore.awsrequest import AWSResponse
+
+_CONTEXT_KEY = "fake_aws_params"
+
+
+class FakeError(Exception):
+    def __init__(self, code, message=""):
+        super().__init__(code)
+        self.code = code
+        self.message = message
+
+
+class RegionState:
+    """Resources of one region"""
+
+    def __init__(self, name):
+        self.name = name
+        self.instances = {}
+        # Instance id -> start script, printed to the console once booted
+        self.user_data = {}
+        self.key_pairs = {}
+        self.security_groups = {}
+        self.images = {}
+        self.snapshots = {}
+        self.load_balancers = {}
+        # Application and network load balancers, target groups and listeners by ARN
+        self.load_balancers_v2 = {}
+        self.target_groups = {}
+        self.listeners = {}
+        self.launch_configs = {}
+        self.auto_scaling = {}
+        self.launch_templates = {}
+        # (group name, name) -> scaling policy or scheduled action
+        self.policies = {}
+        self.scheduled_actions = {}
+        self.alarms = {}
+
+
+class FakeAWS:
+    def __init__(self, latency=0.0, boot_time=0.0):
+        self.latency = latency
+        # Seconds before a launched instance passes its status checks
+        self.boot_time = boot_time
+        self.calls = Counter()
+        self._lock = threading.RLock()
+        self._ids = itertools.count(1)
+        self._regions = {}
+
+    def region(self, name):
+        with self._lock:
+            state = self._regions.get(name)
+            if state is None:
+                state = self._regions[name] = RegionState(name)
+            return state
+
+    def install(self, events):
+        """Answers every call of the clients created from the session or client owning events"""
+        events.register("before-parameter-build", self._capture, unique_id="fake-aws-capture")
+        events.register("before-call", self._respond, unique_id="fake-aws-respond")
+
+    def _id(self, prefix):
+        return f"{prefix}-{next(self._ids):017x}"
+
+    def _capture(self, params, context, **kwargs):
+        context[_CONTEXT_KEY] = dict(params)
+
+    def _respond(self, model, context, **kwargs):
+        service = model.service_model.service_name
+        handler = getattr(self, f"{service}_{model.name}", None)
+        if handler is None:
+            raise NotImplementedError(f"FakeAWS does not implement {service}.{model.name}")
+
+        with self._lock:
+            self.calls[(service, model.name)] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        try:
+            with self._lock:
+                parsed = handler(self.region(context["client_region"]), context[_CONTEXT_KEY])
+        except FakeError as fe:
+            parsed = {
+                "Error": {"Code": fe.code, "Message": fe.message},
+                "ResponseMetadata": {"HTTPStatusCode": 400, "RetryAttempts": 0},
+            }
+            return AWSResponse(None, 400, {}, None), parsed
+
+        parsed = parsed or {}
+        parsed.setdefault("ResponseMetadata", {"HTTPStatusCode": 200, "RetryAttempts": 0})
+        return AWSResponse(None, 200, {}, None), parsed
+
+    @staticmethod
+    def _tags(params, resource_type):
+        for spec in params.get("TagSpecifications", []):
+            if spec["ResourceType"] == resource_type:
+                return list(spec["Tags"])
+        return []
+
+    @staticmethod
+    def _match(tags, filters, attributes=None):
+        tag_map = {t["Key"]: t["Value"] for t in tags}
+        for f in filters or []:
+            name = f["Name"]
+            if name.startswith("tag:"):
+                if tag_map.get(name[len("tag:") :]) not in f["Values"]:
+                    return False
+            elif attributes is not None and name in attributes:
+                if attributes[name] not in f["Values"]:
+                    return False
+        return True
+
+    @staticmethod
+    def _page(items, params, key, size=1000):
+        size = params.get("MaxResults") or size
+        start = int(params.get("NextToken") or 0)
+        response = {key: items[start : start + size]}
+        if start + size < len(items):
+            response["NextToken"] = str(start + size)
+        return response
+
+    @staticmethod
+    def _marker_page(items, params, key, size=400):
+        """Pages of the APIs using Marker and NextMarker instead of NextToken"""
+        size = params.get("PageSize") or size
+        start = int(params.get("Marker") or 0)
+        response = {key: items[start : start + size]}
+        if start + size < len(items):
+            response["NextMarker"] = str(start + size)
+        return response
+
+    # EC2 instances
+
+    def ec2_RunInstances(self, r, p):
+        launched = []
+        for _ in range(p["MaxCount"]):
+            iid = self._id("i")
+            n = len(r.instances)
+            instance = {
+                "InstanceId": iid,
+                "ImageId": p["ImageId"],
+                "InstanceType": p.get("InstanceType", "m1.small"),
+                "KeyName": p.get("KeyName"),
+                "State": {"Name": "running", "Code": 16},
+                "PublicIpAddress": f"10.{n // 65536 % 256}.{n // 256 % 256}.{n % 256}",
+                "PrivateIpAddress": f"172.16.{n // 256 % 256}.{n % 256}",
+                "Tags": self._tags(p, "instance"),
+                "SecurityGroups": [{"GroupId": g} for g in p.get("SecurityGroupIds", [])],
+                "LaunchTime": time.time(),
+            }
+            r.instances[iid] = instance
+            r.user_data[iid] = p.get("UserData", "")
+            launched.append(instance)
+        return {"Instances": launched, "ReservationId": self._id("r")}
+
+    def _instances(self, r, p):
+        ids = p.get("InstanceIds")
+        if ids:
+            missing = [i for i in ids if i not in r.instances]
+            if missing:
+                raise FakeError("InvalidInstanceID.NotFound", ", ".join(missing))
+        selected = []
+        for instance in r.instances.values():
+            if ids and instance["InstanceId"] not in ids:
+                continue
+            attributes = {"instance-state-name": instance["State"]["Name"]}
+            if self._match(instance["Tags"], p.get("Filters"), attributes):
+                selected.append(instance)
+        return selected
+
+    def ec2_DescribeInstances(self, r, p):
+        response = self._page(self._instances(r, p), p, "Reservations")
+        response["Reservations"] = [{"Instances": [i]} for i in response["Reservations"]]
+        return response
+
+    def ec2_DescribeInstanceStatus(self, r, p):
+        statuses = []
+        for instance in self._instances(r, p):
+            state = instance["State"]["Name"]
+            if state == "running":
+                booted = time.time() - instance["LaunchTime"] >= self.boot_time
+                status = "ok" if booted else "initializing"
+            elif p.get("IncludeAllInstances"):
+                status = "initializing" if state == "pending" else "not-applicable"
+            else:
+                continue
+            statuses.append(
+                {
+                    "InstanceId": instance["InstanceId"],
+                    "InstanceState": instance["State"],
+                    "InstanceStatus": {"Status": status},
+                    "SystemStatus": {"Status": status},
+                }
+            )
+        return {"InstanceStatuses": statuses}
+
+    def ec2_GetConsoleOutput(self, r, p):
+        instance = self._instances(r, {"InstanceIds": [p["InstanceId"]]})[0]
+        output = ""
+        booted = time.time() - instance["LaunchTime"] >= self.boot_time
+        if instance["State"]["Name"] == "running" and booted:
+            output = r.user_data.get(instance["InstanceId"], "")
+            try:
+                output = base64.b64decode(output, validate=True).decode()
+            except (binascii.Error, UnicodeDecodeError):
+                pass
+        # Base64 encoded like the real API, botocore decodes it
+        encoded = base64.b64encode(output.encode()).decode()
+        return {"InstanceId": instance["InstanceId"], "Output": encoded}
+
+    def _set_state(self, r, p, state, code):
+        changes = []
+        for instance in self._instances(r, {"InstanceIds": p["InstanceIds"]}):
+            previous = dict(instance["State"])
+            instance["State"] = {"Name": state, "Code": code}
+            if state == "running" and previous["Name"] != "running":
+                instance["LaunchTime"] = time.time()
+            changes.append(
+                {
+                    "InstanceId": instance["InstanceId"],
+                    "PreviousState": previous,
+                    "CurrentState": instance["State"],
+                }
+            )
+        return changes
+
+    def ec2_TerminateInstances(self, r, p):
+        return {"TerminatingInstances": self._set_state(r, p, "terminated", 48)}
+
+    def ec2_StopInstances(self, r, p):
+        return {"StoppingInstances": self._set_state(r, p, "stopped", 80)}
+
+    def ec2_StartInstances(self, r, p):
+        return {"StartingInstances": self._set_state(r, p, "running", 16)}
+
+    def _taggable(self, r):
+        return (
+            r.instances,
+            r.images,
+            r.snapshots,
+            r.security_groups,
+            r.key_pairs,
+            r.launch_templates,
+        )
+
+    def ec2_CreateTags(self, r, p):
+        keys = {t["Key"] for t in p["Tags"]}
+        for rid in p["Resources"]:
+            for resources in self._taggable(r):
+                if rid in resources:
+                    tags = [t for t in resources[rid]["Tags"] if t["Key"] not in keys]
+                    resources[rid]["Tags"] = tags + list(p["Tags"])
+
+    def ec2_DeleteTags(self, r, p):
+        keys = {t["Key"] for t in p["Tags"]}
+        for rid in p["Resources"]:
+            for resources in self._taggable(r):
+                if rid in resources:
+                    resources[rid]["Tags"] = [
+                        t for t in resources[rid]["Tags"] if t["Key"] not in keys
+                    ]
+
+    def ec2_DescribeTags(self, r, p):
+        kinds = (
+            ("instance", r.instances),
+            ("key-pair", r.key_pairs),
+            ("security-group", r.security_groups),
+            ("image", r.images),
+            ("snapshot", r.snapshots),
+            ("launch-template", r.launch_templates),
+        )
+        found = []
+        for resource_type, resources in kinds:
+            for rid, resource in resources.items():
+                for tag in resource["Tags"]:
+                    values = {
+                        "key": tag["Key"],
+                        "value": tag["Value"],
+                        "resource-type": resource_type,
+                        "resource-id": rid,
+                    }
+                    if all(values.get(f["Name"]) in f["Values"] for f in p.get("Filters", [])):
+                        found.append(
+                            {
+                                "ResourceId": rid,
+                                "ResourceType": resource_type,
+                                "Key": tag["Key"],
+                                "Value": tag["Value"],
+                            }
+                        )
+        return self._page(found, p, "Tags")
+
+    # EC2 key pairs and security groups
+
+    def ec2_CreateKeyPair(self, r, p):
+        if any(k["KeyName"] == p["KeyName"] for k in r.key_pairs.values()):
+            raise FakeError("InvalidKeyPair.Duplicate", p["KeyName"])
+        kid = self._id("key")
+        r.key_pairs[kid] = {
+            "KeyPairId": kid,
+            "KeyName": p["KeyName"],
+            "Tags": self._tags(p, "key-pair"),
+        }
+        return {"KeyPairId": kid, "KeyName": p["KeyName"], "KeyMaterial": "fake key material"}
+
+    def ec2_DescribeKeyPairs(self, r, p):
+        names = p.get("KeyNames")
+        found = [
+            k
+            for k in r.key_pairs.values()
+            if self._match(k["Tags"], p.get("Filters")) and (not names or k["KeyName"] in names)
+        ]
+        if names and len(found) < len(names):
+            raise FakeError("InvalidKeyPair.NotFound", ", ".join(names))
+        return {"KeyPairs": found}
+
+    def ec2_DeleteKeyPair(self, r, p):
+        for kid, key in list(r.key_pairs.items()):
+            if kid == p.get("KeyPairId") or key["KeyName"] == p.get("KeyName"):
+                del r.key_pairs[kid]
+
+    def ec2_CreateSecurityGroup(self, r, p):
+        if any(g["GroupName"] == p["GroupName"] for g in r.security_groups.values()):
+            raise FakeError("InvalidGroup.Duplicate", p["GroupName"])
+        gid = self._id("sg")
+        r.security_groups[gid] = {
+            "GroupId": gid,
+            "GroupName": p["GroupName"],
+            "Tags": self._tags(p, "security-group"),
+            "IpPermissions": [],
+        }
+        return {"GroupId": gid}
+
+    def ec2_AuthorizeSecurityGroupIngress(self, r, p):
+        permissions = r.security_groups[p["GroupId"]]["IpPermissions"]
+        # Like EC2, nothing is added when one of the rules already exists
+        if any(permission in permissions for permission in p["IpPermissions"]):
+            raise FakeError("InvalidPermission.Duplicate", p["GroupId"])
+        permissions += p["IpPermissions"]
+
+    def ec2_DescribeSecurityGroups(self, r, p):
+        found = []
+        for group in r.security_groups.values():
+            attributes = {"group-name": group["GroupName"], "group-id": group["GroupId"]}
+            if self._match(group["Tags"], p.get("Filters"), attributes):
+                found.append(group)
+        return self._page(found, p, "SecurityGroups")
+
+    def ec2_DeleteSecurityGroup(self, r, p):
+        gid = p["GroupId"]
+        if gid not in r.security_groups:
+            raise FakeError("InvalidGroup.NotFound", gid)
+        for instance in r.instances.values():
+            if instance["State"]["Name"] == "terminated":
+                continue
+            if {"GroupId": gid} in instance["SecurityGroups"]:
+                raise FakeError("DependencyViolation", gid)
+        del r.security_groups[gid]
+
+    # EC2 images
+
+    def _register_image(self, r, name, tag_params):
+        ami = self._id("ami")
+        snap = self._id("snap")
+        r.snapshots[snap] = {"SnapshotId": snap, "Tags": self._tags(tag_params, "snapshot")}
+        r.images[ami] = {
+            "ImageId": ami,
+            "Name": name,
+            "State": "available",
+            "Tags": self._tags(tag_params, "image"),
+            "BlockDeviceMappings": [{"DeviceName": "/dev/sda1", "Ebs": {"SnapshotId": snap}}],
+        }
+        return ami
+
+    def ec2_CreateImage(self, r, p):
+        return {"ImageId": self._register_image(r, p["Name"], p)}
+
+    def ec2_CopyImage(self, r, p):
+        return {"ImageId": self._register_image(r, p["Name"], p)}
+
+    @staticmethod
+    def _image_snapshots(image):
+        return [m["Ebs"]["SnapshotId"] for m in image["BlockDeviceMappings"] if "Ebs" in m]
+
+    def ec2_DescribeImages(self, r, p):
+        ids = p.get("ImageIds")
+        for ami in ids or ():
+            if ami not in r.images:
+                raise FakeError("InvalidAMIID.NotFound", ami)
+        filters = p.get("Filters") or []
+        snapshot_ids = [
+            value
+            for f in filters
+            if f["Name"] == "block-device-mapping.snapshot-id"
+            for value in f["Values"]
+        ]
+        return {
+            "Images": [
+                image
+                for image in r.images.values()
+                if (not ids or image["ImageId"] in ids)
+                and self._match(image["Tags"], filters, {"state": image["State"]})
+                and (
+                    not snapshot_ids
+                    or any(sid in snapshot_ids for sid in self._image_snapshots(image))
+                )
+            ]
+        }
+
+    def ec2_DeregisterImage(self, r, p):
+        if r.images.pop(p["ImageId"], None) is None:
+            raise FakeError("InvalidAMIID.NotFound", p["ImageId"])
+
+    def ec2_DeleteSnapshot(self, r, p):
+        if any(p["SnapshotId"] in self._image_snapshots(image) for image in r.images.values()):
+            raise FakeError("InvalidSnapshot.InUse", p["SnapshotId"])
+        r.snapshots.pop(p["SnapshotId"], None)
+
+    # EC2 account metadata
+
+    def ec2_DescribeSubnets(self, r, p):
+        return {
+            "Subnets": [
+                {
+                    "SubnetId": f"subnet-{r.name}-{zone}",
+                    "AvailabilityZone": f"{r.name}{zone}",
+                    "VpcId": f"vpc-{r.name}",
+                    "DefaultForAz": True,
+                }
+                for zone in "abc"
+            ]
+        }
+
+    def ec2_DescribeAvailabilityZones(self, r, p):
+        return {"AvailabilityZones": [{"ZoneName": f"{r.name}{zone}"} for zone in "abc"]}
+
+    # Launch templates
+
+    def ec2_CreateLaunchTemplate(self, r, p):
+        name = p["LaunchTemplateName"]
+        if any(t["LaunchTemplateName"] == name for t in r.launch_templates.values()):
+            raise FakeError("InvalidLaunchTemplateName.AlreadyExistsException", name)
+        lt_id = self._id("lt")
+        r.launch_templates[lt_id] = {
+            "LaunchTemplateId": lt_id,
+            "LaunchTemplateName": name,
+            "LatestVersionNumber": 1,
+            "Data": p["LaunchTemplateData"],
+            "Tags": self._tags(p, "launch-template"),
+        }
+        return {"LaunchTemplate": self._template_summary(r.launch_templates[lt_id])}
+
+    def ec2_DeleteLaunchTemplate(self, r, p):
+        template = r.launch_templates.pop(p["LaunchTemplateId"], None)
+        if template is None:
+            raise FakeError("InvalidLaunchTemplateId.NotFound", p["LaunchTemplateId"])
+        return {"LaunchTemplate": self._template_summary(template)}
+
+    @staticmethod
+    def _template_summary(template):
+        return {k: v for k, v in template.items() if k != "Data"}
+
+    # Classic load balancers
+
+    def elb_CreateLoadBalancer(self, r, p):
+        name = p["LoadBalancerName"]
+        r.load_balancers[name] = {
+            "LoadBalancerName": name,
+            "DNSName": f"{name}.{r.name}.elb.amazonaws.com",
+            "Subnets": p.get("Subnets", []),
+            "SecurityGroups": p.get("SecurityGroups", []),
+            "Tags": p.get("Tags", []),
+        }
+        return {"DNSName": r.load_balancers[name]["DNSName"]}
+
+    def elb_DescribeLoadBalancers(self, r, p):
+        names = p.get("LoadBalancerNames")
+        if names:
+            missing = [n for n in names if n not in r.load_balancers]
+            if missing:
+                raise FakeError("LoadBalancerNotFound", ", ".join(missing))
+            found = [r.load_balancers[n] for n in names]
+        else:
+            found = list(r.load_balancers.values())
+        descriptions = [{k: v for k, v in lb.items() if k != "Tags"} for lb in found]
+        return {"LoadBalancerDescriptions": descriptions}
+
+    def elb_DescribeTags(self, r, p):
+        for name in p["LoadBalancerNames"]:
+            if name not in r.load_balancers:
+                raise FakeError("LoadBalancerNotFound", name)
+        return {
+            "TagDescriptions": [
+                {"LoadBalancerName": name, "Tags": r.load_balancers[name]["Tags"]}
+                for name in p["LoadBalancerNames"]
+            ]
+        }
+
+    def elb_DeleteLoadBalancer(self, r, p):
+        r.load_balancers.pop(p["LoadBalancerName"], None)
+
+    # Application and network load balancers
+
+    def _arn(self, r, kind, name):
+        suffix = self._id("x")[2:]
+        return f"arn:aws:elasticloadbalancing:{r.name}:000000000000:{kind}/{name}/{suffix}"
+
+    def elbv2_CreateLoadBalancer(self, r, p):
+        if any(lb["LoadBalancerName"] == p["Name"] for lb in r.load_balancers_v2.values()):
+            raise FakeError("DuplicateLoadBalancerName", p["Name"])
+        kind = "app" if p.get("Type", "application") == "application" else "net"
+        arn = self._arn(r, f"loadbalancer/{kind}", p["Name"])
+        r.load_balancers_v2[arn] = {
+            "LoadBalancerArn": arn,
+            "LoadBalancerName": p["Name"],
+            "DNSName": f"{p['Name']}.{r.name}.elb.amazonaws.com",
+            "Type": p.get("Type", "application"),
+            "Scheme": p.get("Scheme", "internet-facing"),
+            "State": {"Code": "active"},
+            "SecurityGroups": p.get("SecurityGroups", []),
+            "AvailabilityZones": [{"SubnetId": subnet} for subnet in p.get("Subnets", [])],
+            "Tags": p.get("Tags", []),
+            "Attributes": {},
+        }
+        return {"LoadBalancers": [self._untagged(r.load_balancers_v2[arn])]}
+
+    @staticmethod
+    def _untagged(resource):
+        return {k: v for k, v in resource.items() if k not in ("Tags", "Attributes")}
+
+    def _find_v2(self, items, arns, code):
+        missing = [arn for arn in arns if arn not in items]
+        if missing:
+            raise FakeError(code, ", ".join(missing))
+        return [items[arn] for arn in arns]
+
+    def elbv2_DescribeLoadBalancers(self, r, p):
+        if p.get("LoadBalancerArns"):
+            arns = p["LoadBalancerArns"]
+            found = self._find_v2(r.load_balancers_v2, arns, "LoadBalancerNotFound")
+        else:
+            found = list(r.load_balancers_v2.values())
+        found = [self._untagged(lb) for lb in found]
+        return self._marker_page(found, p, "LoadBalancers")
+
+    def elbv2_DeleteLoadBalancer(self, r, p):
+        arn = p["LoadBalancerArn"]
+        r.load_balancers_v2.pop(arn, None)
+        for listener_arn in [a for a, l in r.listeners.items() if l["LoadBalancerArn"] == arn]:
+            del r.listeners[listener_arn]
+        for tg in r.target_groups.values():
+            tg["LoadBalancerArns"] = [a for a in tg["LoadBalancerArns"] if a != arn]
+
+    def elbv2_CreateTargetGroup(self, r, p):
+        arn = self._arn(r, "targetgroup", p["Name"])
+        r.target_groups[arn] = dict(
+            p, TargetGroupArn=arn, TargetGroupName=p["Name"], LoadBalancerArns=[], Attributes={}
+        )
+        del r.target_groups[arn]["Name"]
+        return {"TargetGroups": [self._untagged(r.target_groups[arn])]}
+
+    def elbv2_DescribeTargetGroups(self, r, p):
+        if p.get("TargetGroupArns"):
+            found = self._find_v2(r.target_groups, p["TargetGroupArns"], "TargetGroupNotFound")
+        else:
+            found = list(r.target_groups.values())
+        return self._marker_page([self._untagged(tg) for tg in found], p, "TargetGroups")
+
+    def elbv2_ModifyTargetGroupAttributes(self, r, p):
+        (tg,) = self._find_v2(r.target_groups, [p["TargetGroupArn"]], "TargetGroupNotFound")
+        tg["Attributes"].update((a["Key"], a["Value"]) for a in p["Attributes"])
+        return {"Attributes": [{"Key": k, "Value": v} for k, v in tg["Attributes"].items()]}
+
+    def elbv2_DeleteTargetGroup(self, r, p):
+        arn = p["TargetGroupArn"]
+        in_use = any(
+            action.get("TargetGroupArn") == arn
+            for listener in r.listeners.values()
+            for action in listener["DefaultActions"]
+        ) or any(arn in g.get("TargetGroupARNs", []) for g in r.auto_scaling.values())
+        if in_use:
+            raise FakeError("ResourceInUse", arn)
+        r.target_groups.pop(arn, None)
+
+    def elbv2_CreateListener(self, r, p):
+        (lb,) = self._find_v2(r.load_balancers_v2, [p["LoadBalancerArn"]], "LoadBalancerNotFound")
+        if any(
+            l["LoadBalancerArn"] == lb["LoadBalancerArn"] and l["Port"] == p["Port"]
+            for l in r.listeners.values()
+        ):
+            raise FakeError("DuplicateListener", str(p["Port"]))
+        arn = self._arn(r, "listener", lb["LoadBalancerName"])
+        r.listeners[arn] = dict(p, ListenerArn=arn)
+        for action in p["DefaultActions"]:
+            tg = r.target_groups[action["TargetGroupArn"]]
+            tg["LoadBalancerArns"].append(lb["LoadBalancerArn"])
+        return {"Listeners": [r.listeners[arn]]}
+
+    def elbv2_DescribeTags(self, r, p):
+        resources = dict(r.load_balancers_v2, **r.target_groups)
+        for arn in p["ResourceArns"]:
+            if arn not in resources:
+                code = "TargetGroupNotFound" if ":targetgroup/" in arn else "LoadBalancerNotFound"
+                raise FakeError(code, arn)
+        return {
+            "TagDescriptions": [
+                {"ResourceArn": arn, "Tags": resources[arn]["Tags"]}
+                for arn in p["ResourceArns"]
+            ]
+        }
+
+    # Auto scaling
+
+    def autoscaling_CreateLaunchConfiguration(self, r, p):
+        r.launch_configs[p["LaunchConfigurationName"]] = dict(p)
+
+    def autoscaling_DescribeLaunchConfigurations(self, r, p):
+        names = p.get("LaunchConfigurationNames")
+        found = [lc for name, lc in r.launch_configs.items() if not names or name in names]
+        return {"LaunchConfigurations": found}
+
+    def autoscaling_DeleteLaunchConfiguration(self, r, p):
+        name = p["LaunchConfigurationName"]
+        if any(g.get("LaunchConfigurationName") == name for g in r.auto_scaling.values()):
+            raise FakeError("ResourceInUse", name)
+        r.launch_configs.pop(name, None)
+
+    def autoscaling_CreateAutoScalingGroup(self, r, p):
+        group = dict(p)
+        group.setdefault("DesiredCapacity", p["MinSize"])
+        group["Tags"] = [dict(t, ResourceId=p["AutoScalingGroupName"]) for t in p.get("Tags", [])]
+        r.auto_scaling[p["AutoScalingGroupName"]] = group
+
+    def autoscaling_DescribeAutoScalingGroups(self, r, p):
+        names = p.get("AutoScalingGroupNames")
+        found = [
+            group
+            for name, group in r.auto_scaling.items()
+            if (not names or name in names) and self._match(group["Tags"], p.get("Filters"))
+        ]
+        return {"AutoScalingGroups": found}
+
+    def _group(self, r, p):
+        name = p["AutoScalingGroupName"]
+        if name not in r.auto_scaling:
+            raise FakeError("ValidationError", f"AutoScalingGroup name not found - {name}")
+        return r.auto_scaling[name]
+
+    def autoscaling_UpdateAutoScalingGroup(self, r, p):
+        self._group(r, p).update(p)
+
+    def autoscaling_AttachLoadBalancers(self, r, p):
+        group = self._group(r, p)
+        names = group.get("LoadBalancerNames", [])
+        group["LoadBalancerNames"] = names + [n for n in p["LoadBalancerNames"] if n not in names]
+
+    def autoscaling_DetachLoadBalancers(self, r, p):
+        group = self._group(r, p)
+        names = group.get("LoadBalancerNames", [])
+        group["LoadBalancerNames"] = [n for n in names if n not in p["LoadBalancerNames"]]
+
+    def autoscaling_DeleteAutoScalingGroup(self, r, p):
+        name = r.auto_scaling.pop(p["AutoScalingGroupName"], {}).get("AutoScalingGroupName")
+        for items in (r.policies, r.scheduled_actions):
+            for key in [key for key in items if key[0] == name]:
+                del items[key]
+
+    def autoscaling_PutScalingPolicy(self, r, p):
+        self._group(r, p)
+        key = (p["AutoScalingGroupName"], p["PolicyName"])
+        arn = f"arn:aws:autoscaling:{r.name}:000000000000:scalingPolicy:{key[0]}:{key[1]}"
+        policy = dict(p, PolicyARN=arn, Alarms=[])
+        if p["PolicyType"] == "TargetTrackingScaling":
+            # Alarms of target tracking policies are managed by AWS
+            policy["Alarms"] = [
+                {"AlarmName": f"TargetTracking-{key[0]}-{suffix}"} for suffix in ("High", "Low")
+            ]
+        r.policies[key] = policy
+        return {"PolicyARN": arn, "Alarms": policy["Alarms"]}
+
+    def autoscaling_DescribePolicies(self, r, p):
+        found = [
+            policy
+            for (group, name), policy in r.policies.items()
+            if group == p.get("AutoScalingGroupName", group)
+            and (not p.get("PolicyNames") or name in p["PolicyNames"])
+        ]
+        return self._page(found, p, "ScalingPolicies", size=50)
+
+    def autoscaling_DeletePolicy(self, r, p):
+        key = (p["AutoScalingGroupName"], p["PolicyName"])
+        if key not in r.policies:
+            raise FakeError("ValidationError", f"Policy {key[1]} not found")
+        del r.policies[key]
+
+    def autoscaling_PutScheduledUpdateGroupAction(self, r, p):
+        self._group(r, p)
+        action = dict(p)
+        # Described back in UTC to the second, like the real API
+        for key in ("StartTime", "EndTime"):
+            if isinstance(action.get(key), datetime.datetime):
+                value = action[key]
+                if value.tzinfo is None:
+                    value = value.replace(tzinfo=datetime.timezone.utc)
+                action[key] = value.astimezone(datetime.timezone.utc).replace(microsecond=0)
+        r.scheduled_actions[(p["AutoScalingGroupName"], p["ScheduledActionName"])] = action
+
+    def autoscaling_DescribeScheduledActions(self, r, p):
+        found = [
+            action
+            for (group, _), action in r.scheduled_actions.items()
+            if group == p.get("AutoScalingGroupName", group)
+        ]
+        return self._page(found, p, "ScheduledUpdateGroupActions", size=50)
+
+    def autoscaling_DeleteScheduledAction(self, r, p):
+        key = (p["AutoScalingGroupName"], p["ScheduledActionName"])
+        if key not in r.scheduled_actions:
+            raise FakeError("ValidationError", f"Scheduled action {key[1]} not found")
+        del r.scheduled_actions[key]
+
+    # CloudWatch
+
+    def cloudwatch_PutMetricAlarm(self, r, p):
+        r.alarms[p["AlarmName"]] = dict(p)
+
+    def cloudwatch_DeleteAlarms(self, r, p):
+        missing = [name for name in p["AlarmNames"] if name not in r.alarms]
+        if missing:
+            raise FakeError("ResourceNotFound", ", ".join(missing))
+        for name in p["AlarmNames"]:
+            del r.alarms[name]
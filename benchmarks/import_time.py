@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""Measures how long importing thunder takes, using python -X importtime"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+parser = argparse.ArgumentParser()
+parser.add_argument("-m", "--module", type=str, default="thunder")
+parser.add_argument("-n", "--runs", type=int, default=10)
+parser.add_argument("-t", "--top", type=int, default=10, help="slowest imports to show")
+parser.add_argument("--max-ms", type=float, help="exit with 1 if the median is above this")
+parser.add_argument(
+    "--forbid",
+    type=str,
+    nargs="*",
+    default=["boto3", "botocore"],
+    help="exit with 1 if importing the module imports any of these",
+)
+args = parser.parse_args()
+
+
+def import_times(module):
+    """Returns {module: (self us, cumulative us)} for one fresh interpreter"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        stderr=subprocess.PIPE,
+        check=True,
+        universal_newlines=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+runs = [import_times(args.module) for _ in range(args.runs)]
+totals = [run[args.module][1] / 1000 for run in runs]
+median = statistics.median(totals)
+
+print(f"import {args.module}: median {median:.1f}ms, min {min(totals):.1f}ms over {args.runs} runs")
+
+last = runs[-1]
+print("Slowest imports (cumulative, last run):")
+for name, (self_us, cumulative_us) in sorted(last.items(), key=lambda i: -i[1][1])[: args.top]:
+    print(f"  {cumulative_us / 1000:8.1f}ms {self_us / 1000:8.1f}ms  {name}")
+
+status = 0
+forbidden = [name for name in args.forbid if name in last]
+if forbidden:
+    print(f"import {args.module} imports {', '.join(forbidden)}")
+    status = 1
+if args.max_ms is not None and median > args.max_ms:
+    print(f"Median {median:.1f}ms is above the limit of {args.max_ms:.1f}ms")
+    status = 1
+
+sys.exit(status)
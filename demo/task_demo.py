@@ -4,7 +4,8 @@ import argparse
 import os
 import sys
 
-import thunder
+from thunder.paths import get_data_path, project_path
+from thunder.state import StateStore, LOAD_BALANCER
 from requests_toolbelt import sessions
 
 parser = argparse.ArgumentParser()
@@ -23,44 +24,44 @@ args = parser.parse_args()
 # print(args)
 
 pname = f"{args.region}_{args.project_name}"
-thunder_path = thunder.Thunder.get_data_path()
-proj_path = os.path.join(thunder_path, pname)
+thunder_path = get_data_path()
+proj_path = project_path(args.region, args.project_name)
 
 if not os.path.isdir(proj_path):
     print(f"Directory {pname} not found in {thunder_path}")
     sys.exit(1)
 
-lb_path = os.path.join(proj_path, "lb")
-if not os.path.isdir(lb_path):
-    print(f"Directory {lb_path} does not exist")
+# Read only, migrating the state of older versions is left to Thunder
+try:
+    state = StateStore(proj_path, readonly=True)
+except FileNotFoundError:
+    print(f"No state found in {proj_path}, use the project with thunder first")
     sys.exit(1)
-
-lbs = os.listdir(lb_path)
+lbs = state.ids(LOAD_BALANCER)
 if len(lbs) == 0:
-    print(f"No load balancers found in directory {lb_path}")
+    print(f"No load balancers found in project {pname}")
     sys.exit(1)
 elif len(lbs) == 1:
     lb = lbs[0]
 else:
     if args.load_balancer:
         if args.load_balancer in lbs:
-            lb = lbs.index(args.load_balancer)
+            lb = args.load_balancer
         else:
             print(
-                f"Found multiple load balancers in directory {lb_path}",
+                f"Found multiple load balancers in project {pname}",
                 f"which do not match argument --load-balancer {args.load_balancer}",
             )
             sys.exit(2)
 
     else:
         print(
-            f"Multiple load balancers found in directory {lb_path} and",
+            f"Multiple load balancers found in project {pname} and",
             "--load-balancer not specified",
         )
         sys.exit(1)
 
-with open(os.path.join(lb_path, lb), "r") as f:
-    url = f.read()
+url = state.get(LOAD_BALANCER, lb)["dns_name"]
 
 # print(url)
 base_url = f"http://{url}:8080/"
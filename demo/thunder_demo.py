@@ -1,8 +1,11 @@
 #!/usr/bin/env python3
 
 import argparse
+import logging
 from thunder import Thunder
 
+logging.getLogger("thunder").setLevel(logging.INFO)
+
 parser = argparse.ArgumentParser()
 parser.add_argument("-d", "--delete", action="store_true")
 
@@ -21,12 +24,10 @@ else:
     with open("django.sh", "r") as f:
         django_script_data = f.read().replace("IP_PLACEHOLDER", postgres_instance.public_ip_address)
 
-    django_instance = t1.create_instance(
+    # Reuses the AMI of a previous run if the script did not change
+    ami_id = t1.build_ami(
         "ami-0817d428a6fb68645", start_script_data=django_script_data, tcp_ports=[22, 8080]
     )
-
-    ami_id = t1.create_ami(django_instance)
-    t1.terminate_instance(django_instance)
     lb_name, lb_dnsname = t1.create_load_balancer()
     lc_name = t1.create_launch_config(ami_id)
     as_name = t1.create_auto_scaling(lc_name, lb_name)
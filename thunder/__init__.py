@@ -1,4 +1,35 @@
 from .version import __version__
 from .thunder import Thunder
+from .clients import ClientPool
+from .metrics import ApiStats
+from .ratelimit import RateLimiter
+from .fleet import ThunderFleet, FleetResult
+from .records import InstanceRecord, TerminationOutcome, ResourceRecord
+from .inventory import Inventory
+from .spec import Change
+from .readiness import Probe, StatusOk, Running, TcpPort, HttpHealth, UserDataMarker
+from .scaling import ScalingGroup, TargetTracking, StepScaling, Scheduled
 
-__all__ = ["Thunder"]
+__all__ = [
+    "Thunder",
+    "ClientPool",
+    "ApiStats",
+    "RateLimiter",
+    "ThunderFleet",
+    "FleetResult",
+    "InstanceRecord",
+    "TerminationOutcome",
+    "ResourceRecord",
+    "Inventory",
+    "Change",
+    "Probe",
+    "StatusOk",
+    "Running",
+    "TcpPort",
+    "HttpHealth",
+    "UserDataMarker",
+    "ScalingGroup",
+    "TargetTracking",
+    "StepScaling",
+    "Scheduled",
+]
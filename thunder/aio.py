@@ -0,0 +1,328 @@
+from typing import Optional, Dict, List, Any, Awaitable, Callable, Iterable, Iterator, Tuple
+from typing import TypeVar
+import asyncio
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+
+from .polling import Backoff, Steps, Wait
+from .readiness import Probe, StatusOk
+from .inventory import Inventory
+from .records import TerminationOutcome
+from .tasks import TaskResult
+from .state import SECURITY_GROUP, LOAD_BALANCER
+from .thunder import Thunder, _DELETE_STAGES
+
+logger = logging.getLogger("thunder")
+
+T = TypeVar("T")
+AsyncTask = Tuple[Callable[[], Awaitable[Any]], Iterable[str]]
+
+
+async def async_poll(
+    probe: Callable[[], Awaitable[T]], backoff: Backoff, description: str = "condition"
+) -> T:
+    """
+    poll for coroutines: awaits probe following backoff until it returns a
+    truthy value, which is returned. Delays are asyncio sleeps.
+    """
+    for delay in backoff.sleeps(description):
+        if delay > 0:
+            await asyncio.sleep(delay)
+        result = await probe()
+        if result:
+            return result
+
+
+async def _run_task(
+    name: str, fn: Callable[[], Awaitable[Any]], deps: List["asyncio.Future[TaskResult]"]
+) -> TaskResult:
+    results = [await dep for dep in deps]
+    if not all(result.ok for result in results):
+        return TaskResult(name, skipped=True)
+    start = time.monotonic()
+    try:
+        result = await fn()
+    except Exception as e:
+        return TaskResult(name, error=e, elapsed=time.monotonic() - start)
+    return TaskResult(name, result=result, elapsed=time.monotonic() - start)
+
+
+async def run_graph_async(tasks: Dict[str, AsyncTask]) -> Dict[str, TaskResult]:
+    """
+    run_graph for coroutine functions, which all run on the current event loop.
+    A task starts once all its dependencies succeeded and is skipped if any of
+    them failed. Returns the result of every task.
+    """
+    order: List[str] = []
+    visiting: List[str] = []
+
+    def visit(name: str):
+        if name in order:
+            return
+        if name in visiting:
+            raise ValueError(f"Dependency cycle between tasks {', '.join(visiting)}")
+        visiting.append(name)
+        for dep in tasks[name][1]:
+            if dep not in tasks:
+                raise ValueError(f"Task {name} depends on unknown task {dep}")
+            visit(dep)
+        visiting.remove(name)
+        order.append(name)
+
+    for name in tasks:
+        visit(name)
+
+    futures: Dict[str, "asyncio.Future[TaskResult]"] = {}
+    for name in order:
+        fn, deps = tasks[name]
+        futures[name] = asyncio.ensure_future(
+            _run_task(name, fn, [futures[dep] for dep in deps])
+        )
+    return {name: await future for name, future in futures.items()}
+
+
+class AsyncThunder:
+    """
+    asyncio front end of a Thunder. AWS calls run on a pool of workers threads
+    and every wait is an asyncio sleep following the backoff schedules of the
+    Thunder, so threads are only busy during calls and one event loop can drive
+    many provisioning flows at once. Operations share the steps of Thunder, only
+    their waits differ. Not imported by thunder itself, to keep asyncio out of
+    its import time.
+    """
+
+    # Threads making the AWS calls of every coroutine of this object
+    workers: int = 32
+    thunder: Thunder
+
+    def __init__(self, thunder: Thunder, executor: Optional[Executor] = None):
+        self.thunder = thunder
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"AsyncThunder({self.thunder})"
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def close(self):
+        """Shuts down the thread pool, unless it was given to the constructor"""
+        with self._lock:
+            if self._owns_executor and self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    async def _call(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Runs the blocking fn on the thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._get_executor(), functools.partial(fn, *args, **kwargs)
+        )
+
+    def _poll(self, wait: Wait) -> Awaitable[Any]:
+        """async_poll of a Wait, each attempt of its blocking probe runs on the thread pool"""
+        return async_poll(lambda: self._call(wait.probe), wait.backoff, wait.description)
+
+    async def _run_steps(self, steps: "Steps[T]") -> T:
+        """
+        thunder.polling.run_steps on the event loop: the steps run on the thread
+        pool and their waits are awaited, errors of a wait are raised in steps
+        """
+
+        def advance(error: Optional[Exception]) -> Tuple[bool, Any]:
+            # StopIteration cannot cross a future, it is returned as (done, value)
+            try:
+                return False, next(steps) if error is None else steps.throw(error)
+            except StopIteration as stop:
+                return True, stop.value
+
+        done, value = await self._call(advance, None)
+        while not done:
+            try:
+                await self._poll(value)
+            except Exception as e:
+                done, value = await self._call(advance, e)
+            else:
+                done, value = await self._call(advance, None)
+        return value
+
+    async def create_instances(
+        self,
+        image_id: str,
+        start_script_data: Optional[str] = None,
+        start_script: Optional[str] = None,
+        itype: str = "t2.micro",
+        tcp_ports: Iterator[int] = (22,),
+        udp_ports: Iterator[int] = tuple(),
+        count: Iterator[int] = (1, 1),
+        tags: Optional[List[Dict[str, str]]] = None,
+        readiness: Optional[Probe] = None,
+    ) -> List[Any]:
+        """
+        Thunder.create_instances. Instances are waited for with readiness, EC2
+        status checks following thunder.instance_backoff by default.
+        """
+        thunder = self.thunder
+        instances = await self._call(
+            thunder._acquire_instances,
+            image_id,
+            start_script_data,
+            start_script,
+            itype,
+            tcp_ports,
+            udp_ports,
+            count,
+            tags,
+        )
+        readiness = readiness or StatusOk(backoff=thunder.instance_backoff)
+        logger.info(
+            "%s - Waiting until %d instances are %s",
+            thunder,
+            len(instances),
+            readiness.description,
+        )
+        await self._poll(readiness.until_ready(thunder, instances))
+        await self._call(thunder._reload_instances, instances)
+        thunder._log_addresses(instances)
+        return instances
+
+    async def filter_instances(
+        self,
+        instance_status: Optional[str] = "running",
+        custom_filters: Optional[List[Dict[str, Any]]] = None,
+        resources: bool = False,
+        page_size: Optional[int] = None,
+        warm_pool: bool = False,
+    ) -> List[Any]:
+        """Thunder.filter_instances, as a list"""
+        return await self._call(
+            lambda: list(
+                self.thunder.filter_instances(
+                    instance_status, custom_filters, resources, page_size, warm_pool
+                )
+            )
+        )
+
+    async def create_ami(self, instance) -> str:
+        """Thunder.create_ami, polling the image following thunder.image_backoff"""
+        ami_id, _ = await self._run_steps(self.thunder._create_ami_steps(instance.id, None))
+        return ami_id
+
+    async def create_load_balancer(
+        self,
+        tcp_ports: Iterator[int] = (8080,),
+        udp_ports: Iterator[int] = tuple(),
+    ) -> Tuple[str, str]:
+        """Thunder.create_load_balancer"""
+        return await self._run_steps(
+            self.thunder._create_load_balancer_steps(tcp_ports, udp_ports)
+        )
+
+    async def create_auto_scaling(
+        self,
+        lc_name: Optional[str],
+        lb_name: Optional[str] = None,
+        min_size: int = 2,
+        max_size: int = 10,
+        desired: int = 2,
+        lt_id: Optional[str] = None,
+        itypes: Optional[List[str]] = None,
+        on_demand_base: int = 0,
+        on_demand_percentage: int = 100,
+        spot_strategy: str = "price-capacity-optimized",
+        target_group_arns: Optional[List[str]] = None,
+        health_check_grace: int = 60,
+    ) -> str:
+        """Thunder.create_auto_scaling"""
+        return await self._run_steps(
+            self.thunder._create_auto_scaling_steps(
+                lc_name,
+                lb_name,
+                min_size,
+                max_size,
+                desired,
+                lt_id,
+                itypes,
+                on_demand_base,
+                on_demand_percentage,
+                spot_strategy,
+                target_group_arns,
+                health_check_grace,
+            )
+        )
+
+    async def terminate_instances(self, instance_ids: List[str]) -> List[TerminationOutcome]:
+        """Thunder.terminate_instances"""
+        return await self._run_steps(self.thunder._terminate_instances_steps(instance_ids))
+
+    async def terminate_all_instances(
+        self, instance_status: Optional[str] = None, inventory: Optional[Inventory] = None
+    ) -> List[TerminationOutcome]:
+        """Thunder.terminate_all_instances"""
+        instance_ids = await self._call(self.thunder._terminable_ids, instance_status, inventory)
+        if not instance_ids:
+            return []
+        return await self.terminate_instances(instance_ids)
+
+    async def delete_project(self, folders=False) -> Dict[str, float]:
+        """
+        Thunder.delete_project, stages run concurrently as coroutines and the
+        security groups still in use are retried concurrently.
+        """
+        thunder = self.thunder
+        if thunder.warm_pool is not None:
+            # Instances still being added to the pool would be left behind
+            await self._call(thunder.warm_pool.wait)
+        inventory = await self._call(thunder.inventory)
+        deleters: Dict[str, Callable[[], Awaitable[Any]]] = {
+            "auto_scaling": lambda: self._run_steps(
+                thunder._delete_all_auto_scaling_steps(inventory)
+            ),
+            "launch_configs": lambda: self._delete_known(
+                thunder._delete_launch_configs_steps, thunder._known_launch_configs, inventory
+            ),
+            "launch_templates": lambda: self._call(
+                thunder.delete_all_launch_templates, inventory
+            ),
+            "load_balancers": lambda: self._delete_known(
+                thunder._delete_load_balancers_steps, thunder._known_ids, LOAD_BALANCER, inventory
+            ),
+            "load_balancers_v2": lambda: self._run_steps(
+                thunder._delete_all_load_balancers_v2_steps(inventory)
+            ),
+            "amis": lambda: self._call(thunder.delete_all_amis, inventory),
+            "snapshots": lambda: self._call(thunder.delete_all_snapshots, inventory),
+            "instances": lambda: self.terminate_all_instances(inventory=inventory),
+            "key_pairs": lambda: self._call(thunder.delete_all_key_pairs, inventory),
+            "security_groups": lambda: self._delete_security_groups(inventory),
+        }
+        results = await run_graph_async(
+            {name: (deleters[name], deps) for name, deps in _DELETE_STAGES.items()}
+        )
+        return await self._call(thunder._deleted_project, results, folders)
+
+    async def _delete_known(
+        self, delete: Callable[[List[str]], "Steps[Any]"], known: Callable[..., List[str]], *args
+    ):
+        """Runs the steps of delete for the ids returned by known(*args)"""
+        ids = await self._call(known, *args)
+        return await self._run_steps(delete(ids))
+
+    async def _delete_security_groups(self, inventory: Inventory):
+        """Thunder.delete_all_security_groups, retrying the groups concurrently"""
+        thunder = self.thunder
+        sg_ids = await self._call(thunder._known_ids, SECURITY_GROUP, inventory)
+        await asyncio.gather(
+            *(
+                self._run_steps(thunder._delete_security_group_steps(sg_id, thunder.sg_backoff))
+                for sg_id in sg_ids
+            )
+        )
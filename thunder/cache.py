@@ -0,0 +1,111 @@
+from typing import Optional, Dict, Any, Callable, Tuple, TypeVar
+import json
+import logging
+import os
+import threading
+import time
+
+from .paths import get_data_path, atomic_write
+
+T = TypeVar("T")
+
+logger = logging.getLogger("thunder")
+
+
+class MetadataCache:
+    """
+    Cache of slow changing account metadata of a region (subnets, availability
+    zones, images...). Entries are kept with the time they were loaded and expire
+    after the ttl of each get(), ttl by default, so users of a shared cache can
+    each ask for their own freshness. Entries can be invalidated explicitly. When
+    path is given entries are also saved there, so back to back runs can reuse
+    them. Values must be JSON serializable.
+    """
+
+    ttl: float
+    path: Optional[str]
+
+    def __init__(self, ttl: float = 300.0, path: Optional[str] = None):
+        self.ttl = ttl
+        self.path = path
+        self._lock = threading.RLock()
+        # key -> {"loaded": unix timestamp, "value": value}
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        if path is not None:
+            self._load()
+
+    def __repr__(self):
+        return f"MetadataCache({len(self._entries)} entries, ttl={self.ttl})"
+
+    def get(self, key: str, loader: Callable[[], T], ttl: Optional[float] = None) -> T:
+        """
+        Returns the cached value of key, calling loader to fill it when missing or
+        loaded more than ttl seconds ago
+        """
+        max_age = self.ttl if ttl is None else ttl
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry["loaded"] < max_age:
+                return entry["value"]
+
+        value = loader()
+        with self._lock:
+            self._entries[key] = {"loaded": time.time(), "value": value}
+            self._save()
+        return value
+
+    def invalidate(self, key: Optional[str] = None):
+        """Drops key, or every entry when key is None"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+            self._save()
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        # Entries saved by older versions held an expiration instead, drop them
+        self._entries = {
+            key: entry
+            for key, entry in data.items()
+            if isinstance(entry, dict) and {"loaded", "value"} <= set(entry)
+        }
+
+    def _save(self):
+        if self.path is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), mode=0o700, exist_ok=True)
+            atomic_write(self.path, json.dumps(self._entries))
+        except OSError as e:
+            # The cache is only an optimization
+            logger.warning("Could not save metadata cache to %s: %s", self.path, e)
+
+
+_caches: Dict[Tuple[str, Optional[str], bool], MetadataCache] = {}
+_caches_lock = threading.Lock()
+
+
+def metadata_cache(
+    region: str, profile_name: Optional[str] = None, persist: bool = False, ttl: float = 300.0
+) -> MetadataCache:
+    """
+    Process-wide metadata cache of a region and credentials profile. ttl is only
+    the default of the cache when it is created, pass ttl to get() to enforce one
+    """
+    key = (region, profile_name, persist)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            path = None
+            if persist:
+                path = os.path.join(
+                    get_data_path(), "metadata", f"{profile_name or 'default'}_{region}.json"
+                )
+            cache = _caches[key] = MetadataCache(ttl=ttl, path=path)
+        return cache
@@ -0,0 +1,108 @@
+from typing import Optional, Dict, Tuple, Any, TYPE_CHECKING
+import threading
+
+from .metrics import ApiStats, stats as default_stats
+from .ratelimit import RateLimiter, limiter as default_limiter
+
+if TYPE_CHECKING:
+    import boto3
+
+# (service, region, profile_name)
+ClientKey = Tuple[str, str, Optional[str]]
+
+
+class ClientPool:
+    """
+    Process-wide pool of boto3 sessions, clients and resources keyed by
+    (service, region, credentials profile). Everything is created on first use.
+
+    Clients are thread safe and shared by every thread. Resources are not, so
+    each thread gets its own. Every client is instrumented with stats, takes
+    its requests from the budgets of limiter and retries following botocore's
+    retry_mode with up to max_attempts attempts.
+    """
+
+    stats: ApiStats
+    limiter: RateLimiter
+    retry_mode: str
+    max_attempts: int
+
+    def __init__(
+        self,
+        stats: Optional[ApiStats] = None,
+        limiter: Optional[RateLimiter] = None,
+        retry_mode: str = "adaptive",
+        max_attempts: int = 10,
+    ):
+        self.stats = default_stats if stats is None else stats
+        self.limiter = default_limiter if limiter is None else limiter
+        self.retry_mode = retry_mode
+        self.max_attempts = max_attempts
+        self._lock = threading.RLock()
+        self._sessions: Dict[Optional[str], Any] = {}
+        self._clients: Dict[ClientKey, Any] = {}
+        self._local = threading.local()
+
+    def __repr__(self):
+        return f"ClientPool({len(self._sessions)} sessions, {len(self._clients)} clients)"
+
+    def session(self, profile_name: Optional[str] = None) -> "boto3.session.Session":
+        with self._lock:
+            session = self._sessions.get(profile_name)
+            if session is None:
+                # Imported here so importing thunder does not pay for the AWS SDK
+                import boto3.session
+
+                session = boto3.session.Session(profile_name=profile_name)
+                self._sessions[profile_name] = session
+            return session
+
+    def client(self, service: str, region: str, profile_name: Optional[str] = None) -> Any:
+        key = (service, region, profile_name)
+        client = self._clients.get(key)
+        if client is None:
+            # Sessions are not thread safe, create clients one at a time
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = self.session(profile_name).client(
+                        service, region_name=region, config=self._config()
+                    )
+                    self._register(client)
+                    self._clients[key] = client
+        return client
+
+    def resource(self, service: str, region: str, profile_name: Optional[str] = None) -> Any:
+        resources = getattr(self._local, "resources", None)
+        if resources is None:
+            resources = self._local.resources = {}
+        key = (service, region, profile_name)
+        resource = resources.get(key)
+        if resource is None:
+            with self._lock:
+                resource = self.session(profile_name).resource(
+                    service, region_name=region, config=self._config()
+                )
+                self._register(resource.meta.client)
+            resources[key] = resource
+        return resource
+
+    def _config(self):
+        from botocore.config import Config
+
+        return Config(retries={"mode": self.retry_mode, "max_attempts": self.max_attempts})
+
+    def _register(self, client):
+        # The limiter goes first so time spent waiting for a token is not counted as latency
+        self.limiter.register(client)
+        self.stats.register(client)
+
+    def clear(self):
+        """Drops every cached session and client, they are recreated on next use"""
+        with self._lock:
+            self._sessions.clear()
+            self._clients.clear()
+            self._local = threading.local()
+
+
+pool = ClientPool()
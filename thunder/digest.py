@@ -0,0 +1,27 @@
+from typing import List, Tuple, Iterator
+import hashlib
+import json
+
+SecurityGroupRule = Tuple[str, int, str]
+
+
+def security_group_rules(
+    tcp_ports: Iterator[int] = tuple(),
+    udp_ports: Iterator[int] = tuple(),
+    cidr: str = "0.0.0.0/0",
+) -> List[SecurityGroupRule]:
+    """Normalized, sorted and deduplicated (protocol, port, cidr) ingress rules"""
+    rules = {("tcp", int(port), cidr) for port in tcp_ports}
+    rules |= {("udp", int(port), cidr) for port in udp_ports}
+    return sorted(rules)
+
+
+def content_digest(value) -> str:
+    """Stable digest of a JSON serializable value, independent of the process"""
+    data = json.dumps(value, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(data.encode()).hexdigest()[:16]
+
+
+def ami_digest(image_id: str, start_script_data: str, itype: str) -> str:
+    """Digest of the inputs of an AMI baked by running a start script on a base image"""
+    return content_digest({"image_id": image_id, "start_script": start_script_data, "itype": itype})
@@ -0,0 +1,133 @@
+from typing import Optional, Dict, List, Any, Callable, Union, Iterable
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .clients import ClientPool
+from .thunder import Thunder
+
+logger = logging.getLogger("thunder")
+
+
+class FleetResult:
+    """Per region results and errors of an operation run by ThunderFleet"""
+
+    __slots__ = ("operation", "results", "errors", "elapsed")
+
+    def __init__(self, operation: str):
+        self.operation = operation
+        self.results: Dict[str, Any] = {}
+        self.errors: Dict[str, BaseException] = {}
+        self.elapsed: Dict[str, float] = {}
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def raise_errors(self):
+        """Raises the error of the first failed region, if any"""
+        for error in self.errors.values():
+            raise error
+
+    def __repr__(self):
+        return (
+            f"FleetResult({self.operation}, ok={sorted(self.results)}, "
+            f"errors={sorted(self.errors)})"
+        )
+
+
+class ThunderFleet:
+    """
+    The same project in several regions. Operations run on every region
+    concurrently, at most max_workers at a time, so they take as long as
+    the slowest region.
+    """
+
+    project_name: str
+    regions: List[str]
+    thunders: Dict[str, Thunder]
+    max_workers: int
+
+    def __init__(
+        self,
+        project_name: str,
+        regions: Iterable[str],
+        max_workers: int = 8,
+        version_incompatible: bool = True,
+        profile_name: Optional[str] = None,
+        pool: Optional[ClientPool] = None,
+    ):
+        self.project_name = project_name
+        self.regions = list(regions)
+        self.max_workers = max_workers
+        self.thunders = {
+            region: Thunder(
+                project_name,
+                region,
+                version_incompatible=version_incompatible,
+                profile_name=profile_name,
+                pool=pool,
+            )
+            for region in self.regions
+        }
+
+    def __repr__(self):
+        return f"ThunderFleet({self.project_name}, {', '.join(self.regions)})"
+
+    def __getitem__(self, region: str) -> Thunder:
+        return self.thunders[region]
+
+    def map(
+        self,
+        operation: Callable[[Thunder], Any],
+        regions: Optional[Iterable[str]] = None,
+        name: Optional[str] = None,
+    ) -> FleetResult:
+        """Calls operation with the Thunder of every region (or of regions) concurrently"""
+        regions = self.regions if regions is None else list(regions)
+        result = FleetResult(name or getattr(operation, "__name__", "operation"))
+
+        def timed(region: str) -> Any:
+            start = time.monotonic()
+            try:
+                return operation(self.thunders[region])
+            finally:
+                result.elapsed[region] = time.monotonic() - start
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(regions) or 1)) as executor:
+            futures = {executor.submit(timed, region): region for region in regions}
+            for future in as_completed(futures):
+                region = futures[future]
+                try:
+                    result.results[region] = future.result()
+                except Exception as e:
+                    logger.error("%s - %s failed in %s: %s", self, result.operation, region, e)
+                    result.errors[region] = e
+
+        return result
+
+    def create_instances(self, image_id: Union[str, Dict[str, str]], **kwargs) -> FleetResult:
+        """
+        Thunder.create_instances in every region. AMIs are regional, so image_id
+        may map each region to its own image. Regions missing from it are skipped.
+        """
+        image_ids = (
+            image_id if isinstance(image_id, dict) else {region: image_id for region in self.regions}
+        )
+        return self.map(
+            lambda t: t.create_instances(image_ids[t.region], **kwargs),
+            regions=[region for region in self.regions if region in image_ids],
+            name="create_instances",
+        )
+
+    def filter_instances(self, **kwargs) -> FleetResult:
+        """Thunder.filter_instances in every region, collected into lists"""
+        return self.map(lambda t: list(t.filter_instances(**kwargs)), name="filter_instances")
+
+    def terminate_all_instances(self, instance_status: Optional[str] = None) -> FleetResult:
+        return self.map(
+            lambda t: t.terminate_all_instances(instance_status), name="terminate_all_instances"
+        )
+
+    def delete_project(self, folders=False) -> FleetResult:
+        return self.map(lambda t: t.delete_project(folders), name="delete_project")
@@ -0,0 +1,339 @@
+from typing import Optional, Dict, List, Iterator, Tuple, TYPE_CHECKING
+import time
+
+from .records import ResourceRecord
+from .tasks import Task, run_graph, chunks
+from .state import (
+    KEY_PAIR,
+    SECURITY_GROUP,
+    AMI,
+    LOAD_BALANCER,
+    LOAD_BALANCER_V2,
+    TARGET_GROUP,
+    LAUNCH_CONFIG,
+    LAUNCH_TEMPLATE,
+    AUTO_SCALING,
+    INSTANCE,
+    SNAPSHOT,
+)
+
+if TYPE_CHECKING:
+    from .thunder import Thunder
+
+# Resource types reported by ec2.describe_tags that are only listed through it
+_EC2_TAG_KINDS = {
+    "security-group": SECURITY_GROUP,
+    "key-pair": KEY_PAIR,
+    "snapshot": SNAPSHOT,
+    "launch-template": LAUNCH_TEMPLATE,
+}
+# Maximum number of values of a single EC2 filter
+_MAX_FILTER_VALUES = 200
+# Maximum number of load balancers accepted by a single elb.describe_tags call
+_MAX_ELB_NAMES = 20
+# Maximum number of ARNs accepted by a single elbv2 describe or describe_tags call
+_MAX_ELBV2_ARNS = 20
+
+
+def _tag_dict(tags) -> Dict[str, str]:
+    return {tag["Key"]: tag["Value"] for tag in tags or ()}
+
+
+def _launch_template_id(group: Dict) -> Optional[str]:
+    template = group.get("LaunchTemplate") or group.get("MixedInstancesPolicy", {}).get(
+        "LaunchTemplate", {}
+    ).get("LaunchTemplateSpecification")
+    return None if not template else template.get("LaunchTemplateId")
+
+
+def _tag_descriptions(
+    describe_tags, param: str, ids: List[str], size: int, not_found: Tuple[str, ...]
+) -> List[Dict]:
+    """
+    TagDescriptions of ids, size of them per describe_tags call. Resources of
+    other projects may be deleted after being listed, which fails the whole
+    call: such a chunk is described again one id at a time, skipping the
+    missing ones
+    """
+    from botocore.exceptions import ClientError
+
+    descriptions = []
+    for chunk in chunks(ids, size):
+        try:
+            descriptions += describe_tags(**{param: chunk})["TagDescriptions"]
+            continue
+        except ClientError as ce:
+            if ce.response["Error"]["Code"] not in not_found:
+                raise
+        if len(chunk) > 1:
+            for rid in chunk:
+                descriptions += _tag_descriptions(describe_tags, param, [rid], size, not_found)
+    return descriptions
+
+
+class Inventory:
+    """
+    Snapshot of every resource of a project, indexed by kind and id. Built by
+    Thunder.inventory() from a handful of bulk, paginated calls.
+    """
+
+    taken: float
+
+    def __init__(self, records: List[ResourceRecord], taken: Optional[float] = None):
+        self.taken = time.time() if taken is None else taken
+        self._by_kind: Dict[str, Dict[str, ResourceRecord]] = {}
+        for record in records:
+            self._by_kind.setdefault(record.kind, {})[record.id] = record
+
+    def __repr__(self):
+        counts = ", ".join(f"{kind}={len(ids)}" for kind, ids in sorted(self._by_kind.items()))
+        return f"Inventory({counts})"
+
+    def __len__(self):
+        return sum(len(records) for records in self._by_kind.values())
+
+    def __iter__(self) -> Iterator[ResourceRecord]:
+        for records in self._by_kind.values():
+            yield from records.values()
+
+    def __contains__(self, key: Tuple[str, str]) -> bool:
+        kind, rid = key
+        return rid in self._by_kind.get(kind, {})
+
+    @property
+    def age(self) -> float:
+        """Seconds since the snapshot was taken"""
+        return time.time() - self.taken
+
+    def get(self, kind: str, rid: str) -> Optional[ResourceRecord]:
+        return self._by_kind.get(kind, {}).get(rid)
+
+    def of(self, kind: str) -> List[ResourceRecord]:
+        """Records of the given kind"""
+        return list(self._by_kind.get(kind, {}).values())
+
+    def ids(self, kind: str) -> List[str]:
+        return list(self._by_kind.get(kind, {}))
+
+    def tagged(self, key: str, value: Optional[str] = None, kind: Optional[str] = None):
+        """Records with tag key, and value if given, optionally of a single kind"""
+        kinds = self._by_kind if kind is None else {kind: self._by_kind.get(kind, {})}
+        return [
+            record
+            for records in kinds.values()
+            for record in records.values()
+            if key in record.tags and (value is None or record.tags[key] == value)
+        ]
+
+
+class InventoryCollector:
+    """Lists the resources of the project of a Thunder object, one service per task"""
+
+    def __init__(self, thunder: "Thunder"):
+        self.thunder = thunder
+        # {Name: "tag:key", Values: [value]} filters of the project, as {key: value}
+        self.required_tags = {f["Name"][len("tag:") :]: f["Values"][0] for f in thunder.filters}
+
+    def _owned(self, tags: Dict[str, str]) -> bool:
+        return all(tags.get(key) == value for key, value in self.required_tags.items())
+
+    def collect(self, max_workers: int = 4) -> Inventory:
+        taken = time.time()
+        tasks: Dict[str, Task] = {
+            "instances": (self.instances, ()),
+            "images": (self.images, ()),
+            "ec2_tags": (self.ec2_tagged, ()),
+            "load_balancers": (self.load_balancers, ()),
+            "load_balancers_v2": (self.load_balancers_v2, ()),
+            "auto_scaling": (self.auto_scaling_groups, ()),
+            "launch_configs": (self.launch_configs, ()),
+        }
+        results = run_graph(tasks, max_workers=max_workers)
+        records: List[ResourceRecord] = []
+        for result in results.values():
+            if result.error is not None:
+                raise result.error
+            records += result.result
+        return Inventory(records, taken)
+
+    def instances(self) -> List[ResourceRecord]:
+        return [
+            ResourceRecord(
+                INSTANCE,
+                record.id,
+                state=record.state,
+                tags=record.tags,
+                data={
+                    "public_ip_address": record.public_ip_address,
+                    "private_ip_address": record.private_ip_address,
+                    "instance_type": record.instance_type,
+                },
+            )
+            for record in self.thunder.filter_instances(instance_status=None, warm_pool=True)
+            if record.state != "terminated"
+        ]
+
+    def images(self) -> List[ResourceRecord]:
+        paginator = self.thunder.client.get_paginator("describe_images")
+        records = []
+        for page in paginator.paginate(Owners=["self"], Filters=self.thunder.filters):
+            for image in page["Images"]:
+                snapshot_ids = [
+                    mapping["Ebs"]["SnapshotId"]
+                    for mapping in image.get("BlockDeviceMappings", ())
+                    if "SnapshotId" in mapping.get("Ebs", {})
+                ]
+                records.append(
+                    ResourceRecord(
+                        AMI,
+                        image["ImageId"],
+                        image.get("Name"),
+                        image.get("State"),
+                        _tag_dict(image.get("Tags")),
+                        {"snapshot_ids": snapshot_ids},
+                    )
+                )
+        return records
+
+    def ec2_tagged(self) -> List[ResourceRecord]:
+        """Security groups, key pairs and snapshots, from bulk describe_tags queries"""
+        client = self.thunder.client
+        paginator = client.get_paginator("describe_tags")
+        project_tag = self.thunder._thunder_proj_tag
+        kinds: Dict[str, str] = {}
+        for page in paginator.paginate(
+            Filters=[
+                {"Name": "key", "Values": [project_tag["Key"]]},
+                {"Name": "value", "Values": [project_tag["Value"]]},
+                {"Name": "resource-type", "Values": list(_EC2_TAG_KINDS)},
+            ]
+        ):
+            for tag in page["Tags"]:
+                kinds[tag["ResourceId"]] = _EC2_TAG_KINDS[tag["ResourceType"]]
+
+        # Every tag of those resources, for the version filter and the digest tags
+        tags: Dict[str, Dict[str, str]] = {rid: {} for rid in kinds}
+        for chunk in chunks(list(kinds), _MAX_FILTER_VALUES):
+            for page in paginator.paginate(Filters=[{"Name": "resource-id", "Values": chunk}]):
+                for tag in page["Tags"]:
+                    tags[tag["ResourceId"]][tag["Key"]] = tag["Value"]
+
+        return [
+            ResourceRecord(kind, rid, tags=tags[rid])
+            for rid, kind in kinds.items()
+            if self._owned(tags[rid])
+        ]
+
+    def load_balancers(self) -> List[ResourceRecord]:
+        """Classic load balancers, tags are listed 20 load balancers at a time"""
+        client = self.thunder.elb_client
+        descriptions = {}
+        for page in client.get_paginator("describe_load_balancers").paginate():
+            for lb in page["LoadBalancerDescriptions"]:
+                descriptions[lb["LoadBalancerName"]] = lb
+
+        records = []
+        for description in _tag_descriptions(
+            client.describe_tags,
+            "LoadBalancerNames",
+            list(descriptions),
+            _MAX_ELB_NAMES,
+            ("LoadBalancerNotFound",),
+        ):
+            tags = _tag_dict(description.get("Tags"))
+            if not self._owned(tags):
+                continue
+            lb = descriptions[description["LoadBalancerName"]]
+            records.append(
+                ResourceRecord(
+                    LOAD_BALANCER,
+                    lb["LoadBalancerName"],
+                    lb["LoadBalancerName"],
+                    tags=tags,
+                    data={
+                        "dns_name": lb.get("DNSName"),
+                        "security_groups": lb.get("SecurityGroups", []),
+                    },
+                )
+            )
+        return records
+
+    def load_balancers_v2(self) -> List[ResourceRecord]:
+        """Application and network load balancers and target groups, tags are listed 20 at a time"""
+        client = self.thunder.elbv2_client
+        # ARN -> (kind, name, state, data)
+        described: Dict[str, Tuple[str, str, Optional[str], Dict]] = {}
+        for page in client.get_paginator("describe_load_balancers").paginate():
+            for lb in page["LoadBalancers"]:
+                described[lb["LoadBalancerArn"]] = (
+                    LOAD_BALANCER_V2,
+                    lb["LoadBalancerName"],
+                    lb["State"]["Code"],
+                    {
+                        "dns_name": lb.get("DNSName"),
+                        "type": lb.get("Type"),
+                        "security_groups": lb.get("SecurityGroups", []),
+                    },
+                )
+        for page in client.get_paginator("describe_target_groups").paginate():
+            for tg in page["TargetGroups"]:
+                described[tg["TargetGroupArn"]] = (
+                    TARGET_GROUP,
+                    tg["TargetGroupName"],
+                    None,
+                    {
+                        "protocol": tg.get("Protocol"),
+                        "port": tg.get("Port"),
+                        "lb_arns": tg.get("LoadBalancerArns", []),
+                    },
+                )
+
+        records = []
+        for description in _tag_descriptions(
+            client.describe_tags,
+            "ResourceArns",
+            list(described),
+            _MAX_ELBV2_ARNS,
+            ("LoadBalancerNotFound", "TargetGroupNotFound"),
+        ):
+            tags = _tag_dict(description.get("Tags"))
+            if not self._owned(tags):
+                continue
+            kind, name, state, data = described[description["ResourceArn"]]
+            records.append(
+                ResourceRecord(kind, description["ResourceArn"], name, state, tags, data)
+            )
+        return records
+
+    def auto_scaling_groups(self) -> List[ResourceRecord]:
+        paginator = self.thunder.as_client.get_paginator("describe_auto_scaling_groups")
+        filters = [
+            {"Name": f"tag:{key}", "Values": [value]} for key, value in self.required_tags.items()
+        ]
+        records = []
+        for page in paginator.paginate(Filters=filters):
+            for group in page["AutoScalingGroups"]:
+                records.append(
+                    ResourceRecord(
+                        AUTO_SCALING,
+                        group["AutoScalingGroupName"],
+                        group["AutoScalingGroupName"],
+                        group.get("Status"),
+                        _tag_dict(group.get("Tags")),
+                        {
+                            "lc_name": group.get("LaunchConfigurationName"),
+                            "lt_id": _launch_template_id(group),
+                            "lb_names": group.get("LoadBalancerNames", []),
+                            "tg_arns": group.get("TargetGroupARNs", []),
+                            "min_size": group.get("MinSize"),
+                            "max_size": group.get("MaxSize"),
+                            "desired": group.get("DesiredCapacity"),
+                        },
+                    )
+                )
+        return records
+
+    def launch_configs(self) -> List[ResourceRecord]:
+        """Launch configurations cannot be tagged, the local state says which are ours"""
+        names = self.thunder._existing_launch_configs(self.thunder.state.ids(LAUNCH_CONFIG))
+        return [ResourceRecord(LAUNCH_CONFIG, name, name) for name in names]
@@ -0,0 +1,56 @@
+from typing import Optional
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows, locks only hold within the process
+    fcntl = None
+
+
+class ProjectLock:
+    """
+    Reentrant lock held across threads and processes, through flock on a lock
+    file. Used around the check-then-create paths of shared project resources,
+    so parallel workers of the same project do not create duplicates.
+    """
+
+    path: str
+
+    def __init__(self, path: str):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd: Optional[int] = None
+
+    def __repr__(self):
+        return f"ProjectLock({self.path})"
+
+    def acquire(self):
+        self._thread_lock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            try:
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            except BaseException:
+                if self._fd is not None:
+                    os.close(self._fd)
+                    self._fd = None
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            # Closing the file releases the flock
+            os.close(self._fd)
+            self._fd = None
+        self._thread_lock.release()
+
+    def __enter__(self) -> "ProjectLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
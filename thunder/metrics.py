@@ -0,0 +1,177 @@
+from typing import Dict, Any, Tuple, List
+import bisect
+import threading
+import time
+
+# Upper bounds, in seconds, of the latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+THROTTLING_CODES = frozenset(
+    (
+        "Throttling",
+        "ThrottlingException",
+        "ThrottledException",
+        "RequestThrottledException",
+        "TooManyRequestsException",
+        "RequestLimitExceeded",
+        "RequestThrottled",
+        "EC2ThrottledException",
+        "BandwidthLimitExceeded",
+        "SlowDown",
+        "PriorRequestNotComplete",
+    )
+)
+
+# Request context keys
+_START_KEY = "thunder_metrics_start"
+_OP_KEY = "thunder_metrics_op"
+
+
+class OperationStats:
+    """Counters and latency histogram of one API operation"""
+
+    __slots__ = ("calls", "errors", "retries", "throttles", "seconds", "buckets")
+
+    def __init__(self, n_buckets: int):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.throttles = 0
+        self.seconds = 0.0
+        # One count per bucket plus the +Inf bucket, not cumulative
+        self.buckets = [0] * (n_buckets + 1)
+
+    def as_dict(self, bounds: Tuple[float, ...]) -> Dict[str, Any]:
+        cumulative = 0
+        histogram = {}
+        for bound, count in zip(bounds + (float("inf"),), self.buckets):
+            cumulative += count
+            histogram[bound] = cumulative
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "throttles": self.throttles,
+            "seconds": self.seconds,
+            "mean_seconds": self.seconds / self.calls if self.calls else 0.0,
+            "histogram": histogram,
+        }
+
+
+class ApiStats:
+    """
+    Per operation call counts, latency histograms, retries and throttling
+    errors of every botocore client registered with register().
+    """
+
+    bounds: Tuple[float, ...]
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._ops: Dict[Tuple[str, str], OperationStats] = {}
+
+    def __repr__(self):
+        return f"ApiStats({len(self._ops)} operations)"
+
+    def register(self, client):
+        """Adds the event hooks to a botocore client, registering twice is harmless"""
+        events = client.meta.events
+        # before-call can be answered early by other handlers, before-parameter-build cannot
+        events.register(
+            "before-parameter-build", self._on_start, unique_id="thunder-metrics-start"
+        )
+        events.register("after-call", self._on_after_call, unique_id="thunder-metrics-after")
+        events.register(
+            "after-call-error", self._on_after_call_error, unique_id="thunder-metrics-error"
+        )
+        events.register("needs-retry", self._on_needs_retry, unique_id="thunder-metrics-retry")
+
+    def _op(self, key: Tuple[str, str]) -> OperationStats:
+        op = self._ops.get(key)
+        if op is None:
+            op = self._ops.setdefault(key, OperationStats(len(self.bounds)))
+        return op
+
+    def _record(self, context, error_code=None, retries=0):
+        key = context.get(_OP_KEY)
+        if key is None:
+            return
+        elapsed = time.perf_counter() - context[_START_KEY]
+        with self._lock:
+            op = self._op(key)
+            op.calls += 1
+            op.seconds += elapsed
+            op.retries += retries
+            op.buckets[bisect.bisect_left(self.bounds, elapsed)] += 1
+            if error_code is not None:
+                op.errors += 1
+
+    def _on_start(self, model, context, **kwargs):
+        context[_OP_KEY] = (model.service_model.service_name, model.name)
+        context[_START_KEY] = time.perf_counter()
+
+    def _on_after_call(self, http_response, parsed, model, context, **kwargs):
+        error_code = None
+        if http_response is not None and http_response.status_code >= 300:
+            error_code = parsed.get("Error", {}).get("Code", "Unknown")
+        retries = parsed.get("ResponseMetadata", {}).get("RetryAttempts", 0)
+        self._record(context, error_code, retries)
+
+    def _on_after_call_error(self, context, exception, **kwargs):
+        self._record(context, type(exception).__name__)
+
+    def _on_needs_retry(self, response, operation, **kwargs):
+        # Called once per attempt, count every throttled one
+        if response is None:
+            return None
+        parsed = response[1]
+        if parsed.get("Error", {}).get("Code") in THROTTLING_CODES:
+            with self._lock:
+                self._op((operation.service_model.service_name, operation.name)).throttles += 1
+        return None
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Stats of every operation seen, keyed by service.Operation"""
+        with self._lock:
+            return {
+                f"{service}.{name}": op.as_dict(self.bounds)
+                for (service, name), op in sorted(self._ops.items())
+            }
+
+    def reset(self):
+        with self._lock:
+            self._ops.clear()
+
+    def prometheus(self) -> str:
+        """Stats in the Prometheus text exposition format"""
+        lines: List[str] = []
+        counters = (
+            ("thunder_api_calls_total", "calls", "API calls made"),
+            ("thunder_api_errors_total", "errors", "API calls that failed"),
+            ("thunder_api_retries_total", "retries", "Retries made by botocore"),
+            ("thunder_api_throttles_total", "throttles", "Attempts rejected by throttling"),
+        )
+        with self._lock:
+            ops = sorted(self._ops.items())
+            for metric, attr, help_text in counters:
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} counter")
+                for (service, name), op in ops:
+                    labels = f'service="{service}",operation="{name}"'
+                    lines.append(f"{metric}{{{labels}}} {getattr(op, attr)}")
+
+            metric = "thunder_api_call_duration_seconds"
+            lines.append(f"# HELP {metric} Latency of API calls including retries")
+            lines.append(f"# TYPE {metric} histogram")
+            for (service, name), op in ops:
+                labels = f'service="{service}",operation="{name}"'
+                for bound, count in op.as_dict(self.bounds)["histogram"].items():
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{metric}_bucket{{{labels},le="{le}"}} {count}')
+                lines.append(f"{metric}_sum{{{labels}}} {op.seconds}")
+                lines.append(f"{metric}_count{{{labels}}} {op.calls}")
+        return "\n".join(lines) + "\n"
+
+
+stats = ApiStats()
@@ -0,0 +1,44 @@
+import os
+import tempfile
+
+
+def get_data_path() -> str:
+    """Directory holding the local state of every thunder project"""
+    config_path = os.getenv("XDG_CONFIG_HOME")
+    if config_path is None:
+        home = os.getenv("HOME", default="~")
+        config_path = os.path.join(home, ".config")
+
+    return os.path.join(config_path, "thunder")
+
+
+def project_path(region: str, project_name: str) -> str:
+    """Directory holding the local state of a project"""
+    return os.path.join(get_data_path(), f"{region}_{project_name}")
+
+
+def keys_path(region: str, project_name: str) -> str:
+    """Directory holding the private key of a project"""
+    return os.path.join(project_path(region, project_name), "ssh")
+
+
+def atomic_write(path: str, data: str, mode: int = 0o600):
+    """
+    Writes data to path through a temporary file renamed over it, so readers
+    never see a partial file. The file has the given mode from the start.
+    """
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.")
+    try:
+        # mkstemp already creates the file readable by its owner only
+        if mode != 0o600:
+            os.chmod(tmp_path, mode)
+        with os.fdopen(fd, "w") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,126 @@
+from typing import Optional, Callable, Generator, Iterator, TypeVar
+import random
+import time
+
+T = TypeVar("T")
+
+
+class PollTimeout(Exception):
+    """Raised when a polled condition is not met before the deadline"""
+
+
+class Backoff:
+    """
+    Polling schedule: a fast first probe followed by exponentially growing,
+    jittered delays capped at cap seconds, all bounded by an overall timeout.
+    """
+
+    first: float
+    base: float
+    factor: float
+    cap: float
+    jitter: float
+    timeout: Optional[float]
+
+    def __init__(
+        self,
+        first: float = 0.0,
+        base: float = 1.0,
+        factor: float = 2.0,
+        cap: float = 15.0,
+        jitter: float = 0.1,
+        timeout: Optional[float] = 600.0,
+    ):
+        self.first = first
+        self.base = base
+        self.factor = factor
+        self.cap = cap
+        self.jitter = jitter
+        self.timeout = timeout
+
+    def __repr__(self):
+        return (
+            f"Backoff(first={self.first}, base={self.base}, factor={self.factor}, "
+            f"cap={self.cap}, jitter={self.jitter}, timeout={self.timeout})"
+        )
+
+    def delays(self) -> Iterator[float]:
+        """Infinite sequence of delays to sleep before each probe"""
+        yield self.first
+        delay = self.base
+        while True:
+            jittered = delay * (1 + random.uniform(-self.jitter, self.jitter))
+            yield min(jittered, self.cap)
+            delay = min(delay * self.factor, self.cap)
+
+    def sleeps(self, description: str = "condition") -> Iterator[float]:
+        """
+        Yields the delay to sleep before each attempt, trimmed to the time left.
+        The first attempt always happens, later ones raise PollTimeout once
+        the timeout has elapsed. Sleeping is up to the caller, see attempts.
+        """
+        start = time.monotonic()
+        for attempt, delay in enumerate(self.delays()):
+            if self.timeout is not None and attempt > 0:
+                remaining = start + self.timeout - time.monotonic()
+                if remaining <= 0:
+                    raise PollTimeout(
+                        f"Timed out after {self.timeout:.0f}s and {attempt} attempts "
+                        f"waiting for {description}"
+                    )
+                delay = min(delay, remaining)
+            yield delay
+
+    def attempts(self, description: str = "condition") -> Iterator[int]:
+        """Yields attempt numbers, sleeping the scheduled delay before each one, see sleeps"""
+        for attempt, delay in enumerate(self.sleeps(description)):
+            if delay > 0:
+                time.sleep(delay)
+            yield attempt
+
+
+def poll(probe: Callable[[], T], backoff: Backoff, description: str = "condition") -> T:
+    """Calls probe following backoff until it returns a truthy value, which is returned"""
+    for _ in backoff.attempts(description):
+        result = probe()
+        if result:
+            return result
+
+
+class Wait:
+    """Condition a step generator waits for: probe is polled following backoff"""
+
+    __slots__ = ("probe", "backoff", "description")
+
+    def __init__(self, probe: Callable[[], T], backoff: Backoff, description: str = "condition"):
+        self.probe = probe
+        self.backoff = backoff
+        self.description = description
+
+    def __repr__(self):
+        return f"Wait({self.description})"
+
+
+# Operation split around its waits: a generator making the AWS calls, yielding a Wait
+# whenever it needs one to hold, and returning the result of the operation. run_steps
+# runs it blocking, thunder.aio on an event loop, so only the waiting differs
+Steps = Generator[Wait, None, T]
+
+
+def run_steps(steps: "Steps[T]") -> T:
+    """
+    Runs steps, polling every Wait it yields. An error raised while waiting,
+    PollTimeout or one of the probe, is raised inside steps at the yield, so
+    the generator can handle it. Returns the value returned by steps
+    """
+    try:
+        wait = next(steps)
+        while True:
+            try:
+                poll(wait.probe, wait.backoff, wait.description)
+            except Exception as e:
+                wait = steps.throw(e)
+            else:
+                wait = next(steps)
+    except StopIteration as stop:
+        return stop.value
@@ -0,0 +1,106 @@
+from typing import Optional, Dict, Tuple
+import threading
+import time
+
+# Requests per second and burst size per service, kept below the default AWS
+# API request rate limits so concurrent workers rarely get throttled
+DEFAULT_BUDGETS: Dict[str, Tuple[float, float]] = {
+    "ec2": (20.0, 50.0),
+    "elb": (10.0, 20.0),
+    "elbv2": (10.0, 20.0),
+    "autoscaling": (10.0, 20.0),
+    "cloudwatch": (3.0, 10.0),
+}
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at rate tokens per second up to burst"""
+
+    rate: float
+    burst: float
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = rate if burst is None else burst
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"TokenBucket(rate={self.rate}, burst={self.burst})"
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Takes tokens, sleeping until they are available. Returns the seconds waited"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Reserve the tokens now, so waiting threads are served in order
+            self._tokens -= tokens
+            wait = 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class RateLimiter:
+    """
+    Client-side request budgets, one token bucket per (service, region),
+    shared by every client registered with it.
+    """
+
+    def __init__(self, budgets: Optional[Dict[str, Tuple[float, float]]] = None):
+        self._lock = threading.Lock()
+        self._budgets: Dict[Tuple[str, Optional[str]], Tuple[float, float]] = {
+            (service, None): budget
+            for service, budget in (DEFAULT_BUDGETS if budgets is None else budgets).items()
+        }
+        self._buckets: Dict[Tuple[str, str], Optional[TokenBucket]] = {}
+
+    def __repr__(self):
+        return f"RateLimiter({len(self._buckets)} buckets)"
+
+    def configure(
+        self,
+        service: str,
+        rate: Optional[float],
+        burst: Optional[float] = None,
+        region: Optional[str] = None,
+    ):
+        """
+        Sets the budget of service, in every region or only in region.
+        A rate of None removes the limit.
+        """
+        with self._lock:
+            if rate is None:
+                self._budgets.pop((service, region), None)
+            else:
+                self._budgets[(service, region)] = (rate, rate if burst is None else burst)
+            for key in list(self._buckets):
+                if key[0] == service and region in (None, key[1]):
+                    del self._buckets[key]
+
+    def bucket(self, service: str, region: str) -> Optional[TokenBucket]:
+        key = (service, region)
+        with self._lock:
+            if key not in self._buckets:
+                budget = self._budgets.get((service, region)) or self._budgets.get((service, None))
+                self._buckets[key] = None if budget is None else TokenBucket(*budget)
+            return self._buckets[key]
+
+    def register(self, client):
+        """Makes every call of a botocore client take a token first"""
+        service = client.meta.service_model.service_name
+        region = client.meta.region_name
+
+        def take_token(**kwargs):
+            bucket = self.bucket(service, region)
+            if bucket is not None:
+                bucket.acquire()
+
+        client.meta.events.register(
+            "before-parameter-build", take_token, unique_id="thunder-rate-limit"
+        )
+
+
+limiter = RateLimiter()
@@ -0,0 +1,234 @@
+from typing import Optional, List, Any, Callable, Iterator, TYPE_CHECKING
+import socket
+from concurrent.futures import ThreadPoolExecutor
+
+from .polling import Backoff, Wait, poll
+
+if TYPE_CHECKING:
+    from .thunder import Thunder
+
+# Maximum number of instances checked at the same time by network probes
+_MAX_CHECKS = 32
+
+
+def _check_all(check: Callable[[Any], bool], instances: List[Any]) -> List[Any]:
+    """Runs check on every instance concurrently, returns those it passed for"""
+    if not instances:
+        return []
+    with ThreadPoolExecutor(max_workers=min(len(instances), _MAX_CHECKS)) as executor:
+        passed = list(executor.map(check, instances))
+    return [instance for instance, ok in zip(instances, passed) if ok]
+
+
+class Probe:
+    """
+    Decides when freshly created instances are ready to be used. Every pending
+    instance of a batch is checked in each round, rounds follow backoff and
+    PollTimeout is raised if some are still not ready after timeout seconds.
+    """
+
+    description = "ready"
+    timeout: float
+    backoff: Backoff
+
+    def __init__(self, timeout: float = 600.0, backoff: Optional[Backoff] = None):
+        self.timeout = timeout
+        self.backoff = backoff or Backoff(first=0.0, base=2.0, cap=10.0, timeout=timeout)
+
+    def __repr__(self):
+        return f"{type(self).__name__}(timeout={self.timeout})"
+
+    def ready(self, thunder: "Thunder", instances: List[Any]) -> List[Any]:
+        """Returns which of instances are ready"""
+        raise NotImplementedError
+
+    def iter_ready(self, thunder: "Thunder", instances: List[Any]) -> Iterator[List[Any]]:
+        """Yields the instances that became ready in each round until all of them are"""
+        pending = {instance.id: instance for instance in instances}
+        description = f"instances {', '.join(pending)} to be {self.description}"
+        for _ in self.backoff.attempts(description):
+            ready = self.ready(thunder, list(pending.values()))
+            for instance in ready:
+                del pending[instance.id]
+            if ready:
+                yield ready
+            if not pending:
+                return
+
+    def until_ready(self, thunder: "Thunder", instances: List[Any]) -> Wait:
+        """Condition of every instance being ready, checking only those still pending"""
+        pending = {instance.id: instance for instance in instances}
+        description = f"instances {', '.join(pending)} to be {self.description}"
+
+        def all_ready() -> bool:
+            for instance in self.ready(thunder, list(pending.values())):
+                del pending[instance.id]
+            return not pending
+
+        return Wait(all_ready, self.backoff, description)
+
+    def wait(self, thunder: "Thunder", instances: List[Any]):
+        """Blocks until every instance is ready"""
+        until = self.until_ready(thunder, instances)
+        poll(until.probe, until.backoff, until.description)
+
+
+class StatusOk(Probe):
+    """EC2 status checks passed, slow but needs nothing from the instance"""
+
+    description = "ok"
+
+    def ready(self, thunder: "Thunder", instances: List[Any]) -> List[Any]:
+        ok = set(thunder._status_ok_ids([instance.id for instance in instances]))
+        return [instance for instance in instances if instance.id in ok]
+
+
+class Running(Probe):
+    """The instance is running, its start script may still be running too"""
+
+    description = "running"
+
+    def ready(self, thunder: "Thunder", instances: List[Any]) -> List[Any]:
+        from botocore.exceptions import ClientError
+
+        try:
+            thunder._reload_instances(instances)
+        except ClientError as ce:
+            # Freshly launched instances may not be visible yet
+            if ce.response["Error"]["Code"] == "InvalidInstanceID.NotFound":
+                return []
+            raise
+        return [
+            instance
+            for instance in instances
+            if instance.meta.data is not None
+            and instance.meta.data["State"]["Name"] == "running"
+        ]
+
+
+class _NetworkProbe(Running):
+    """Running instances that also answer on the network, checked concurrently"""
+
+    private: bool
+
+    def __init__(
+        self, private: bool = False, timeout: float = 600.0, backoff: Optional[Backoff] = None
+    ):
+        super().__init__(timeout, backoff)
+        self.private = private
+
+    def address(self, instance) -> Optional[str]:
+        key = "PrivateIpAddress" if self.private else "PublicIpAddress"
+        return instance.meta.data.get(key)
+
+    def check(self, address: str) -> bool:
+        raise NotImplementedError
+
+    def ready(self, thunder: "Thunder", instances: List[Any]) -> List[Any]:
+        running = [
+            instance
+            for instance in super().ready(thunder, instances)
+            if self.address(instance) is not None
+        ]
+        return _check_all(lambda instance: self.check(self.address(instance)), running)
+
+
+class TcpPort(_NetworkProbe):
+    """A TCP port accepts connections, e.g. 22 once sshd is up"""
+
+    port: int
+    connect_timeout: float
+
+    def __init__(
+        self,
+        port: int = 22,
+        connect_timeout: float = 2.0,
+        private: bool = False,
+        timeout: float = 600.0,
+        backoff: Optional[Backoff] = None,
+    ):
+        super().__init__(private, timeout, backoff)
+        self.port = port
+        self.connect_timeout = connect_timeout
+
+    @property
+    def description(self) -> str:
+        return f"listening on port {self.port}"
+
+    def check(self, address: str) -> bool:
+        try:
+            with socket.create_connection((address, self.port), timeout=self.connect_timeout):
+                return True
+        except OSError:
+            return False
+
+
+class HttpHealth(_NetworkProbe):
+    """
+    A health URL answers with a 2xx or 3xx status. url is formatted with the
+    address of each instance, e.g. "http://{ip}:8080/health".
+    """
+
+    url: str
+    request_timeout: float
+
+    def __init__(
+        self,
+        url: str = "http://{ip}:8080/",
+        request_timeout: float = 2.0,
+        private: bool = False,
+        timeout: float = 600.0,
+        backoff: Optional[Backoff] = None,
+    ):
+        super().__init__(private, timeout, backoff)
+        self.url = url
+        self.request_timeout = request_timeout
+
+    @property
+    def description(self) -> str:
+        return f"healthy at {self.url}"
+
+    def check(self, address: str) -> bool:
+        import urllib.request
+
+        try:
+            with urllib.request.urlopen(
+                self.url.format(ip=address), timeout=self.request_timeout
+            ) as response:
+                return 200 <= response.status < 400
+        except (OSError, ValueError):
+            # HTTPError and URLError are OSErrors
+            return False
+
+
+class UserDataMarker(Running):
+    """
+    The start script printed marker to the console when done, e.g. with
+    echo THUNDER_READY > /dev/console as its last line.
+    """
+
+    marker: str
+
+    def __init__(
+        self,
+        marker: str = "THUNDER_READY",
+        timeout: float = 900.0,
+        backoff: Optional[Backoff] = None,
+    ):
+        # The console output is only refreshed every few seconds
+        backoff = backoff or Backoff(first=5.0, base=5.0, cap=15.0, timeout=timeout)
+        super().__init__(timeout, backoff)
+        self.marker = marker
+
+    @property
+    def description(self) -> str:
+        return f"done running their start script ({self.marker})"
+
+    def ready(self, thunder: "Thunder", instances: List[Any]) -> List[Any]:
+        client = thunder.client
+
+        def check(instance) -> bool:
+            output = client.get_console_output(InstanceId=instance.id).get("Output") or ""
+            return self.marker in output
+
+        return _check_all(check, super().ready(thunder, instances))
@@ -0,0 +1,93 @@
+from typing import Optional, Dict, Any
+
+
+class InstanceRecord:
+    """Compact, read-only view of an instance built from a describe_instances payload"""
+
+    __slots__ = ("id", "state", "public_ip_address", "private_ip_address", "instance_type", "tags")
+
+    def __init__(
+        self,
+        id: str,
+        state: str,
+        public_ip_address: Optional[str],
+        private_ip_address: Optional[str],
+        instance_type: str,
+        tags: Dict[str, str],
+    ):
+        self.id = id
+        self.state = state
+        self.public_ip_address = public_ip_address
+        self.private_ip_address = private_ip_address
+        self.instance_type = instance_type
+        self.tags = tags
+
+    @classmethod
+    def from_payload(cls, data: Dict[str, Any]) -> "InstanceRecord":
+        return cls(
+            data["InstanceId"],
+            data["State"]["Name"],
+            data.get("PublicIpAddress"),
+            data.get("PrivateIpAddress"),
+            data.get("InstanceType", ""),
+            {tag["Key"]: tag["Value"] for tag in data.get("Tags", ())},
+        )
+
+    def __repr__(self):
+        return f"InstanceRecord({self.id}, {self.state}, {self.public_ip_address})"
+
+
+class TerminationOutcome:
+    """Result of terminating a single instance"""
+
+    __slots__ = ("id", "previous_state", "current_state", "error")
+
+    def __init__(
+        self,
+        id: str,
+        previous_state: Optional[str] = None,
+        current_state: Optional[str] = None,
+        error: Optional[str] = None,
+    ):
+        self.id = id
+        self.previous_state = previous_state
+        self.current_state = current_state
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.current_state == "terminated"
+
+    def __repr__(self):
+        if self.error is not None:
+            return f"TerminationOutcome({self.id}, error={self.error})"
+        return f"TerminationOutcome({self.id}, {self.previous_state} -> {self.current_state})"
+
+
+class ResourceRecord:
+    """
+    Compact, read-only view of any project resource. state is the lifecycle
+    state when the service reports one and data holds a few kind specific fields.
+    """
+
+    __slots__ = ("kind", "id", "name", "state", "tags", "data")
+
+    def __init__(
+        self,
+        kind: str,
+        id: str,
+        name: Optional[str] = None,
+        state: Optional[str] = None,
+        tags: Optional[Dict[str, str]] = None,
+        data: Optional[Dict[str, Any]] = None,
+    ):
+        self.kind = kind
+        self.id = id
+        self.name = name
+        self.state = state
+        self.tags = tags or {}
+        self.data = data or {}
+
+    def __repr__(self):
+        state = "" if self.state is None else f", {self.state}"
+        return f"ResourceRecord({self.kind}, {self.id}{state})"
@@ -0,0 +1,440 @@
+from typing import Optional, Dict, List, Any, Tuple, Union, TYPE_CHECKING
+import datetime
+import logging
+
+from .digest import content_digest
+from .spec import Change
+from .state import AUTO_SCALING, ALARM
+
+if TYPE_CHECKING:
+    from .thunder import Thunder
+
+logger = logging.getLogger("thunder")
+
+# Predefined metrics of target tracking policies
+CPU = "ASGAverageCPUUtilization"
+ALB_REQUESTS = "ALBRequestCountPerTarget"
+NETWORK_IN = "ASGAverageNetworkIn"
+NETWORK_OUT = "ASGAverageNetworkOut"
+
+# Kinds of the changes made by ScalingGroup.update
+SCALING_POLICY = "scaling_policy"
+SCHEDULED_ACTION = "scheduled_action"
+
+# (lower bound, upper bound, adjustment) of a step scaling policy
+Step = Tuple[Optional[float], Optional[float], int]
+
+
+def alb_resource_label(lb_arn: str, tg_arn: str) -> str:
+    """resource_label of ALB_REQUESTS for a load balancer and one of its target groups"""
+    return f"{lb_arn.split(':loadbalancer/')[1]}/{tg_arn.split(':')[-1]}"
+
+
+def _utc(value: Any) -> Any:
+    """
+    datetimes in UTC, naive ones being UTC already as botocore sends them,
+    without the microseconds AWS drops. Other values are returned as is
+    """
+    if not isinstance(value, datetime.datetime):
+        return value
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value.astimezone(datetime.timezone.utc).replace(microsecond=0)
+
+
+def _matches(current: Dict[str, Any], params: Dict[str, Any]) -> bool:
+    """Whether every parameter is already set to the same value in current"""
+    return all(_utc(current.get(key)) == _utc(value) for key, value in params.items())
+
+
+class TargetTracking:
+    """
+    Adds and removes instances to keep metric close to target, e.g. 50 for
+    CPU percent. ALB_REQUESTS counts requests per target of a target group,
+    which resource_label names as "app/<lb>/<lb id>/targetgroup/<tg>/<tg id>",
+    see alb_resource_label.
+    """
+
+    __slots__ = ("target", "metric", "resource_label", "warmup", "disable_scale_in")
+
+    def __init__(
+        self,
+        target: float,
+        metric: str = CPU,
+        resource_label: Optional[str] = None,
+        warmup: Optional[int] = None,
+        disable_scale_in: bool = False,
+    ):
+        if metric == ALB_REQUESTS and resource_label is None:
+            raise ValueError("Target tracking of ALB_REQUESTS needs a resource_label")
+        self.target = target
+        self.metric = metric
+        self.resource_label = resource_label
+        self.warmup = warmup
+        self.disable_scale_in = disable_scale_in
+
+    def __repr__(self):
+        return f"TargetTracking({self.metric}={self.target})"
+
+    def params(self) -> Dict[str, Any]:
+        metric = {"PredefinedMetricType": self.metric}
+        if self.resource_label is not None:
+            metric["ResourceLabel"] = self.resource_label
+        params: Dict[str, Any] = {
+            "PolicyType": "TargetTrackingScaling",
+            "TargetTrackingConfiguration": {
+                "PredefinedMetricSpecification": metric,
+                "TargetValue": float(self.target),
+                "DisableScaleIn": self.disable_scale_in,
+            },
+        }
+        if self.warmup is not None:
+            params["EstimatedInstanceWarmup"] = self.warmup
+        return params
+
+
+class StepScaling:
+    """
+    Changes the capacity by steps while an alarm on metric_name crosses
+    threshold. Step bounds are relative to threshold and None is unbounded,
+    e.g. [(0, 20, 1), (20, None, 3)] adds 1 instance up to 20 above threshold
+    and 3 beyond. Scale-in policies pair "LessThanOrEqualToThreshold" with
+    negative bounds and adjustments. Thunder creates and deletes the alarm.
+    """
+
+    __slots__ = (
+        "steps",
+        "threshold",
+        "comparison",
+        "metric_name",
+        "namespace",
+        "statistic",
+        "period",
+        "evaluation_periods",
+        "adjustment_type",
+        "warmup",
+    )
+
+    def __init__(
+        self,
+        steps: List[Step],
+        threshold: float,
+        comparison: str = "GreaterThanOrEqualToThreshold",
+        metric_name: str = "CPUUtilization",
+        namespace: str = "AWS/EC2",
+        statistic: str = "Average",
+        period: int = 60,
+        evaluation_periods: int = 2,
+        adjustment_type: str = "ChangeInCapacity",
+        warmup: Optional[int] = None,
+    ):
+        if not steps:
+            raise ValueError("Step scaling needs at least one step")
+        self.steps = [tuple(step) for step in steps]
+        self.threshold = threshold
+        self.comparison = comparison
+        self.metric_name = metric_name
+        self.namespace = namespace
+        self.statistic = statistic
+        self.period = period
+        self.evaluation_periods = evaluation_periods
+        self.adjustment_type = adjustment_type
+        self.warmup = warmup
+
+    def __repr__(self):
+        return f"StepScaling({self.metric_name} {self.comparison} {self.threshold})"
+
+    def params(self) -> Dict[str, Any]:
+        adjustments = []
+        for lower, upper, adjustment in self.steps:
+            step: Dict[str, Any] = {"ScalingAdjustment": adjustment}
+            if lower is not None:
+                step["MetricIntervalLowerBound"] = float(lower)
+            if upper is not None:
+                step["MetricIntervalUpperBound"] = float(upper)
+            adjustments.append(step)
+        params: Dict[str, Any] = {
+            "PolicyType": "StepScaling",
+            "AdjustmentType": self.adjustment_type,
+            "MetricAggregationType": self.statistic,
+            "StepAdjustments": adjustments,
+        }
+        if self.warmup is not None:
+            params["EstimatedInstanceWarmup"] = self.warmup
+        return params
+
+    def alarm_params(self, as_name: str) -> Dict[str, Any]:
+        """Parameters of cloudwatch.put_metric_alarm, without its name and actions"""
+        return {
+            "MetricName": self.metric_name,
+            "Namespace": self.namespace,
+            "Statistic": self.statistic,
+            "Dimensions": [{"Name": "AutoScalingGroupName", "Value": as_name}],
+            "Period": self.period,
+            "EvaluationPeriods": self.evaluation_periods,
+            "Threshold": float(self.threshold),
+            "ComparisonOperator": self.comparison,
+        }
+
+
+class Scheduled:
+    """
+    Sets the capacity of the group at start_time, or on every recurrence, a
+    cron expression such as "0 8 * * 1-5" evaluated in time_zone (UTC if None).
+    Sizes left to None are not changed.
+    """
+
+    __slots__ = (
+        "recurrence",
+        "start_time",
+        "end_time",
+        "min_size",
+        "max_size",
+        "desired",
+        "time_zone",
+    )
+
+    def __init__(
+        self,
+        recurrence: Optional[str] = None,
+        start_time: Optional[datetime.datetime] = None,
+        end_time: Optional[datetime.datetime] = None,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        desired: Optional[int] = None,
+        time_zone: Optional[str] = None,
+    ):
+        if recurrence is None and start_time is None:
+            raise ValueError("A scheduled action needs a recurrence or a start_time")
+        if min_size is None and max_size is None and desired is None:
+            raise ValueError("A scheduled action needs min_size, max_size or desired")
+        self.recurrence = recurrence
+        self.start_time = start_time
+        self.end_time = end_time
+        self.min_size = min_size
+        self.max_size = max_size
+        self.desired = desired
+        self.time_zone = time_zone
+
+    def __repr__(self):
+        when = self.recurrence if self.recurrence is not None else self.start_time
+        return f"Scheduled({when}, {self.min_size}/{self.desired}/{self.max_size})"
+
+    def params(self) -> Dict[str, Any]:
+        params = {
+            "Recurrence": self.recurrence,
+            "StartTime": self.start_time,
+            "EndTime": self.end_time,
+            "MinSize": self.min_size,
+            "MaxSize": self.max_size,
+            "DesiredCapacity": self.desired,
+            "TimeZone": self.time_zone,
+        }
+        return {key: value for key, value in params.items() if value is not None}
+
+
+Policy = Union[TargetTracking, StepScaling]
+
+
+class ScalingGroup:
+    """
+    Capacity, scaling policies and scheduled actions of an auto scaling group,
+    all changed in place. Policies and actions are named per group and putting
+    one under an existing name replaces it.
+    """
+
+    as_name: str
+
+    def __init__(self, thunder: "Thunder", as_name: str):
+        self.thunder = thunder
+        self.as_name = as_name
+
+    def __repr__(self):
+        return f"ScalingGroup({self.thunder}, {self.as_name})"
+
+    def _alarm_name(self, name: str) -> str:
+        return f"{self.as_name}-{name}"
+
+    def describe(self) -> Dict[str, Any]:
+        response = self.thunder.as_client.describe_auto_scaling_groups(
+            AutoScalingGroupNames=[self.as_name]
+        )
+        for group in response["AutoScalingGroups"]:
+            return group
+        raise ValueError(f"Auto scaling group {self.as_name} does not exist")
+
+    def set_capacity(
+        self,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        desired: Optional[int] = None,
+        group: Optional[Dict[str, Any]] = None,
+    ) -> List[str]:
+        """
+        Updates the sizes given that differ from those of the group, described
+        unless given. Returns the fields updated.
+        """
+        group = self.describe() if group is None else group
+        updates = {
+            field: value
+            for field, value in (
+                ("MinSize", min_size),
+                ("MaxSize", max_size),
+                ("DesiredCapacity", desired),
+            )
+            if value is not None and group.get(field) != value
+        }
+        if updates:
+            self.thunder.as_client.update_auto_scaling_group(
+                AutoScalingGroupName=self.as_name, **updates
+            )
+            logger.info("%s - Updated auto scaling %s %s", self.thunder, self.as_name, updates)
+        return sorted(updates)
+
+    def policies(self) -> Dict[str, Dict[str, Any]]:
+        """Scaling policies of the group by name"""
+        paginator = self.thunder.as_client.get_paginator("describe_policies")
+        return {
+            policy["PolicyName"]: policy
+            for page in paginator.paginate(AutoScalingGroupName=self.as_name)
+            for policy in page["ScalingPolicies"]
+        }
+
+    def scheduled_actions(self) -> Dict[str, Dict[str, Any]]:
+        """Scheduled actions of the group by name"""
+        paginator = self.thunder.as_client.get_paginator("describe_scheduled_actions")
+        return {
+            action["ScheduledActionName"]: action
+            for page in paginator.paginate(AutoScalingGroupName=self.as_name)
+            for action in page["ScheduledUpdateGroupActions"]
+        }
+
+    def put_policy(self, name: str, policy: Policy) -> str:
+        """Creates or replaces the policy name, returns its ARN"""
+        arn = self.thunder.as_client.put_scaling_policy(
+            AutoScalingGroupName=self.as_name, PolicyName=name, **policy.params()
+        )["PolicyARN"]
+
+        alarm_name = self._alarm_name(name)
+        if isinstance(policy, StepScaling):
+            alarm = policy.alarm_params(self.as_name)
+            self.thunder.cw_client.put_metric_alarm(
+                AlarmName=alarm_name,
+                AlarmActions=[arn],
+                Tags=self.thunder.tags,
+                **alarm,
+            )
+            # Keyed by group so deleting the group deletes its alarms
+            self.thunder.state.put(
+                ALARM,
+                alarm_name,
+                {"policy": name, "digest": content_digest(alarm)},
+                key=self.as_name,
+            )
+        elif self.thunder.state.get(ALARM, alarm_name) is not None:
+            # A step policy replaced by a target tracking one
+            self.thunder._delete_alarms([alarm_name])
+
+        logger.info("%s - Put scaling policy %s of %s", self.thunder, name, self.as_name)
+        return arn
+
+    def target_tracking(self, name: str, target: float, metric: str = CPU, **kwargs: Any) -> str:
+        """Puts a TargetTracking policy, kwargs are those of TargetTracking"""
+        return self.put_policy(name, TargetTracking(target, metric, **kwargs))
+
+    def step_scaling(self, name: str, steps: List[Step], threshold: float, **kwargs: Any) -> str:
+        """Puts a StepScaling policy and its alarm, kwargs are those of StepScaling"""
+        return self.put_policy(name, StepScaling(steps, threshold, **kwargs))
+
+    def delete_policy(self, name: str):
+        from botocore.exceptions import ClientError
+
+        try:
+            self.thunder.as_client.delete_policy(
+                AutoScalingGroupName=self.as_name, PolicyName=name
+            )
+        except ClientError as ce:
+            if ce.response["Error"]["Code"] != "ValidationError":
+                raise
+        alarm_name = self._alarm_name(name)
+        if self.thunder.state.get(ALARM, alarm_name) is not None:
+            self.thunder._delete_alarms([alarm_name])
+        logger.info("%s - Deleted scaling policy %s of %s", self.thunder, name, self.as_name)
+
+    def schedule(self, name: str, action: Scheduled):
+        """Creates or replaces the scheduled action name"""
+        self.thunder.as_client.put_scheduled_update_group_action(
+            AutoScalingGroupName=self.as_name, ScheduledActionName=name, **action.params()
+        )
+        logger.info("%s - Scheduled %s of %s: %s", self.thunder, name, self.as_name, action)
+
+    def delete_scheduled_action(self, name: str):
+        from botocore.exceptions import ClientError
+
+        try:
+            self.thunder.as_client.delete_scheduled_action(
+                AutoScalingGroupName=self.as_name, ScheduledActionName=name
+            )
+        except ClientError as ce:
+            if ce.response["Error"]["Code"] != "ValidationError":
+                raise
+        logger.info("%s - Deleted scheduled action %s of %s", self.thunder, name, self.as_name)
+
+    def _policy_matches(self, name: str, policy: Policy, current: Dict[str, Any]) -> bool:
+        if not _matches(current, policy.params()):
+            return False
+        recorded = self.thunder.state.get(ALARM, self._alarm_name(name))
+        if isinstance(policy, StepScaling):
+            digest = content_digest(policy.alarm_params(self.as_name))
+            return recorded is not None and recorded["digest"] == digest
+        return recorded is None
+
+    def update(
+        self,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        desired: Optional[int] = None,
+        policies: Optional[Dict[str, Policy]] = None,
+        schedules: Optional[Dict[str, Scheduled]] = None,
+    ) -> List[Change]:
+        """
+        Brings the group to the given capacity, policies and scheduled actions,
+        touching only what differs. Sizes left to None are kept, leave desired
+        to None when policies manage it. The policies or scheduled actions of
+        the group are all replaced by those given, unless they are None.
+        """
+        changes: List[Change] = []
+        if min_size is not None or max_size is not None or desired is not None:
+            updated = self.set_capacity(min_size, max_size, desired)
+            if updated:
+                changes.append(Change("update", AUTO_SCALING, self.as_name, ", ".join(updated)))
+
+        if policies is not None:
+            current = self.policies()
+            for name, policy in policies.items():
+                if name in current and self._policy_matches(name, policy, current[name]):
+                    changes.append(Change("keep", SCALING_POLICY, name))
+                    continue
+                self.put_policy(name, policy)
+                changes.append(
+                    Change("update" if name in current else "create", SCALING_POLICY, name)
+                )
+            for name in sorted(set(current) - set(policies)):
+                self.delete_policy(name)
+                changes.append(Change("delete", SCALING_POLICY, name))
+
+        if schedules is not None:
+            current = self.scheduled_actions()
+            for name, action in schedules.items():
+                if name in current and _matches(current[name], action.params()):
+                    changes.append(Change("keep", SCHEDULED_ACTION, name))
+                    continue
+                self.schedule(name, action)
+                changes.append(
+                    Change("update" if name in current else "create", SCHEDULED_ACTION, name)
+                )
+            for name in sorted(set(current) - set(schedules)):
+                self.delete_scheduled_action(name)
+                changes.append(Change("delete", SCHEDULED_ACTION, name))
+
+        return changes
@@ -0,0 +1,106 @@
+from typing import Optional, Dict, Any, List, Tuple
+
+from .digest import security_group_rules, content_digest
+
+# Sections of a project spec and the defaults of their optional fields
+_SECTIONS: Dict[str, Dict[str, Any]] = {
+    "instances": {
+        "itype": "t2.micro",
+        "tcp_ports": (22,),
+        "udp_ports": (),
+        "start_script_data": None,
+        "start_script": None,
+        "count": 1,
+    },
+    "load_balancer": {
+        "tcp_ports": (8080,),
+        "udp_ports": (),
+    },
+    "launch_config": {
+        "itype": "t2.micro",
+        "tcp_ports": (8080,),
+        "udp_ports": (),
+        "monitoring": False,
+    },
+    "auto_scaling": {
+        "min_size": 2,
+        "max_size": 10,
+        "desired": 2,
+        # Average CPU percent kept by a target tracking policy, desired is then
+        # only the initial capacity
+        "target_cpu": None,
+    },
+}
+_REQUIRED: Dict[str, Tuple[str, ...]] = {
+    "instances": ("image_id",),
+    "launch_config": ("ami_id",),
+}
+
+
+def normalize_spec(spec: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Validates a project spec and fills in the defaults of its sections.
+    Start scripts are read, so changing their contents changes the spec.
+    Raises ValueError for unknown sections or fields and missing required fields.
+    """
+    unknown = set(spec) - set(_SECTIONS)
+    if unknown:
+        raise ValueError(f"Unknown spec sections: {', '.join(sorted(unknown))}")
+
+    normalized: Dict[str, Dict[str, Any]] = {}
+    for section, defaults in _SECTIONS.items():
+        values = spec.get(section)
+        if values is None:
+            continue
+        required = _REQUIRED.get(section, ())
+        unknown = set(values) - set(defaults) - set(required)
+        if unknown:
+            raise ValueError(f"Unknown fields in spec {section}: {', '.join(sorted(unknown))}")
+        missing = [name for name in required if values.get(name) is None]
+        if missing:
+            raise ValueError(f"Missing fields in spec {section}: {', '.join(missing)}")
+        fields = dict(defaults, **values)
+        normalized[section] = fields
+
+    if "auto_scaling" in normalized and "launch_config" not in normalized:
+        raise ValueError("Spec auto_scaling needs a launch_config")
+
+    instances = normalized.get("instances")
+    if instances is not None:
+        script = instances.pop("start_script")
+        if script and instances["start_script_data"]:
+            raise ValueError("Spec instances cannot have both start_script_data and start_script")
+        if script:
+            with open(script, "r") as f:
+                instances["start_script_data"] = f.read()
+        instances["start_script_data"] = instances["start_script_data"] or ""
+
+    for fields in normalized.values():
+        if "tcp_ports" in fields:
+            fields["rules"] = security_group_rules(fields.pop("tcp_ports"), fields.pop("udp_ports"))
+    return normalized
+
+
+def section_digest(section: Dict[str, Any], *ignored: str) -> str:
+    """Digest identifying the resources built from a normalized spec section"""
+    return content_digest({k: v for k, v in section.items() if k not in ignored})
+
+
+def rule_ports(rules: List[Any], protocol: str) -> List[int]:
+    return [port for proto, port, _ in rules if proto == protocol]
+
+
+class Change:
+    """A change made, or a resource kept, by Thunder.apply"""
+
+    __slots__ = ("action", "kind", "id", "detail")
+
+    def __init__(self, action: str, kind: str, id: str, detail: Optional[str] = None):
+        self.action = action
+        self.kind = kind
+        self.id = id
+        self.detail = detail
+
+    def __repr__(self):
+        detail = "" if self.detail is None else f", {self.detail}"
+        return f"Change({self.action} {self.kind} {self.id}{detail})"
@@ -0,0 +1,238 @@
+from typing import Optional, Dict, List, Any, Iterator, Tuple
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from .digest import security_group_rules, content_digest
+
+# Resource kinds
+KEY_PAIR = "key_pair"
+SECURITY_GROUP = "security_group"
+AMI = "ami"
+LOAD_BALANCER = "lb"
+# Application and network load balancers and their target groups, by ARN
+LOAD_BALANCER_V2 = "lb2"
+TARGET_GROUP = "tg"
+LAUNCH_CONFIG = "lc"
+LAUNCH_TEMPLATE = "lt"
+AUTO_SCALING = "as"
+# Kinds only tracked on AWS, by tag
+INSTANCE = "instance"
+SNAPSHOT = "snapshot"
+# CloudWatch alarms of step scaling policies, keyed by auto scaling group
+ALARM = "alarm"
+
+STATE_FILE = "state.db"
+
+# Directories of the old one-file-per-resource layout. Key material is still
+# kept as files in "ssh" so it can be used directly with ssh -i
+_LEGACY_DIRS = ("sec_groups", "amis", "lb", "lc", "as")
+_KEYS_DIR = "ssh"
+
+
+class StateStore:
+    """
+    Index of the resources created by a project, kept in a single SQLite
+    database inside the project directory. Every write is transactional.
+    A readonly store opens an existing database as is: it is neither created
+    nor migrated, so tools that only look at a project never change it.
+    """
+
+    path: str
+    db_path: str
+    readonly: bool
+
+    def __init__(self, path: str, readonly: bool = False):
+        self.path = path
+        self.db_path = os.path.join(path, STATE_FILE)
+        self.readonly = readonly
+        self._lock = threading.RLock()
+
+        if readonly:
+            if not os.path.isfile(self.db_path):
+                raise FileNotFoundError(f"No state database at {self.db_path}")
+            self._conn = sqlite3.connect(
+                f"file:{self.db_path}?mode=ro",
+                uri=True,
+                timeout=30,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            return
+
+        new = not os.path.isfile(self.db_path)
+        self._conn = sqlite3.connect(
+            self.db_path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        if new:
+            os.chmod(self.db_path, 0o600)
+        self._migrate()
+
+    def __repr__(self):
+        mode = ", readonly" if self.readonly else ""
+        return f"StateStore({self.db_path}{mode})"
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _migrate(self):
+        with self._transaction() as conn:
+            (version,) = conn.execute("PRAGMA user_version").fetchone()
+            if version < 1:
+                conn.execute(
+                    """CREATE TABLE IF NOT EXISTS resources (
+                        kind TEXT NOT NULL,
+                        id TEXT NOT NULL,
+                        key TEXT,
+                        data TEXT NOT NULL DEFAULT '{}',
+                        created REAL NOT NULL,
+                        PRIMARY KEY (kind, id)
+                    )"""
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS resources_key ON resources (kind, key)")
+                self._import_legacy(conn)
+                conn.execute("PRAGMA user_version = 1")
+            if version < 2:
+                self._rekey_security_groups(conn)
+                conn.execute("PRAGMA user_version = 2")
+
+    def _rekey_security_groups(self, conn: sqlite3.Connection):
+        """Security groups used to be keyed by their port lists, key them by rule digest"""
+        rows = conn.execute(
+            "SELECT id, data FROM resources WHERE kind = ?", (SECURITY_GROUP,)
+        ).fetchall()
+        for rid, data in rows:
+            ports = json.loads(data)
+            if "rules" in ports:
+                continue
+            rules = security_group_rules(ports["tcp"], ports["udp"])
+            conn.execute(
+                "UPDATE resources SET key = ?, data = ? WHERE kind = ? AND id = ?",
+                (content_digest(rules), json.dumps({"rules": rules}), SECURITY_GROUP, rid),
+            )
+
+    def _import_legacy(self, conn: sqlite3.Connection):
+        """Imports the one-file-per-resource layout used before the state store"""
+
+        def read_lines(path: str) -> List[str]:
+            with open(path, "r") as f:
+                return f.read().splitlines()
+
+        rows: List[Tuple[str, str, Optional[str], Dict[str, Any]]] = []
+        keys_path = os.path.join(self.path, _KEYS_DIR)
+        if os.path.isdir(keys_path):
+            rows += [(KEY_PAIR, kp_id, None, {}) for kp_id in os.listdir(keys_path)]
+
+        legacy_files = []
+        for dirname in _LEGACY_DIRS:
+            dir_path = os.path.join(self.path, dirname)
+            if not os.path.isdir(dir_path):
+                continue
+            for rid in os.listdir(dir_path):
+                file_path = os.path.join(dir_path, rid)
+                legacy_files.append(file_path)
+                lines = read_lines(file_path)
+                if dirname == "sec_groups":
+                    tcp, udp = [[int(p) for p in line.split(",") if p != ""] for line in lines]
+                    rules = security_group_rules(tcp, udp)
+                    rows.append((SECURITY_GROUP, rid, content_digest(rules), {"rules": rules}))
+                elif dirname == "amis":
+                    rows.append((AMI, rid, None, {"name": lines[0] if lines else rid}))
+                elif dirname == "lb":
+                    rows.append((LOAD_BALANCER, rid, None, {"dns_name": lines[0]}))
+                elif dirname == "lc":
+                    ami_id, key_name, sg_id, itype = lines[:4]
+                    data = {"ami_id": ami_id, "key_name": key_name, "sg_id": sg_id, "itype": itype}
+                    rows.append((LAUNCH_CONFIG, rid, None, data))
+                else:
+                    rows.append((AUTO_SCALING, rid, None, {}))
+
+        now = time.time()
+        conn.executemany(
+            "INSERT OR REPLACE INTO resources (kind, id, key, data, created) VALUES (?, ?, ?, ?, ?)",
+            [(kind, rid, key, json.dumps(data), now) for kind, rid, key, data in rows],
+        )
+
+        for file_path in legacy_files:
+            os.remove(file_path)
+        for dirname in _LEGACY_DIRS:
+            dir_path = os.path.join(self.path, dirname)
+            if os.path.isdir(dir_path):
+                os.rmdir(dir_path)
+
+    def put(
+        self, kind: str, rid: str, data: Optional[Dict[str, Any]] = None, key: Optional[str] = None
+    ):
+        """Records resource rid of the given kind, replacing any previous record"""
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO resources (kind, id, key, data, created) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (kind, rid, key, json.dumps(data or {}), time.time()),
+            )
+
+    def get(self, kind: str, rid: str) -> Optional[Dict[str, Any]]:
+        """Returns the data recorded for rid or None if it is not recorded"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM resources WHERE kind = ? AND id = ?", (kind, rid)
+            ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def find(self, kind: str, key: str) -> Optional[str]:
+        """Returns the id of a resource recorded with key or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id FROM resources WHERE kind = ? AND key = ? LIMIT 1", (kind, key)
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def ids(self, kind: str) -> List[str]:
+        """Returns the ids of every resource of the given kind, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM resources WHERE kind = ? ORDER BY created", (kind,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def items(self, kind: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """Returns (id, data) of every resource of the given kind, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, data FROM resources WHERE kind = ? ORDER BY created", (kind,)
+            ).fetchall()
+        return [(rid, json.loads(data)) for rid, data in rows]
+
+    def keys(self, kind: str) -> Dict[str, str]:
+        """Returns {id: key} of the resources of the given kind recorded with a key"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, key FROM resources WHERE kind = ? AND key IS NOT NULL", (kind,)
+            ).fetchall()
+        return dict(rows)
+
+    def remove(self, kind: str, rid: str):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM resources WHERE kind = ? AND id = ?", (kind, rid))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def destroy(self):
+        """Closes the store and deletes its database"""
+        self.close()
+        for suffix in ("", "-wal", "-shm", "-journal"):
+            if os.path.isfile(self.db_path + suffix):
+                os.remove(self.db_path + suffix)
@@ -0,0 +1,90 @@
+from typing import Optional, Dict, Any, Callable, Iterable, Iterator, List, Tuple
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+Task = Tuple[Callable[[], Any], Iterable[str]]
+
+
+def chunks(items: List[Any], size: int) -> Iterator[List[Any]]:
+    """Splits items in lists of at most size items, for APIs limiting how many ids a call takes"""
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+class TaskResult:
+    """Outcome of one task of a graph run by run_graph"""
+
+    __slots__ = ("name", "result", "error", "elapsed", "skipped")
+
+    def __init__(
+        self,
+        name: str,
+        result: Any = None,
+        error: Optional[BaseException] = None,
+        elapsed: float = 0.0,
+        skipped: bool = False,
+    ):
+        self.name = name
+        self.result = result
+        self.error = error
+        self.elapsed = elapsed
+        self.skipped = skipped
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and not self.skipped
+
+    def __repr__(self):
+        if self.skipped:
+            return f"TaskResult({self.name}, skipped)"
+        if self.error is not None:
+            return f"TaskResult({self.name}, error={self.error!r}, {self.elapsed:.2f}s)"
+        return f"TaskResult({self.name}, {self.elapsed:.2f}s)"
+
+
+def _timed(name: str, fn: Callable[[], Any]) -> TaskResult:
+    start = time.monotonic()
+    try:
+        result = fn()
+    except Exception as e:
+        return TaskResult(name, error=e, elapsed=time.monotonic() - start)
+    return TaskResult(name, result=result, elapsed=time.monotonic() - start)
+
+
+def run_graph(tasks: Dict[str, Task], max_workers: int = 4) -> Dict[str, TaskResult]:
+    """
+    Runs tasks, a mapping of name to (function, names of dependencies), on a
+    thread pool. A task starts once all its dependencies succeeded and is
+    skipped if any of them failed. Returns the result of every task.
+    """
+    for name, (_, deps) in tasks.items():
+        for dep in deps:
+            if dep not in tasks:
+                raise ValueError(f"Task {name} depends on unknown task {dep}")
+
+    results: Dict[str, TaskResult] = {}
+    pending = {name: (fn, tuple(deps)) for name, (fn, deps) in tasks.items()}
+    running: Dict[Any, str] = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            for name, (fn, deps) in list(pending.items()):
+                if not all(dep in results for dep in deps):
+                    continue
+                del pending[name]
+                if all(results[dep].ok for dep in deps):
+                    running[executor.submit(_timed, name, fn)] = name
+                else:
+                    results[name] = TaskResult(name, skipped=True)
+
+            if not running:
+                if pending:
+                    raise ValueError(f"Dependency cycle between tasks {', '.join(pending)}")
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                results[name] = future.result()
+
+    return results
@@ -1,16 +1,46 @@
-from typing import Optional, Dict, List, Any, Iterator, Tuple
+from typing import Optional, Dict, List, Any, Callable, Iterator, Tuple, TYPE_CHECKING
 import logging
 import os
-import sys
-import time
 import string
 import random
 
-import boto3
-import botocore
-from botocore.exceptions import ClientError
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
 
 from .version import __version__
+from .paths import get_data_path, project_path, keys_path, atomic_write
+from .locks import ProjectLock
+from .clients import ClientPool, pool as client_pool
+from .metrics import ApiStats
+from .cache import MetadataCache, metadata_cache
+from .polling import Backoff, PollTimeout, Steps, Wait, poll, run_steps
+from .tasks import Task, TaskResult, run_graph, chunks
+from .digest import SecurityGroupRule, security_group_rules, content_digest, ami_digest
+from .state import (
+    StateStore,
+    KEY_PAIR,
+    SECURITY_GROUP,
+    AMI,
+    LOAD_BALANCER,
+    LOAD_BALANCER_V2,
+    TARGET_GROUP,
+    LAUNCH_CONFIG,
+    LAUNCH_TEMPLATE,
+    AUTO_SCALING,
+    INSTANCE,
+    SNAPSHOT,
+    ALARM,
+)
+from .records import InstanceRecord, TerminationOutcome
+from .spec import Change, normalize_spec, section_digest, rule_ports
+from .warmpool import WarmPool, WARM_POOL_TAG
+from .readiness import Probe, StatusOk
+from .inventory import Inventory, InventoryCollector, _MAX_FILTER_VALUES, _MAX_ELBV2_ARNS
+from .scaling import ScalingGroup, TargetTracking
+
+if TYPE_CHECKING:
+    import boto3
+    import botocore
 
 # logging.basicConfig(level=logging.DEBUG)
 
@@ -21,10 +51,65 @@ from .version import __version__
 #     def __init__(self, ip: str):
 #         self.ip = ip
 logger = logging.getLogger("thunder")
-logger.setLevel(logging.INFO)
-handler = logging.StreamHandler()
-handler.setFormatter(logging.Formatter("[%(name)s] [%(levelname)s] %(message)s"))
-logger.addHandler(handler)
+_handler: Optional[logging.Handler] = None
+
+
+def _setup_logging():
+    """
+    Attaches the default handler to the thunder logger when the first Thunder is
+    built, unless the application already gave it one. The level is left alone,
+    set it to INFO to follow what thunder does
+    """
+    global _handler
+    if _handler is not None or logger.handlers:
+        return
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("[%(name)s] [%(levelname)s] %(message)s"))
+    logger.addHandler(_handler)
+
+# Maximum number of ids accepted by a single terminate_instances/describe_instances call
+_MAX_INSTANCE_IDS = 1000
+# Errors of terminate_instances caused by some of its ids, the others can still be terminated
+_INVALID_INSTANCE_ID_CODES = ("InvalidInstanceID.NotFound", "InvalidInstanceID.Malformed")
+# Maximum number of names accepted by a single autoscaling describe call
+_MAX_AS_NAMES = 50
+# Maximum number of alarms accepted by a single cloudwatch.delete_alarms call
+_MAX_ALARM_NAMES = 100
+# Single attempt, used when no retries are wanted
+_NO_RETRY = Backoff(timeout=0.0)
+# Tag holding the digest of the rules of security groups created by thunder
+_SG_DIGEST_TAG = "thunder_sg_digest"
+# Tag holding the digest of the spec of instances created by apply
+_SPEC_TAG = "thunder_spec_digest"
+# Tag holding the digest of the inputs of AMIs built by build_ami
+_AMI_DIGEST_TAG = "thunder_ami_digest"
+# States of AMIs that will never become available, None when it is not found
+_GONE_AMI_STATES = (None, "failed", "deregistered")
+# State key of the auto scaling group managed by apply
+_SPEC_KEY = "spec"
+
+# Stages of delete_project and the stages each one waits for
+_DELETE_STAGES: Dict[str, Tuple[str, ...]] = {
+    "auto_scaling": (),
+    "launch_configs": ("auto_scaling",),
+    "launch_templates": ("auto_scaling",),
+    "load_balancers": ("auto_scaling",),
+    "load_balancers_v2": ("auto_scaling",),
+    "amis": (),
+    # Snapshots left behind by AMIs deleted outside of thunder
+    "snapshots": ("amis",),
+    "instances": (),
+    # Delete keys after the instances so we still have access if an error occurs
+    "key_pairs": ("instances",),
+    "security_groups": (
+        "auto_scaling",
+        "launch_configs",
+        "launch_templates",
+        "load_balancers",
+        "load_balancers_v2",
+        "instances",
+    ),
+}
 
 
 class Thunder:
@@ -36,27 +121,50 @@ class Thunder:
     tags: List[Dict[str, str]]
     filters: List[Dict[str, str]]
 
-    ec2: boto3.resources.base.ServiceResource
-    client: botocore.client.BaseClient
+    # Polling schedules, replace them to tune how resources are waited for
+    instance_backoff: Backoff = Backoff(first=0.0, base=5.0, cap=15.0, timeout=900.0)
+    elb_backoff: Backoff = Backoff(first=0.0, base=2.0, cap=15.0, timeout=900.0)
+    as_backoff: Backoff = Backoff(first=0.5, base=0.5, cap=5.0, timeout=300.0)
+    image_backoff: Backoff = Backoff(first=0.0, base=5.0, cap=15.0, timeout=900.0)
+    # Force deleting a group terminates its instances first, which takes a while
+    as_delete_backoff: Backoff = Backoff(first=0.5, base=2.0, cap=15.0, timeout=1800.0)
+    # Used by delete_project to retry security groups still in use
+    sg_backoff: Backoff = Backoff(first=0.0, base=2.0, cap=20.0, timeout=600.0)
+
+    pool: ClientPool
     project_name: str
 
     region: str
+    profile_name: Optional[str]
     _project_path: str
     _keys_path: str
-    _sec_group_path: str
-    _lb_path: str
-    _lc_path: str
-    _as_path: str
-    _ami_path: str
+    _sg_cache: Dict[str, str]
+    _has_key_pair: bool
+    # Threads baking, copying and deleting AMIs in the background
+    ami_workers: int = 8
+    _ami_executor: Optional[ThreadPoolExecutor]
+    # Seconds account metadata (subnets, availability zones...) is cached for
+    metadata_ttl: float = 300.0
+    persist_metadata: bool
+    _state: Optional[StateStore]
+    _locks: Dict[str, ProjectLock]
     _pname: str
+    warm_pool: Optional[WarmPool]
 
-    def __init__(self, project_name: str, region: str, version_incompatible: bool = True):
+    def __init__(
+        self,
+        project_name: str,
+        region: str,
+        version_incompatible: bool = True,
+        profile_name: Optional[str] = None,
+        pool: Optional[ClientPool] = None,
+        persist_metadata: bool = False,
+        warm_pool_size: int = 0,
+    ):
         self.region = region
-        self.ec2 = boto3.resource("ec2", region_name=region)
-        self.client = boto3.client("ec2", region_name=region)
-
-        self.elb_client = boto3.client("elb", region_name=region)
-        self.as_client = boto3.client("autoscaling")  # , region_name=region)
+        self.profile_name = profile_name
+        # AWS clients are shared through the pool and only created on first use
+        self.pool = client_pool if pool is None else pool
 
         self.project_name = project_name
         self._thunder_proj_tag = {"Key": "thunder_project", "Value": project_name}
@@ -69,11 +177,46 @@ class Thunder:
             self.filters = [self._thunder_proj_filter]
 
         self._pname = f"{self.region}_{self.project_name}"
-        self._create_dirs()
+        self._sg_cache = {}
+        self._has_key_pair = False
+        self.persist_metadata = persist_metadata
+        self._project_path = project_path(region, project_name)
+        self._keys_path = keys_path(region, project_name)
+        self._state = None
+        self._state_lock = threading.Lock()
+        self._locks = {}
+        self._ami_executor = None
+        # Stopped instances kept ready for create_instances, off by default
+        self.warm_pool = WarmPool(self, warm_pool_size) if warm_pool_size > 0 else None
+        _setup_logging()
 
     def __repr__(self):
         return f"Thunder({self.region}, {self.project_name})"
 
+    @property
+    def ec2(self) -> "boto3.resources.base.ServiceResource":
+        return self.pool.resource("ec2", self.region, self.profile_name)
+
+    @property
+    def client(self) -> "botocore.client.BaseClient":
+        return self.pool.client("ec2", self.region, self.profile_name)
+
+    @property
+    def elb_client(self) -> "botocore.client.BaseClient":
+        return self.pool.client("elb", self.region, self.profile_name)
+
+    @property
+    def elbv2_client(self) -> "botocore.client.BaseClient":
+        return self.pool.client("elbv2", self.region, self.profile_name)
+
+    @property
+    def as_client(self) -> "botocore.client.BaseClient":
+        return self.pool.client("autoscaling", self.region, self.profile_name)
+
+    @property
+    def cw_client(self) -> "botocore.client.BaseClient":
+        return self.pool.client("cloudwatch", self.region, self.profile_name)
+
     def __str__(self):
         return f"Thunder({self.region}, {self.project_name})"
 
@@ -87,30 +230,82 @@ class Thunder:
             )
         return "".join(random.choice(string.ascii_letters + string.digits) for i in range(8))
 
+    @property
+    def api_stats(self) -> ApiStats:
+        """Latency, retry and throttling stats of the API calls made through the client pool"""
+        return self.pool.stats
+
+    @property
+    def metadata(self) -> MetadataCache:
+        """Cache of the account metadata of this region, shared by every Thunder object"""
+        return metadata_cache(
+            self.region, self.profile_name, persist=self.persist_metadata, ttl=self.metadata_ttl
+        )
+
+    def invalidate_metadata(self, key: Optional[str] = None):
+        """Forgets the cached subnets, availability zones... or only key"""
+        self.metadata.invalidate(key)
+
+    def subnet_ids(self) -> List[str]:
+        return self.metadata.get(
+            "subnets",
+            lambda: [s["SubnetId"] for s in self.client.describe_subnets()["Subnets"]],
+            ttl=self.metadata_ttl,
+        )
+
+    def default_subnets(self) -> List[Dict[str, str]]:
+        """The default subnet of each availability zone, all in the default VPC"""
+        return self.metadata.get(
+            "default_subnets",
+            lambda: [
+                {
+                    "SubnetId": s["SubnetId"],
+                    "AvailabilityZone": s["AvailabilityZone"],
+                    "VpcId": s["VpcId"],
+                }
+                for s in self.client.describe_subnets(
+                    Filters=[{"Name": "default-for-az", "Values": ["true"]}]
+                )["Subnets"]
+            ],
+            ttl=self.metadata_ttl,
+        )
+
+    def availability_zones(self) -> List[str]:
+        return self.metadata.get(
+            "availability_zones",
+            lambda: [
+                z["ZoneName"]
+                for z in self.client.describe_availability_zones()["AvailabilityZones"]
+            ],
+            ttl=self.metadata_ttl,
+        )
+
     @staticmethod
     def get_data_path():
-        config_path = os.getenv("XDG_CONFIG_HOME")
-        if config_path is None:
-            home = os.getenv("HOME", default="~")
-            config_path = os.path.join(home, ".config")
-
-        return os.path.join(config_path, "thunder")
+        return get_data_path()
+
+    @property
+    def state(self) -> StateStore:
+        """Local state of the project, opened on first use"""
+        if self._state is None:
+            with self._state_lock:
+                if self._state is None:
+                    self._create_dirs()
+                    self._state = StateStore(self._project_path)
+        return self._state
+
+    def _lock(self, name: str) -> ProjectLock:
+        """Lock named name shared by every thread and process using this project"""
+        state = self.state  # Creates the project directory
+        with self._state_lock:
+            lock = self._locks.get(name)
+            if lock is None:
+                lock = self._locks[name] = ProjectLock(os.path.join(state.path, f".{name}.lock"))
+            return lock
 
     def _create_dirs(self):
         # Create base directory
-        config_path = os.getenv("XDG_CONFIG_HOME")
-        if config_path is None:
-            home = os.getenv("HOME", default="~")
-            config_path = os.path.join(home, ".config")
-
-        data_path = os.path.join(config_path, "thunder")
-        self._project_path = os.path.join(data_path, self._pname)
-        self._keys_path = os.path.join(self._project_path, "ssh")
-        self._sec_group_path = os.path.join(self._project_path, "sec_groups")
-        self._ami_path = os.path.join(self._project_path, "amis")
-        self._lb_path = os.path.join(self._project_path, "lb")
-        self._lc_path = os.path.join(self._project_path, "lc")
-        self._as_path = os.path.join(self._project_path, "as")
+        data_path = get_data_path()
 
         def dir_create(d):
             if not os.path.isdir(d):
@@ -121,35 +316,21 @@ class Thunder:
             os.mkdir(data_path)
         dir_create(self._project_path)
         dir_create(self._keys_path)
-        dir_create(self._sec_group_path)
-        dir_create(self._ami_path)
-        dir_create(self._lb_path)
-        dir_create(self._lc_path)
-        dir_create(self._as_path)
 
-    def create_instances(
+    def _launch_instances(
         self,
         image_id: str,
-        start_script_data: Optional[str] = None,
-        start_script: Optional[str] = None,
-        itype: str = "t2.micro",
-        tcp_ports: Iterator[int] = (22,),
-        udp_ports: Iterator[int] = tuple(),
-        count: Iterator[int] = (1, 1),
-        # key_name: Optional[str] = None
-    ):
+        start_script_data: Optional[str],
+        start_script: Optional[str],
+        itype: str,
+        tcp_ports: Iterator[int],
+        udp_ports: Iterator[int],
+        count: Iterator[int],
+        tags: Optional[List[Dict[str, str]]] = None,
+    ) -> List[Any]:
+        """Launches the instances without waiting for them, tagged with the project tags and tags"""
         min_count, max_count = count
-        if start_script and start_script_data:
-            raise RuntimeError(
-                "Thunder.create_instances cannot get both start_script_data \
-and start_script as arguments"
-            )
-        if start_script:
-            with open(start_script, "r") as f:
-                start_script_data = f.read()
-        else:
-            if not start_script_data:
-                start_script_data = ""
+        start_script_data = self._start_script_data(start_script_data, start_script)
         # print(start_script_data)
 
         # if key_name is None:
@@ -166,16 +347,156 @@ and start_script as arguments"
             SecurityGroupIds=[sg_id],
             UserData=start_script_data,
             KeyName=self._pname,  # Same key for whole project
-            TagSpecifications=[{"ResourceType": "instance", "Tags": self.tags}],
+            TagSpecifications=[{"ResourceType": "instance", "Tags": self.tags + (tags or [])}],
         )
+        logger.info(
+            "%s - Created instances with ids %s",
+            self,
+            ", ".join(instance.id for instance in instances),
+        )
+        return instances
 
-        for instance in instances:
-            logger.info("%s - Creating instance with id %s and waiting until ok", self, instance.id)
+    @staticmethod
+    def _start_script_data(start_script_data: Optional[str], start_script: Optional[str]) -> str:
+        if start_script and start_script_data:
+            raise RuntimeError(
+                "Thunder.create_instances cannot get both start_script_data \
+and start_script as arguments"
+            )
+        if start_script:
+            with open(start_script, "r") as f:
+                return f.read()
+        return start_script_data or ""
+
+    def _acquire_instances(
+        self,
+        image_id: str,
+        start_script_data: Optional[str],
+        start_script: Optional[str],
+        itype: str,
+        tcp_ports: Iterator[int],
+        udp_ports: Iterator[int],
+        count: Iterator[int],
+        tags: Optional[List[Dict[str, str]]] = None,
+    ) -> List[Any]:
+        """Starts instances from the warm pool, if there is one, and launches the rest.
+        The pool is then refilled in the background"""
+        if self.warm_pool is None:
+            return self._launch_instances(
+                image_id, start_script_data, start_script, itype, tcp_ports, udp_ports, count, tags
+            )
+
+        min_count, max_count = count
+        tcp_ports, udp_ports = list(tcp_ports), list(udp_ports)
+        start_script_data = self._start_script_data(start_script_data, start_script)
+        sg_id = self.require_security_group(tcp_ports, udp_ports)
+        key = WarmPool.key(image_id, itype, sg_id, start_script_data)
+
+        taken = self.warm_pool.take(key, max_count)
+        if taken and tags:
+            self.client.create_tags(Resources=taken, Tags=tags)
+        instances = [self.ec2.Instance(iid) for iid in taken]
+        if len(taken) < max_count:
+            instances += self._launch_instances(
+                image_id,
+                start_script_data,
+                None,
+                itype,
+                tcp_ports,
+                udp_ports,
+                (max(1, min_count - len(taken)), max_count - len(taken)),
+                tags,
+            )
+        self.warm_pool.refill(key, image_id, start_script_data, itype, tcp_ports, udp_ports)
+        return instances
+
+    def _reload_instances(self, instances: List[Any]):
+        """Loads the data of all instances with a single describe_instances call
+        instead of one instance.load() per instance"""
+        if not instances:
+            return
+        by_id = {instance.id: instance for instance in instances}
+        paginator = self.client.get_paginator("describe_instances")
+        for page in paginator.paginate(InstanceIds=list(by_id)):
+            for reservation in page["Reservations"]:
+                for data in reservation["Instances"]:
+                    instance = by_id.get(data["InstanceId"])
+                    if instance is not None:
+                        instance.meta.data = data
+
+    def _status_ok_ids(self, instance_ids: List[str]) -> List[str]:
+        """Returns the ids from instance_ids whose instance status is ok"""
+        from botocore.exceptions import ClientError
+
+        try:
+            response = self.client.describe_instance_status(InstanceIds=instance_ids)
+        except ClientError as ce:
+            # Freshly launched instances may not be visible yet
+            if ce.response["Error"]["Code"] == "InvalidInstanceID.NotFound":
+                return []
+            raise
+        return [
+            status["InstanceId"]
+            for status in response["InstanceStatuses"]
+            if status["InstanceStatus"]["Status"] == "ok"
+        ]
+
+    def create_instances(
+        self,
+        image_id: str,
+        start_script_data: Optional[str] = None,
+        start_script: Optional[str] = None,
+        itype: str = "t2.micro",
+        tcp_ports: Iterator[int] = (22,),
+        udp_ports: Iterator[int] = tuple(),
+        count: Iterator[int] = (1, 1),
+        batch_wait: bool = True,
+        tags: Optional[List[Dict[str, str]]] = None,
+        readiness: Optional[Probe] = None,
+        # key_name: Optional[str] = None
+    ):
+        """Creates instances and waits until all of them are ok.
+        With batch_wait a single waiter is used for the whole batch, otherwise
+        each instance is waited for one after the other.
+        A readiness probe from thunder.readiness replaces the status checks,
+        e.g. TcpPort(22) returns as soon as ssh answers.
+        tags are added to the project tags of the instances.
+        With a warm pool, pooled instances are started before launching new ones"""
+        instances = self._acquire_instances(
+            image_id, start_script_data, start_script, itype, tcp_ports, udp_ports, count, tags
+        )
 
+        if readiness is not None:
+            logger.info(
+                "%s - Waiting until %d instances are %s",
+                self,
+                len(instances),
+                readiness.description,
+            )
+            readiness.wait(self, instances)
+            self._reload_instances(instances)
+        elif batch_wait:
+            logger.info("%s - Waiting until %d instances are ok", self, len(instances))
             waiter = self.client.get_waiter("instance_status_ok")
-            waiter.wait(InstanceIds=[instance.id])
+            # Without IncludeAllInstances, pending instances are left out and the
+            # waiter would be satisfied by the ones already running
+            waiter.wait(
+                InstanceIds=[instance.id for instance in instances], IncludeAllInstances=True
+            )
             # instance.wait_until_running() # This doesnt wait for the start script
-            instance.load()
+            self._reload_instances(instances)
+        else:
+            for instance in instances:
+                logger.info("%s - Waiting until instance with id %s is ok", self, instance.id)
+                waiter = self.client.get_waiter("instance_status_ok")
+                waiter.wait(InstanceIds=[instance.id], IncludeAllInstances=True)
+                instance.load()
+
+        self._log_addresses(instances)
+        return instances
+
+    def _log_addresses(self, instances: List[Any]):
+        for instance in instances:
             logger.info(
                 "%s - Instance with id %s has public ip %s",
                 self,
@@ -183,7 +504,37 @@ and start_script as arguments"
                 instance.public_ip_address,
             )
 
-        return instances
+    def iter_create_instances(
+        self,
+        image_id: str,
+        start_script_data: Optional[str] = None,
+        start_script: Optional[str] = None,
+        itype: str = "t2.micro",
+        tcp_ports: Iterator[int] = (22,),
+        udp_ports: Iterator[int] = tuple(),
+        count: Iterator[int] = (1, 1),
+        backoff: Optional[Backoff] = None,
+        readiness: Optional[Probe] = None,
+    ) -> Iterator[Any]:
+        """Creates instances and yields each one as soon as its status is ok,
+        or it passes the readiness probe.
+        Instances are only launched once iteration starts.
+        Status checks follow backoff, self.instance_backoff by default"""
+        instances = self._acquire_instances(
+            image_id, start_script_data, start_script, itype, tcp_ports, udp_ports, count
+        )
+        readiness = readiness or StatusOk(backoff=backoff or self.instance_backoff)
+        for ready in readiness.iter_ready(self, instances):
+            self._reload_instances(ready)
+            for instance in ready:
+                logger.info(
+                    "%s - Instance with id %s is %s and has public ip %s",
+                    self,
+                    instance.id,
+                    readiness.description,
+                    instance.public_ip_address,
+                )
+                yield instance
 
     def create_instance(
         self,
@@ -205,59 +556,436 @@ and start_script as arguments"
             udp_ports=udp_ports,
         )[0]
 
-    def delete_project(self, folders=False):
-        """Terminate all instances and key pairs associated with the project"""
-        self.delete_all_auto_scaling()
-        self.delete_all_launch_configs()
-        self.delete_all_load_balancers()
-
-        self.delete_all_amis()
+    def inventory(self, max_workers: int = 4) -> Inventory:
+        """
+        Snapshot of every resource of the project as ResourceRecord objects indexed
+        by kind and id. Uses bulk tag queries (ec2 and elb describe_tags, autoscaling
+        tag filters) and paginated describes, one service per thread.
+        """
+        return InventoryCollector(self).collect(max_workers=max_workers)
 
-        # Do terminate_all_instances before deleting keys se we still have access if error occurs
-        self.terminate_all_instances()
-        self.delete_all_key_pairs()
+    def _known_ids(self, kind: str, inventory: Optional[Inventory]) -> List[str]:
+        """Ids of kind in the local state followed by those only found in inventory"""
+        ids = self.state.ids(kind)
+        if inventory is not None:
+            recorded = set(ids)
+            ids += [rid for rid in inventory.ids(kind) if rid not in recorded]
+        return ids
 
-        self.delete_all_security_groups()
+    def delete_project(self, folders=False, max_workers: int = 4) -> Dict[str, float]:
+        """
+        Delete every resource associated with the project, as found in the local
+        state and in a single inventory of the tagged resources.
+        Independent stages run concurrently on a pool of max_workers threads.
+        Returns how long each stage took, in seconds.
+        """
+        if self.warm_pool is not None:
+            # Instances still being added to the pool would be left behind
+            self.warm_pool.wait()
+        inventory = self.inventory(max_workers=max_workers)
+        deleters: Dict[str, Callable[[], Any]] = {
+            "auto_scaling": lambda: self.delete_all_auto_scaling(inventory),
+            "launch_configs": lambda: self.delete_all_launch_configs(inventory),
+            "launch_templates": lambda: self.delete_all_launch_templates(inventory),
+            "load_balancers": lambda: self.delete_all_load_balancers(inventory),
+            "load_balancers_v2": lambda: self.delete_all_load_balancers_v2(inventory),
+            "amis": lambda: self.delete_all_amis(inventory),
+            "snapshots": lambda: self.delete_all_snapshots(inventory),
+            "instances": lambda: self.terminate_all_instances(inventory=inventory),
+            "key_pairs": lambda: self.delete_all_key_pairs(inventory),
+            "security_groups": lambda: self.delete_all_security_groups(self.sg_backoff, inventory),
+        }
+        stages: Dict[str, Task] = {
+            name: (deleters[name], deps) for name, deps in _DELETE_STAGES.items()
+        }
+        results = run_graph(stages, max_workers=max_workers)
+        return self._deleted_project(results, folders)
+
+    def _deleted_project(self, results: Dict[str, TaskResult], folders: bool) -> Dict[str, float]:
+        """Reports the stages run by delete_project and removes the project directory"""
+        for result in results.values():
+            if result.skipped:
+                logger.error("%s - Skipped deleting %s", self, result.name)
+            elif result.error is not None:
+                logger.error(
+                    "%s - Failed deleting %s after %.1fs: %s",
+                    self,
+                    result.name,
+                    result.elapsed,
+                    result.error,
+                )
+            else:
+                logger.info("%s - Deleted %s in %.1fs", self, result.name, result.elapsed)
+
+        for result in results.values():
+            if result.error is not None:
+                raise result.error
 
         if folders:
-            os.rmdir(self._lb_path)
-            os.rmdir(self._lc_path)
-            os.rmdir(self._as_path)
-            os.rmdir(self._ami_path)
-            os.rmdir(self._sec_group_path)
+            self.state.destroy()
+            self._state = None
+            for name in os.listdir(self._project_path):
+                if name.endswith(".lock"):
+                    os.remove(os.path.join(self._project_path, name))
             os.rmdir(self._keys_path)
             os.rmdir(self._project_path)
 
+        return {name: result.elapsed for name, result in results.items()}
+
+    def apply(self, spec: Dict[str, Any], max_workers: int = 4) -> List[Change]:
+        """
+        Reconciles the project with a declarative spec, a dict with optional
+        instances, load_balancer, launch_config and auto_scaling sections taking
+        the arguments of the matching create methods (see thunder.spec).
+        Resources are identified by a digest of their section and reused while
+        it does not change, the auto scaling group is updated in place. Resources
+        of changed or removed sections are deleted once they are replaced.
+        Resources created outside of apply are never touched.
+        Returns the changes made, and the resources kept, as Change records.
+        """
+        desired = normalize_spec(spec)
+        digests = {
+            kind: section_digest(desired[section])
+            for kind, section in (
+                (LOAD_BALANCER, "load_balancer"),
+                (LAUNCH_CONFIG, "launch_config"),
+            )
+            if section in desired
+        }
+
+        def load_balancer() -> List[Change]:
+            section = desired["load_balancer"]
+            return self._reuse_or_create(
+                LOAD_BALANCER,
+                digests[LOAD_BALANCER],
+                self._existing_load_balancers,
+                lambda: self.create_load_balancer(
+                    rule_ports(section["rules"], "tcp"), rule_ports(section["rules"], "udp")
+                )[0],
+            )
+
+        def launch_config() -> List[Change]:
+            section = desired["launch_config"]
+            return self._reuse_or_create(
+                LAUNCH_CONFIG,
+                digests[LAUNCH_CONFIG],
+                self._existing_launch_configs,
+                lambda: self.create_launch_config(
+                    section["ami_id"],
+                    rule_ports(section["rules"], "tcp"),
+                    rule_ports(section["rules"], "udp"),
+                    itype=section["itype"],
+                    monitoring=section["monitoring"],
+                ),
+            )
+
+        def auto_scaling() -> List[Change]:
+            lc_name = lb_name = None
+            if LAUNCH_CONFIG in digests:
+                lc_name = self.state.find(LAUNCH_CONFIG, digests[LAUNCH_CONFIG])
+            if LOAD_BALANCER in digests:
+                lb_name = self.state.find(LOAD_BALANCER, digests[LOAD_BALANCER])
+            return self._apply_auto_scaling(desired.get("auto_scaling"), lc_name, lb_name)
+
+        def prune() -> List[Change]:
+            changes = []
+            for kind, delete in (
+                (LAUNCH_CONFIG, self._delete_launch_configs_steps),
+                (LOAD_BALANCER, self._delete_load_balancers_steps),
+            ):
+                keys = self.state.keys(kind)
+                stale = [rid for rid, key in keys.items() if key != digests.get(kind)]
+                if stale:
+                    run_steps(delete(stale))
+                    changes += [Change("delete", kind, rid) for rid in stale]
+            return changes
+
+        stages: Dict[str, Task] = {
+            "instances": (lambda: self._apply_instances(desired.get("instances")), ()),
+        }
+        if "load_balancer" in desired:
+            stages["load_balancer"] = (load_balancer, ())
+        if "launch_config" in desired:
+            stages["launch_config"] = (launch_config, ())
+        stages["auto_scaling"] = (
+            auto_scaling,
+            tuple(name for name in ("load_balancer", "launch_config") if name in stages),
+        )
+        # Replaced resources go once nothing uses them anymore
+        stages["prune"] = (prune, ("auto_scaling",))
+        results = run_graph(stages, max_workers=max_workers)
+
+        changes: List[Change] = []
+        for result in results.values():
+            if result.error is not None:
+                raise result.error
+            changes += result.result or []
+        for change in changes:
+            if change.action != "keep":
+                logger.info("%s - Applied %r", self, change)
+        return changes
+
+    def _reuse_or_create(self, kind: str, digest: str, existing, create) -> List[Change]:
+        """Reuses the resource recorded with digest if it still exists, creates it otherwise"""
+        rid = self.state.find(kind, digest)
+        if rid is not None:
+            if existing([rid]):
+                return [Change("keep", kind, rid)]
+            logger.info("%s - Recorded %s %s no longer exists", self, kind, rid)
+            self.state.remove(kind, rid)
+        rid = create()
+        self.state.put(kind, rid, self.state.get(kind, rid), key=digest)
+        return [Change("create", kind, rid)]
+
+    def _apply_instances(self, section: Optional[Dict[str, Any]]) -> List[Change]:
+        """Launches or terminates instances created by apply so count of them match section"""
+        current: Dict[str, List[str]] = {}
+        for record in self.filter_instances(
+            instance_status=None, custom_filters=[{"Name": "tag-key", "Values": [_SPEC_TAG]}]
+        ):
+            if record.state in ("pending", "running") and _SPEC_TAG in record.tags:
+                current.setdefault(record.tags[_SPEC_TAG], []).append(record.id)
+
+        changes: List[Change] = []
+        stale: List[str] = []
+        if section is not None:
+            digest = section_digest(section, "count")
+            keep = current.pop(digest, [])
+            count = section["count"]
+            stale += keep[count:]
+            changes += [Change("keep", "instance", iid) for iid in keep[:count]]
+            missing = count - len(keep)
+            if missing > 0:
+                instances = self.create_instances(
+                    section["image_id"],
+                    start_script_data=section["start_script_data"],
+                    itype=section["itype"],
+                    tcp_ports=rule_ports(section["rules"], "tcp"),
+                    udp_ports=rule_ports(section["rules"], "udp"),
+                    count=(missing, missing),
+                    tags=[{"Key": _SPEC_TAG, "Value": digest}],
+                )
+                changes += [Change("create", "instance", instance.id) for instance in instances]
+        # Outdated instances go after their replacements are ok
+        for ids in current.values():
+            stale += ids
+        if stale:
+            changes += [
+                Change("delete", "instance", outcome.id, outcome.error)
+                for outcome in self.terminate_instances(stale)
+            ]
+        return changes
+
+    def _apply_auto_scaling(
+        self, section: Optional[Dict[str, Any]], lc_name: Optional[str], lb_name: Optional[str]
+    ) -> List[Change]:
+        """Creates, updates in place or deletes the auto scaling group managed by apply"""
+        as_name = self.state.find(AUTO_SCALING, _SPEC_KEY)
+        group = None
+        if as_name is not None:
+            response = self.as_client.describe_auto_scaling_groups(AutoScalingGroupNames=[as_name])
+            for group in response["AutoScalingGroups"]:
+                break
+            if group is None:
+                logger.info("%s - Recorded auto scaling %s no longer exists", self, as_name)
+                self.state.remove(AUTO_SCALING, as_name)
+
+        if section is None:
+            if group is None:
+                return []
+            self._delete_auto_scaling_groups([as_name])
+            return [Change("delete", AUTO_SCALING, as_name)]
+
+        target_cpu = section["target_cpu"]
+        if group is None:
+            as_name = self.create_auto_scaling(
+                lc_name, lb_name, section["min_size"], section["max_size"], section["desired"]
+            )
+            data = dict(self.state.get(AUTO_SCALING, as_name), target_cpu=target_cpu)
+            self.state.put(AUTO_SCALING, as_name, data, key=_SPEC_KEY)
+            changes = [Change("create", AUTO_SCALING, as_name)]
+            if target_cpu is not None:
+                changes += self._apply_scaling_policies(as_name, target_cpu)
+            return changes
+
+        updates = {
+            field: value
+            for field, value in (
+                ("LaunchConfigurationName", lc_name),
+                ("MinSize", section["min_size"]),
+                ("MaxSize", section["max_size"]),
+                # The target tracking policy owns the capacity
+                ("DesiredCapacity", section["desired"] if target_cpu is None else None),
+            )
+            if value is not None and group.get(field) != value
+        }
+        if updates:
+            self.as_client.update_auto_scaling_group(AutoScalingGroupName=as_name, **updates)
+
+        current_lbs = set(group.get("LoadBalancerNames", []))
+        wanted_lbs = set() if lb_name is None else {lb_name}
+        if wanted_lbs - current_lbs:
+            self.as_client.attach_load_balancers(
+                AutoScalingGroupName=as_name, LoadBalancerNames=sorted(wanted_lbs - current_lbs)
+            )
+        if current_lbs - wanted_lbs:
+            self.as_client.detach_load_balancers(
+                AutoScalingGroupName=as_name, LoadBalancerNames=sorted(current_lbs - wanted_lbs)
+            )
+        if current_lbs != wanted_lbs:
+            updates["LoadBalancerNames"] = sorted(wanted_lbs)
+
+        recorded = self.state.get(AUTO_SCALING, as_name) or {}
+        policy_changes: List[Change] = []
+        if recorded.get("target_cpu") != target_cpu:
+            policy_changes = self._apply_scaling_policies(as_name, target_cpu)
+
+        if not updates and not policy_changes:
+            return [Change("keep", AUTO_SCALING, as_name)]
+        self.state.put(
+            AUTO_SCALING,
+            as_name,
+            {"lc_name": lc_name, "lb_name": lb_name, "target_cpu": target_cpu},
+            key=_SPEC_KEY,
+        )
+        if updates:
+            change = Change("update", AUTO_SCALING, as_name, ", ".join(sorted(updates)))
+        else:
+            change = Change("keep", AUTO_SCALING, as_name)
+        return [change] + policy_changes
+
+    def _apply_scaling_policies(self, as_name: str, target_cpu: Optional[float]) -> List[Change]:
+        """The scaling policies of the group managed by apply: none or one on CPU"""
+        policies = {} if target_cpu is None else {"cpu": TargetTracking(target_cpu)}
+        return self.scaling_group(as_name).update(policies=policies)
+
     def terminate_instance(self, instance):
-        logger.info("%s - Terminating instance with id %s", self, instance.id)
-        instance.terminate()
+        self.terminate_instances([instance.id])
+
+    def _terminate_chunk(self, instance_ids: List[str]) -> List[TerminationOutcome]:
+        from botocore.exceptions import ClientError
+
+        try:
+            response = self.client.terminate_instances(InstanceIds=instance_ids)
+        except ClientError as ce:
+            code = ce.response["Error"]["Code"]
+            if len(instance_ids) == 1 or code not in _INVALID_INSTANCE_ID_CODES:
+                # Throttling or permission errors would only get worse one id at a time
+                logger.error(
+                    "%s - Failed to terminate instances with ids %s: %s",
+                    self,
+                    ", ".join(instance_ids),
+                    code,
+                )
+                return [TerminationOutcome(iid, error=code) for iid in instance_ids]
+            # A single invalid id fails the whole call, isolate it
+            outcomes = []
+            for iid in instance_ids:
+                outcomes += self._terminate_chunk([iid])
+            return outcomes
+
+        return [
+            TerminationOutcome(
+                ti["InstanceId"], ti["PreviousState"]["Name"], ti["CurrentState"]["Name"]
+            )
+            for ti in response["TerminatingInstances"]
+        ]
 
-        instance.wait_until_terminated()
-        logger.info("%s - Terminated instance with id %s", self, instance.id)
+    def _instance_states(self, instance_ids: List[str]) -> Dict[str, str]:
+        states = {}
+        paginator = self.client.get_paginator("describe_instances")
+        for page in paginator.paginate(InstanceIds=instance_ids):
+            for reservation in page["Reservations"]:
+                for data in reservation["Instances"]:
+                    states[data["InstanceId"]] = data["State"]["Name"]
+        return states
 
-    def terminate_all_instances(self, instance_status: Optional[str] = None):
+    def terminate_instances(self, instance_ids: List[str]) -> List[TerminationOutcome]:
         """
-        Terminate all instances from this project.
-        Returns the terminated instances.
+        Terminate the instances with the given ids in batches of at most
+        _MAX_INSTANCE_IDS and wait for all of them following instance_backoff.
+        Returns one TerminationOutcome per instance.
         """
-        instances = self.filter_instances(instance_status=instance_status)
+        return run_steps(self._terminate_instances_steps(instance_ids))
+
+    def _terminate_instances_steps(
+        self, instance_ids: List[str]
+    ) -> Steps[List[TerminationOutcome]]:
+        outcomes: Dict[str, TerminationOutcome] = {}
+        for chunk in chunks(list(instance_ids), _MAX_INSTANCE_IDS):
+            logger.info("%s - Terminating instances with ids %s", self, ", ".join(chunk))
+            for outcome in self._terminate_chunk(chunk):
+                outcomes[outcome.id] = outcome
+
+        waiting = [o.id for o in outcomes.values() if o.error is None]
+        if not waiting:
+            return [outcomes[iid] for iid in instance_ids if iid in outcomes]
+
+        def states() -> Dict[str, str]:
+            described: Dict[str, str] = {}
+            for chunk in chunks(waiting, _MAX_INSTANCE_IDS):
+                described.update(self._instance_states(chunk))
+            return described
 
-        # Send terminate to all and then wait
-        for instance in instances:
-            logger.info("%s - Terminating instance with id %s", self, instance.id)
-            instance.terminate()
+        try:
+            yield Wait(
+                lambda: all(state == "terminated" for state in states().values()),
+                self.instance_backoff,
+                f"instances {', '.join(waiting)} to be terminated",
+            )
+        except PollTimeout as pt:
+            logger.error("%s - Failed waiting for instances to terminate: %s", self, pt)
+            described = states()
+            for iid in waiting:
+                outcomes[iid].current_state = described.get(iid)
+                if outcomes[iid].current_state != "terminated":
+                    outcomes[iid].error = "PollTimeout"
+        else:
+            for iid in waiting:
+                outcomes[iid].current_state = "terminated"
+                logger.info("%s - Terminated instance with id %s", self, iid)
 
-        for instance in instances:
-            instance.wait_until_terminated()
-            logger.info("%s - Terminated instance with id %s", self, instance.id)
+        return [outcomes[iid] for iid in instance_ids if iid in outcomes]
 
-        return instances
+    def terminate_all_instances(
+        self, instance_status: Optional[str] = None, inventory: Optional[Inventory] = None
+    ) -> List[TerminationOutcome]:
+        """
+        Terminate all instances from this project, those of inventory if given.
+        Returns a TerminationOutcome for each instance.
+        """
+        instance_ids = self._terminable_ids(instance_status, inventory)
+        if not instance_ids:
+            return []
+        return self.terminate_instances(instance_ids)
+
+    def _terminable_ids(
+        self, instance_status: Optional[str], inventory: Optional[Inventory]
+    ) -> List[str]:
+        """Ids of the instances of the project not yet terminated, in instance_status if given"""
+        if inventory is not None:
+            instances = inventory.of(INSTANCE)
+        else:
+            instances = self.filter_instances(instance_status=instance_status, warm_pool=True)
+        return [
+            instance.id
+            for instance in instances
+            if instance.state != "terminated"
+            and (instance_status is None or instance.state == instance_status)
+        ]
 
     def filter_instances(
         self,
         instance_status: Optional[str] = "running",
         custom_filters: Optional[List[Dict[str, Any]]] = None,
-    ) -> List[Any]:
+        resources: bool = False,
+        page_size: Optional[int] = None,
+        warm_pool: bool = False,
+    ) -> Iterator[Any]:
+        """Yields the instances of this project, following describe_instances pagination.
+        Yields InstanceRecord objects by default. With resources=True yields ec2.Instance
+        resources preloaded with the described data, so reading them makes no extra calls.
+        Instances of the warm pool are skipped unless warm_pool is True"""
         filters = self.filters.copy()
         if instance_status:
             filters.append(
@@ -266,17 +994,30 @@ and start_script as arguments"
         if custom_filters:
             filters += custom_filters
 
-        f = self.client.describe_instances(Filters=filters)
-        ids = []
-        for reservation in f["Reservations"]:
-            for instance in reservation["Instances"]:
-                ids.append(instance["InstanceId"])
-
-        return [self.ec2.Instance(i) for i in ids]
+        paginator = self.client.get_paginator("describe_instances")
+        pagination_config = {} if page_size is None else {"PageSize": page_size}
+        for page in paginator.paginate(Filters=filters, PaginationConfig=pagination_config):
+            for reservation in page["Reservations"]:
+                for data in reservation["Instances"]:
+                    if not warm_pool and any(
+                        tag["Key"] == WARM_POOL_TAG for tag in data.get("Tags", ())
+                    ):
+                        continue
+                    if resources:
+                        instance = self.ec2.Instance(data["InstanceId"])
+                        instance.meta.data = data
+                        yield instance
+                    else:
+                        yield InstanceRecord.from_payload(data)
 
     def require_key_pair(self):
-        if len(os.listdir(self._keys_path)) == 0:
-            self.create_key_pair()
+        if self._has_key_pair:
+            return
+        # Other threads and processes of the project may be creating it too
+        with self._lock(KEY_PAIR):
+            if not self._has_key_pair and not self.state.ids(KEY_PAIR):
+                self.create_key_pair()
+            self._has_key_pair = True
 
     def create_key_pair(self):
         logger.info("%s - Creating key pair", self)
@@ -293,10 +1034,8 @@ and start_script as arguments"
             self._pname,
         )
 
-        kpp = os.path.join(self._keys_path, response["KeyPairId"])
-        with open(kpp, "w+") as f:
-            f.write(response["KeyMaterial"])
-        os.chmod(kpp, 0o600)
+        atomic_write(os.path.join(self._keys_path, response["KeyPairId"]), response["KeyMaterial"])
+        self.state.put(KEY_PAIR, response["KeyPairId"], {"name": self._pname})
 
     def delete_key_pair(self, kp_id: str):
         self.client.delete_key_pair(KeyPairId=kp_id)
@@ -304,65 +1043,124 @@ and start_script as arguments"
         kp_path = os.path.join(self._keys_path, kp_id)
         if os.path.isfile(kp_path):
             os.remove(kp_path)
+        self.state.remove(KEY_PAIR, kp_id)
+        self._has_key_pair = False
 
-    def delete_all_key_pairs(self):
-        for kp_id in os.listdir(self._keys_path):
+    def delete_all_key_pairs(self, inventory: Optional[Inventory] = None):
+        for kp_id in self._known_ids(KEY_PAIR, inventory):
             self.delete_key_pair(kp_id)
+        if inventory is not None:
+            return
 
         key_ids = self.client.describe_key_pairs(Filters=self.filters)
         for key in key_ids["KeyPairs"]:
             kp_id = key["KeyPairId"]
             self.delete_key_pair(kp_id)
 
+    def _find_security_group(self, digest: str) -> Optional[str]:
+        """Looks up a security group of this project tagged with the rule digest"""
+        response = self.client.describe_security_groups(
+            Filters=self.filters + [{"Name": f"tag:{_SG_DIGEST_TAG}", "Values": [digest]}]
+        )
+        for sg in response["SecurityGroups"]:
+            return sg["GroupId"]
+        return None
+
     def require_security_group(
-        self, tcp_ports: Iterator[int] = tuple(), udp_ports: Iterator[int] = tuple()
+        self,
+        tcp_ports: Iterator[int] = tuple(),
+        udp_ports: Iterator[int] = tuple(),
+        cidr: str = "0.0.0.0/0",
     ) -> str:
-        tcp_ports = sorted(tcp_ports)
-        udp_ports = sorted(udp_ports)
-
-        for sg in os.listdir(self._sec_group_path):
-            with open(os.path.join(self._sec_group_path, sg), "r") as f:
-                sg_tcp_ports, sg_udp_ports = [
-                    [int(p) for p in line.split(",") if p != ""] for line in f.read().splitlines()
-                ]
-                if sg_tcp_ports == tcp_ports and sg_udp_ports == udp_ports:
-                    return sg
-
-        tcp_ports_str: List[str] = [str(i) for i in tcp_ports]
-        udp_ports_str: List[str] = [str(i) for i in udp_ports]
-        gname = f'{self._pname}_{hash("".join(tcp_ports_str) + "".join(udp_ports_str))}'
-        logger.info("%s - Creating security group with name %s", self, gname)
+        """
+        Returns the id of a security group opening tcp_ports and udp_ports to cidr.
+        Groups are identified by a digest of their rules and looked up in memory,
+        then in the local state and then by tag on AWS before creating a new one.
+        """
+        rules = security_group_rules(tcp_ports, udp_ports, cidr)
+        digest = content_digest(rules)
+
+        sg_id = self._sg_cache.get(digest)
+        if sg_id is not None:
+            return sg_id
+
+        # Other threads and processes of the project may be creating it too
+        with self._lock(SECURITY_GROUP):
+            sg_id = self.state.find(SECURITY_GROUP, digest)
+            if sg_id is None:
+                sg_id = self._find_security_group(digest)
+                if sg_id is not None:
+                    logger.info("%s - Found existing security group with id %s", self, sg_id)
+                    self.state.put(SECURITY_GROUP, sg_id, {"rules": rules}, key=digest)
+
+            if sg_id is None:
+                sg_id = self._create_security_group(rules, digest)
+
+        self._sg_cache[digest] = sg_id
+        return sg_id
 
-        tcp_sec = [
-            {
-                "IpProtocol": "tcp",
-                "FromPort": port,
-                "ToPort": port,
-                "IpRanges": [{"CidrIp": "0.0.0.0/0"}],
-            }
-            for port in tcp_ports
-        ]
-        udp_sec = [
+    def _authorize_rules(self, sg_id: str, rules: List[SecurityGroupRule]):
+        """Allows the ingress rules on sg_id, skipping those it already has"""
+        from botocore.exceptions import ClientError
+
+        permissions = [
             {
-                "IpProtocol": "udp",
+                "IpProtocol": protocol,
                 "FromPort": port,
                 "ToPort": port,
-                "IpRanges": [{"CidrIp": "0.0.0.0/0"}],
+                "IpRanges": [{"CidrIp": cidr}],
             }
-            for port in udp_ports
+            for protocol, port, cidr in rules
         ]
+        try:
+            self.client.authorize_security_group_ingress(GroupId=sg_id, IpPermissions=permissions)
+        except ClientError as ce:
+            if ce.response["Error"]["Code"] != "InvalidPermission.Duplicate":
+                raise
+            # Nothing is allowed when one rule already exists, add them one by one
+            for permission in permissions:
+                try:
+                    self.client.authorize_security_group_ingress(
+                        GroupId=sg_id, IpPermissions=[permission]
+                    )
+                except ClientError as single:
+                    if single.response["Error"]["Code"] != "InvalidPermission.Duplicate":
+                        raise
+
+    def _create_security_group(self, rules: List[SecurityGroupRule], digest: str) -> str:
+        from botocore.exceptions import ClientError
+
+        gname = f"{self._pname}_{digest}"
+        logger.info("%s - Creating security group with name %s", self, gname)
 
-        response = self.client.create_security_group(
-            GroupName=gname,
-            Description="Security group automatically generated by thunder",
-            TagSpecifications=[{"ResourceType": "security-group", "Tags": self.tags}],
-        )
+        try:
+            response = self.client.create_security_group(
+                GroupName=gname,
+                Description="Security group automatically generated by thunder",
+                TagSpecifications=[
+                    {
+                        "ResourceType": "security-group",
+                        "Tags": self.tags + [{"Key": _SG_DIGEST_TAG, "Value": digest}],
+                    }
+                ],
+            )
+        except ClientError as ce:
+            if ce.response["Error"]["Code"] != "InvalidGroup.Duplicate":
+                raise
+            # Same rules, created without the digest tag
+            response = self.client.describe_security_groups(
+                Filters=[{"Name": "group-name", "Values": [gname]}]
+            )
+            sg_id = response["SecurityGroups"][0]["GroupId"]
+            logger.info("%s - Found existing security group with id %s", self, sg_id)
+            # A crash between creating and authorizing may have left it without rules
+            self._authorize_rules(sg_id, rules)
+            self.state.put(SECURITY_GROUP, sg_id, {"rules": rules}, key=digest)
+            return sg_id
 
         sg_id = response["GroupId"]
 
-        self.client.authorize_security_group_ingress(
-            GroupId=sg_id, IpPermissions=(tcp_sec + udp_sec)
-        )
+        self._authorize_rules(sg_id, rules)
 
         logger.info(
             "%s - Created security_group with id %s",
@@ -370,85 +1168,348 @@ and start_script as arguments"
             sg_id,
         )
 
-        sgp = os.path.join(self._sec_group_path, sg_id)
-        with open(sgp, "w+") as f:
-            f.write(",".join(tcp_ports_str))
-            f.write("\n")
-            f.write(",".join(udp_ports_str))
-            f.write("\n")
-        os.chmod(sgp, 0o600)
+        self.state.put(SECURITY_GROUP, sg_id, {"rules": rules}, key=digest)
         return sg_id
 
-    def delete_security_group(self, sg_id: str) -> bool:
+    def delete_security_group(self, sg_id: str, backoff: Optional[Backoff] = None) -> bool:
         """Deletes all security group with id sg_id
+        With a backoff, DependencyViolation errors are retried following it
         Returns True on success, False otherwise"""
+        return run_steps(self._delete_security_group_steps(sg_id, backoff))
+
+    def _delete_security_group_steps(self, sg_id: str, backoff: Optional[Backoff]) -> Steps[bool]:
+        from botocore.exceptions import ClientError
+
+        def delete() -> bool:
+            try:
+                self.client.delete_security_group(GroupId=sg_id)
+                return True
+            except ClientError as ce:
+                code = ce.response["Error"]["Code"]
+                # Already deleted, only the record is left
+                if code == "InvalidGroup.NotFound":
+                    return True
+                if backoff is None or code != "DependencyViolation":
+                    raise
+            logger.info("%s - Security group %s is still in use, retrying", self, sg_id)
+            return False
+
         try:
-            self.client.delete_security_group(GroupId=sg_id)
-            logger.info("%s - Deleted security_group %s", self, sg_id)
-        except ClientError as ce:
-            print(ce, file=sys.stderr)
-            logger.error("%s - Failed to delete security_group %s", self, sg_id)
+            yield Wait(delete, backoff or _NO_RETRY, f"security group {sg_id} to be deletable")
+        except (ClientError, PollTimeout) as e:
+            logger.error("%s - Failed to delete security_group %s: %s", self, sg_id, e)
             return False
-        sg_path = os.path.join(self._sec_group_path, sg_id)
-        if os.path.isfile(sg_path):
-            os.remove(sg_path)
+        logger.info("%s - Deleted security_group %s", self, sg_id)
+        self._forget_security_group(sg_id)
         return True
 
-    def delete_all_security_groups(self):
+    def _forget_security_group(self, sg_id: str):
+        """Drops a deleted security group from the state and the cache"""
+        self.state.remove(SECURITY_GROUP, sg_id)
+        for digest, cached_id in list(self._sg_cache.items()):
+            if cached_id == sg_id:
+                del self._sg_cache[digest]
+
+    def delete_all_security_groups(
+        self, backoff: Optional[Backoff] = None, inventory: Optional[Inventory] = None
+    ):
         """Deletes all security_groups from the project"""
-        for sg_id in os.listdir(self._sec_group_path):
-            self.delete_security_group(sg_id)
+        for sg_id in self._known_ids(SECURITY_GROUP, inventory):
+            self.delete_security_group(sg_id, backoff)
+        if inventory is not None:
+            return
 
         for sg in self.client.describe_security_groups(Filters=self.filters)["SecurityGroups"]:
             sg_id = sg["GroupId"]
-            self.delete_security_group(sg_id)
+            self.delete_security_group(sg_id, backoff)
 
-    def create_ami(self, instance) -> str:
-        ami_name = self._create_random_name()
+    def _image_executor(self) -> ThreadPoolExecutor:
+        with self._state_lock:
+            if self._ami_executor is None:
+                self._ami_executor = ThreadPoolExecutor(max_workers=self.ami_workers)
+            return self._ami_executor
 
-        iid = instance.id
-        logger.info("%s - Creating AMI with name %s from instance %s", self, ami_name, iid)
-        # There seems to have no way to tag an ami
-        response = self.client.create_image(InstanceId=iid, Name=ami_name, NoReboot=True)
-        ami_id = response["ImageId"]
-        logger.debug(
-            "%s - Waiting for AMI with name %s and id %s to be created from instance %s",
+    def _region_client(self, region: str) -> "botocore.client.BaseClient":
+        return self.pool.client("ec2", region, self.profile_name)
+
+    def bake_ami(
+        self, instance, copy_regions: Iterator[str] = (), digest: Optional[str] = None
+    ) -> "Future[Dict[str, str]]":
+        """
+        Starts creating an AMI from instance and copying it to copy_regions, in the
+        background. Copies to every region are started together once the AMI is available.
+        With a digest of its inputs the AMI can later be found by build_ami.
+        Returns a future of {region: ami_id}, this region included.
+        """
+        return self._image_executor().submit(
+            self._bake_ami, instance.id, list(copy_regions), digest
+        )
+
+    def bake_amis(
+        self, instances: List[Any], copy_regions: Iterator[str] = ()
+    ) -> "List[Future[Dict[str, str]]]":
+        """bake_ami for every instance, the AMIs are created in parallel"""
+        copy_regions = list(copy_regions)
+        return [self.bake_ami(instance, copy_regions) for instance in instances]
+
+    def _bake_ami(self, iid: str, copy_regions: List[str], digest: Optional[str]) -> Dict[str, str]:
+        ami_id, ami_name = run_steps(self._create_ami_steps(iid, digest))
+        amis = {self.region: ami_id}
+        for region in copy_regions:
+            response = self._region_client(region).copy_image(
+                Name=ami_name,
+                SourceImageId=ami_id,
+                SourceRegion=self.region,
+                TagSpecifications=[
+                    {"ResourceType": "image", "Tags": self.tags},
+                    {"ResourceType": "snapshot", "Tags": self.tags},
+                ],
+            )
+            amis[region] = response["ImageId"]
+            logger.info("%s - Copying AMI %s to %s as %s", self, ami_id, region, amis[region])
+            self.state.put(
+                AMI,
+                amis[region],
+                {"name": ami_name, "instance_id": iid, "region": region, "source": ami_id},
+            )
+        # The copies run in parallel, waiting for them in turn takes as long as the slowest
+        for region in copy_regions:
+            waiter = self._region_client(region).get_waiter("image_available")
+            waiter.wait(ImageIds=[amis[region]])
+            logger.info("%s - Copied AMI %s to %s as %s", self, ami_id, region, amis[region])
+        return amis
+
+    def _create_ami_steps(self, iid: str, digest: Optional[str]) -> Steps[Tuple[str, str]]:
+        """Creates an AMI from instance iid and waits for it, returns its id and name"""
+        ami_id, ami_name = self._create_image(iid, digest)
+
+        def available() -> bool:
+            state = self._image_states([ami_id]).get(ami_id)
+            if state == "failed":
+                raise RuntimeError(f"AMI {ami_id} failed to be created from {iid}")
+            return state == "available"
+
+        yield Wait(available, self.image_backoff, f"AMI {ami_id} to be available")
+        logger.info(
+            "%s - Created AMI with name %s and id %s from instance %s",
             self,
             ami_name,
             ami_id,
             iid,
         )
-        waiter = self.client.get_waiter("image_available")
-        waiter.wait(ImageIds=[ami_id])
-        logger.info(
-            "%s - Created AMI with name %s and id %s from instance %s",
+        return ami_id, ami_name
+
+    def _create_image(self, iid: str, digest: Optional[str]) -> Tuple[str, str]:
+        """Starts creating an AMI from instance iid, returns its id and name without waiting"""
+        ami_name = self._create_random_name()
+        tags = self.tags
+        if digest is not None:
+            tags = tags + [{"Key": _AMI_DIGEST_TAG, "Value": digest}]
+        logger.info("%s - Creating AMI with name %s from instance %s", self, ami_name, iid)
+        response = self.client.create_image(
+            InstanceId=iid,
+            Name=ami_name,
+            NoReboot=True,
+            TagSpecifications=[
+                {"ResourceType": "image", "Tags": tags},
+                {"ResourceType": "snapshot", "Tags": tags},
+            ],
+        )
+        ami_id = response["ImageId"]
+        # Recorded before waiting so it can be deleted even if waiting fails
+        self.state.put(AMI, ami_id, {"name": ami_name, "instance_id": iid}, key=digest)
+        logger.debug(
+            "%s - Waiting for AMI with name %s and id %s to be created from instance %s",
             self,
             ami_name,
             ami_id,
             iid,
         )
+        return ami_id, ami_name
 
-        with open(os.path.join(self._ami_path, ami_id), "w+") as f:
-            f.write(ami_name)
+    def _image_states(self, ami_ids: List[str]) -> Dict[str, str]:
+        """Returns the state of those of ami_ids that are described"""
+        from botocore.exceptions import ClientError
 
-        return ami_id
+        try:
+            response = self.client.describe_images(ImageIds=ami_ids)
+        except ClientError as ce:
+            # Freshly created images may not be visible yet
+            if ce.response["Error"]["Code"] == "InvalidAMIID.NotFound":
+                return {}
+            raise
+        return {image["ImageId"]: image["State"] for image in response["Images"]}
+
+    def create_ami(self, instance) -> str:
+        return self.bake_ami(instance).result()[self.region]
+
+    def _find_ami(self, digest: str) -> Optional[str]:
+        """Looks up an available AMI of this project built from the inputs with digest,
+        in the local state and then by tag on AWS. An AMI still being built is waited for"""
+        ami_id = self.state.find(AMI, digest)
+        if ami_id is not None and self._usable_ami(
+            ami_id, self._image_states([ami_id]).get(ami_id)
+        ):
+            return ami_id
+
+        response = self.client.describe_images(
+            Owners=["self"],
+            Filters=self.filters
+            + [
+                {"Name": f"tag:{_AMI_DIGEST_TAG}", "Values": [digest]},
+                {"Name": "state", "Values": ["available", "pending"]},
+            ],
+        )
+        # Available AMIs first, pending ones are only waited for when there are none
+        for image in sorted(response["Images"], key=lambda image: image["State"] != "available"):
+            ami_id = image["ImageId"]
+            self.state.put(AMI, ami_id, {"name": image.get("Name")}, key=digest)
+            if self._usable_ami(ami_id, image["State"]):
+                return ami_id
+        return None
+
+    def _usable_ami(self, ami_id: str, state: Optional[str]) -> bool:
+        """Whether the recorded AMI ami_id in state is or becomes available. Its record
+        is only removed once the AMI is gone, so a bake in progress is never forgotten"""
+        from botocore.exceptions import WaiterError
+
+        if state == "pending":
+            logger.info("%s - Waiting for AMI %s, built from the same inputs", self, ami_id)
+            try:
+                self.client.get_waiter("image_available").wait(ImageIds=[ami_id])
+            except WaiterError:
+                pass
+            state = self._image_states([ami_id]).get(ami_id)
+        if state == "available":
+            return True
+        if state in _GONE_AMI_STATES:
+            logger.info("%s - Recorded AMI %s is no longer available", self, ami_id)
+            self.state.remove(AMI, ami_id)
+        return False
+
+    def build_ami(
+        self,
+        image_id: str,
+        start_script_data: Optional[str] = None,
+        start_script: Optional[str] = None,
+        itype: str = "t2.micro",
+        tcp_ports: Iterator[int] = (22,),
+        udp_ports: Iterator[int] = tuple(),
+    ) -> str:
+        """
+        Returns the id of an AMI made by running the start script on an instance
+        of image_id. AMIs are identified by a digest of the image id, the start
+        script contents and itype, an AMI already built from the same inputs is
+        returned right away. Otherwise an instance is created, baked and terminated.
+        """
+        start_script_data = self._start_script_data(start_script_data, start_script)
+        digest = ami_digest(image_id, start_script_data, itype)
+        ami_id = self._find_ami(digest)
+        if ami_id is not None:
+            logger.info("%s - Reusing AMI %s built from the same inputs", self, ami_id)
+            return ami_id
+
+        instance = self.create_instance(
+            image_id,
+            start_script_data=start_script_data,
+            itype=itype,
+            tcp_ports=tcp_ports,
+            udp_ports=udp_ports,
+        )
+        try:
+            return self.bake_ami(instance, digest=digest).result()[self.region]
+        finally:
+            self.terminate_instance(instance)
 
     def delete_ami(self, ami_id: str):
-        self.client.deregister_image(ImageId=ami_id)
-        logging.info("%s - Deleted AMI with id %s", self, ami_id)
-        ami_path = os.path.join(self._ami_path, ami_id)
-        if os.path.isfile(ami_path):
-            os.remove(ami_path)
+        """Deregisters an AMI created by this project and deletes its snapshots"""
+        from botocore.exceptions import ClientError
 
-    def delete_all_amis(self):
-        for ami_id in os.listdir(self._ami_path):
-            self.delete_ami(ami_id)
+        data = self.state.get(AMI, ami_id) or {}
+        client = self._region_client(data.get("region", self.region))
+        try:
+            response = client.describe_images(ImageIds=[ami_id])
+        except ClientError as ce:
+            if ce.response["Error"]["Code"] != "InvalidAMIID.NotFound":
+                raise
+            # Deregistered outside of thunder, or a copy that failed
+            logger.info("%s - AMI with id %s no longer exists", self, ami_id)
+            self.state.remove(AMI, ami_id)
+            return
+        snapshot_ids = [
+            mapping["Ebs"]["SnapshotId"]
+            for image in response["Images"]
+            for mapping in image.get("BlockDeviceMappings", ())
+            if "SnapshotId" in mapping.get("Ebs", {})
+        ]
+        if response["Images"]:
+            client.deregister_image(ImageId=ami_id)
+            logger.info("%s - Deleted AMI with id %s", self, ami_id)
+        for snapshot_id in snapshot_ids:
+            try:
+                client.delete_snapshot(SnapshotId=snapshot_id)
+                logger.info("%s - Deleted snapshot %s of AMI %s", self, snapshot_id, ami_id)
+            except ClientError as ce:
+                logger.error("%s - Failed to delete snapshot %s: %s", self, snapshot_id, ce)
+        self.state.remove(AMI, ami_id)
+
+    def delete_all_amis(self, inventory: Optional[Inventory] = None):
+        amis = self._known_ids(AMI, inventory)
+        # Deregistering and deleting snapshots take a few calls each
+        for future in [self._image_executor().submit(self.delete_ami, ami_id) for ami_id in amis]:
+            future.result()
+
+    def delete_all_snapshots(self, inventory: Optional[Inventory] = None):
+        """
+        Deletes the snapshots tagged with the project, in this region, that still
+        exist. Snapshots backing a registered AMI are kept, delete_ami removes them
+        """
+        from botocore.exceptions import ClientError
+
+        inventory = inventory or self.inventory()
+        snapshot_ids = inventory.ids(SNAPSHOT)
+        in_use = self._snapshots_in_use(snapshot_ids)
+        for snapshot_id in snapshot_ids:
+            if snapshot_id in in_use:
+                logger.info("%s - Keeping snapshot %s of a registered AMI", self, snapshot_id)
+                continue
+            try:
+                self.client.delete_snapshot(SnapshotId=snapshot_id)
+                logger.info("%s - Deleted snapshot %s", self, snapshot_id)
+            except ClientError as ce:
+                # Already deleted with its AMI
+                if ce.response["Error"]["Code"] != "InvalidSnapshot.NotFound":
+                    raise
+
+    def _snapshots_in_use(self, snapshot_ids: List[str]) -> List[str]:
+        """Returns which of snapshot_ids back an AMI of this account"""
+        in_use: List[str] = []
+        paginator = self.client.get_paginator("describe_images")
+        for chunk in chunks(snapshot_ids, _MAX_FILTER_VALUES):
+            for page in paginator.paginate(
+                Owners=["self"],
+                Filters=[{"Name": "block-device-mapping.snapshot-id", "Values": chunk}],
+            ):
+                for image in page["Images"]:
+                    in_use += [
+                        mapping["Ebs"]["SnapshotId"]
+                        for mapping in image.get("BlockDeviceMappings", ())
+                        if mapping.get("Ebs", {}).get("SnapshotId") in chunk
+                    ]
+        return in_use
 
     def create_load_balancer(
-        self,
-        tcp_ports: Iterator[int] = (8080,),
-        udp_ports: Iterator[int] = tuple(),
-    ) -> Tuple[str]:
+        self, tcp_ports: Iterator[int] = (8080,), udp_ports: Iterator[int] = tuple()
+    ) -> Tuple[str, str]:
+        """
+        Creates a classic load balancer, returns its name and DNS name once it
+        is described
+        """
+        return run_steps(self._create_load_balancer_steps(tcp_ports, udp_ports))
+
+    def _create_load_balancer_steps(
+        self, tcp_ports: Iterator[int], udp_ports: Iterator[int]
+    ) -> Steps[Tuple[str, str]]:
         sg_id = self.require_security_group(tcp_ports, udp_ports)
 
         # tcp_ports_str: List[str] = [str(i) for i in tcp_ports]
@@ -457,23 +1518,7 @@ and start_script as arguments"
 
         logger.info("%s - Creating load balancer with name %s", self, lb_name)
 
-        # # elbv2 introduces lots of complications
-        # response = self.elb_client.create_load_balancer(
-        #     Name=lb_name,
-        #     SecurityGroups=[sg_id],
-        #     Tags=self.tags,
-        # )
-
-        # response = client.create_listener(
-        # DefaultActions=[
-        #     {
-        #         'TargetGroupArn':lb_arn,
-        #         'Type': 'forward',
-        #     },
-        # ],
-        # LoadBalancerArn=lb_arn,
-        # Port=80,
-        # Protocol='HTTP',
+        # See create_load_balancer_v2 for application and network load balancers
         response = self.elb_client.create_load_balancer(
             LoadBalancerName=lb_name,
             Listeners=[
@@ -484,7 +1529,7 @@ and start_script as arguments"
                     "LoadBalancerPort": 8080,
                 }
             ],
-            Subnets=[s["SubnetId"] for s in self.client.describe_subnets()["Subnets"]],
+            Subnets=self.subnet_ids(),
             SecurityGroups=[sg_id],
             Tags=self.tags,  # There is no reference to Filter in elb docs, only describe_tags
         )
@@ -496,95 +1541,459 @@ and start_script as arguments"
             lb_name,
             lb_dnsname,
         )
-        with open(os.path.join(self._lb_path, lb_name), "w+") as f:
-            f.write(lb_dnsname)
+        self.state.put(LOAD_BALANCER, lb_name, {"dns_name": lb_dnsname, "sg_id": sg_id})
+
+        yield Wait(
+            lambda: self._existing_load_balancers([lb_name]),
+            self.elb_backoff,
+            f"load balancer {lb_name} to be created",
+        )
+        return lb_name, lb_dnsname
 
-        while True:
-            response = self.elb_client.describe_load_balancers()
-            for lb in response["LoadBalancerDescriptions"]:
-                if lb["LoadBalancerName"] == lb_name:
-                    return lb_name, lb_dnsname
-            # The elbv2 waiter calls describe_load_balancers after 15 seconds
-            time.sleep(15)
+    def _existing_load_balancers(self, lb_names: List[str]) -> List[str]:
+        """Returns which of lb_names exist, describing only those load balancers"""
+        from botocore.exceptions import ClientError
 
-    def delete_all_load_balancers(self):
-        # TODO this doesnt use tags so no external checks (.describe_...()) are done
-        lb_names = os.listdir(self._lb_path)
+        if not lb_names:
+            return []
+        try:
+            response = self.elb_client.describe_load_balancers(LoadBalancerNames=lb_names)
+            return [lb["LoadBalancerName"] for lb in response["LoadBalancerDescriptions"]]
+        except ClientError as ce:
+            if ce.response["Error"]["Code"] != "LoadBalancerNotFound":
+                raise
+        # One missing name fails the whole call, check them one by one
+        if len(lb_names) == 1:
+            return []
+        return [name for name in lb_names if self._existing_load_balancers([name])]
+
+    def delete_all_load_balancers(self, inventory: Optional[Inventory] = None):
+        run_steps(self._delete_load_balancers_steps(self._known_ids(LOAD_BALANCER, inventory)))
+
+    def _delete_load_balancers_steps(self, lb_names: List[str]) -> Steps[None]:
+        if not lb_names:
+            return
         for lb_name in lb_names:
             self.elb_client.delete_load_balancer(LoadBalancerName=lb_name)
             logger.info("%s - Deleting load balancer %s", self, lb_name)
-            os.remove(os.path.join(self._lb_path, lb_name))
-
-        time.sleep(1)
-        while True:
-            response = self.elb_client.describe_load_balancers()
-            all_lb_names = [lb["LoadBalancerName"] for lb in response["LoadBalancerDescriptions"]]
-            c = True
-            for lb_name in lb_names:
-                if lb_name in all_lb_names:
-                    c = False
-            if c:
-                break
+            self.state.remove(LOAD_BALANCER, lb_name)
+
+        yield Wait(
+            lambda: not self._existing_load_balancers(lb_names),
+            self.elb_backoff,
+            f"load balancers {', '.join(lb_names)} to be deleted",
+        )
+
+    def create_load_balancer_v2(
+        self,
+        tcp_ports: Iterator[int] = (8080,),
+        udp_ports: Iterator[int] = tuple(),
+        lb_type: str = "application",
+        internal: bool = False,
+        health_check_path: str = "/",
+        health_check_interval: int = 5,
+        health_check_timeout: int = 2,
+        healthy_threshold: int = 2,
+        unhealthy_threshold: int = 2,
+        deregistration_delay: int = 30,
+        cross_zone: bool = True,
+        algorithm: Optional[str] = None,
+    ) -> Tuple[str, str, List[str]]:
+        """
+        Creates an application or network (lb_type "network") load balancer in
+        the default subnets, with a listener and a target group per port
+        forwarding to the same port of the instances: HTTP ports for an
+        application load balancer, TCP and UDP ports for a network one.
+        Targets are checked every health_check_interval seconds and change state
+        after healthy_threshold or unhealthy_threshold checks, and deregistered
+        ones drain for deregistration_delay seconds instead of AWS's 300.
+        cross_zone spreads traffic evenly over the targets of every zone and
+        algorithm "least_outstanding_requests" sends the requests of an
+        application load balancer to its least busy targets.
+        Returns the ARN and DNS name of the load balancer and the ARNs of its
+        target groups, to pass as target_group_arns to create_auto_scaling.
+        """
+        tcp_ports, udp_ports = list(tcp_ports), list(udp_ports)
+        if lb_type not in ("application", "network"):
+            raise ValueError(f"Unknown load balancer type {lb_type}")
+        if lb_type == "application" and udp_ports:
+            raise ValueError("Application load balancers cannot forward UDP ports")
+        if udp_ports and not tcp_ports:
+            raise ValueError("UDP target groups are health checked on the first TCP port")
+        if lb_type == "network" and algorithm is not None:
+            raise ValueError("Network load balancer target groups have no routing algorithm")
+
+        sg_id = self.require_security_group(tcp_ports, udp_ports)
+        lb_name = f'thunder-lb-{"".join(random.choice(string.ascii_letters) for i in range(8))}'
+
+        logger.info("%s - Creating %s load balancer with name %s", self, lb_type, lb_name)
+        extra: Dict[str, Any] = {}
+        if lb_type == "application":
+            extra["SecurityGroups"] = [sg_id]
+        response = self.elbv2_client.create_load_balancer(
+            Name=lb_name,
+            Subnets=[subnet["SubnetId"] for subnet in self.default_subnets()],
+            Scheme="internal" if internal else "internet-facing",
+            Type=lb_type,
+            Tags=self.tags,
+            **extra,
+        )
+        lb = response["LoadBalancers"][0]
+        lb_arn, lb_dnsname = lb["LoadBalancerArn"], lb["DNSName"]
+        self.state.put(
+            LOAD_BALANCER_V2,
+            lb_arn,
+            {"name": lb_name, "dns_name": lb_dnsname, "sg_id": sg_id, "type": lb_type},
+        )
+
+        if lb_type == "application":
+            listeners = [("HTTP", port) for port in tcp_ports]
+        else:
+            # A port forwarded for both protocols needs a single TCP_UDP listener
+            both = set(tcp_ports) & set(udp_ports)
+            listeners = [("TCP_UDP" if port in both else "TCP", port) for port in tcp_ports]
+            listeners += [("UDP", port) for port in udp_ports if port not in both]
+
+        health_check: Dict[str, Any] = {
+            "HealthCheckIntervalSeconds": health_check_interval,
+            "HealthCheckTimeoutSeconds": health_check_timeout,
+            "HealthyThresholdCount": healthy_threshold,
+            "UnhealthyThresholdCount": unhealthy_threshold,
+        }
+        if lb_type == "application":
+            health_check.update(
+                HealthCheckProtocol="HTTP",
+                HealthCheckPath=health_check_path,
+                Matcher={"HttpCode": "200-399"},
+            )
+        else:
+            health_check["HealthCheckProtocol"] = "TCP"
+        attributes = {
+            "deregistration_delay.timeout_seconds": str(deregistration_delay),
+            "load_balancing.cross_zone.enabled": "true" if cross_zone else "false",
+        }
+        if algorithm is not None:
+            attributes["load_balancing.algorithm.type"] = algorithm
+
+        tg_arns = []
+        for protocol, port in listeners:
+            port_check = dict(health_check)
+            if protocol == "UDP":
+                port_check["HealthCheckPort"] = str(tcp_ports[0])
+            tg_arn = self._create_target_group(lb_arn, protocol, port, port_check, attributes)
+            self.elbv2_client.create_listener(
+                LoadBalancerArn=lb_arn,
+                Protocol=protocol,
+                Port=port,
+                DefaultActions=[{"Type": "forward", "TargetGroupArn": tg_arn}],
+            )
+            tg_arns.append(tg_arn)
+
+        logger.info(
+            "%s - Waiting for load balancer with name %s and DNS %s to be active",
+            self,
+            lb_name,
+            lb_dnsname,
+        )
+        poll(
+            lambda: self._load_balancer_v2_states([lb_arn]).get(lb_arn) == "active",
+            self.elb_backoff,
+            f"load balancer {lb_name} to be active",
+        )
+        return lb_arn, lb_dnsname, tg_arns
+
+    def _create_target_group(
+        self,
+        lb_arn: str,
+        protocol: str,
+        port: int,
+        health_check: Dict[str, Any],
+        attributes: Dict[str, str],
+    ) -> str:
+        tg_name = f'thunder-tg-{"".join(random.choice(string.ascii_letters) for i in range(8))}'
+        response = self.elbv2_client.create_target_group(
+            Name=tg_name,
+            Protocol=protocol,
+            Port=port,
+            VpcId=self.default_subnets()[0]["VpcId"],
+            TargetType="instance",
+            Tags=self.tags,
+            **health_check,
+        )
+        tg_arn = response["TargetGroups"][0]["TargetGroupArn"]
+        # Keyed by load balancer so deleting it deletes its target groups
+        self.state.put(
+            TARGET_GROUP,
+            tg_arn,
+            {"name": tg_name, "protocol": protocol, "port": port},
+            key=lb_arn,
+        )
+        self.elbv2_client.modify_target_group_attributes(
+            TargetGroupArn=tg_arn,
+            Attributes=[{"Key": key, "Value": value} for key, value in attributes.items()],
+        )
+        logger.info("%s - Created target group %s for %s port %d", self, tg_name, protocol, port)
+        return tg_arn
+
+    def _load_balancer_v2_states(self, lb_arns: List[str]) -> Dict[str, str]:
+        """Returns the state of those of lb_arns that exist, describing only them"""
+        from botocore.exceptions import ClientError
+
+        states: Dict[str, str] = {}
+        for chunk in chunks(lb_arns, _MAX_ELBV2_ARNS):
+            try:
+                response = self.elbv2_client.describe_load_balancers(LoadBalancerArns=chunk)
+                states.update(
+                    (lb["LoadBalancerArn"], lb["State"]["Code"]) for lb in response["LoadBalancers"]
+                )
+                continue
+            except ClientError as ce:
+                if ce.response["Error"]["Code"] != "LoadBalancerNotFound":
+                    raise
+            # One missing ARN fails the whole call, check them one by one
+            if len(chunk) > 1:
+                for lb_arn in chunk:
+                    states.update(self._load_balancer_v2_states([lb_arn]))
+        return states
+
+    def delete_load_balancer_v2(self, lb_arn: str):
+        run_steps(self._delete_load_balancers_v2_steps([lb_arn]))
+
+    def delete_all_load_balancers_v2(self, inventory: Optional[Inventory] = None):
+        run_steps(self._delete_all_load_balancers_v2_steps(inventory))
+
+    def _delete_all_load_balancers_v2_steps(self, inventory: Optional[Inventory]) -> Steps[None]:
+        lb_arns = self._known_ids(LOAD_BALANCER_V2, inventory)
+        # Deleted along with their load balancer
+        deleted = set(self._recorded_target_groups(lb_arns))
+        yield from self._delete_load_balancers_v2_steps(lb_arns)
+        # Target groups whose load balancer was deleted outside of thunder
+        self._delete_target_groups(
+            [tg_arn for tg_arn in self._known_ids(TARGET_GROUP, inventory) if tg_arn not in deleted]
+        )
+
+    def _delete_load_balancers_v2_steps(self, lb_arns: List[str]) -> Steps[None]:
+        """Deletes the load balancers, then their target groups once they are gone"""
+        if not lb_arns:
+            return
+        for lb_arn in lb_arns:
+            # Deleting a missing load balancer succeeds, listeners go with it
+            self.elbv2_client.delete_load_balancer(LoadBalancerArn=lb_arn)
+            logger.info("%s - Deleting load balancer %s", self, lb_arn)
+            self.state.remove(LOAD_BALANCER_V2, lb_arn)
+
+        yield Wait(
+            lambda: not self._load_balancer_v2_states(lb_arns),
+            self.elb_backoff,
+            f"load balancers {', '.join(lb_arns)} to be deleted",
+        )
+
+        self._delete_target_groups(self._recorded_target_groups(lb_arns))
+
+    def _recorded_target_groups(self, lb_arns: List[str]) -> List[str]:
+        """ARNs of the target groups recorded for the load balancers lb_arns"""
+        target_groups = self.state.keys(TARGET_GROUP)
+        return [tg_arn for tg_arn, lb_arn in target_groups.items() if lb_arn in lb_arns]
+
+    def _delete_target_groups(self, tg_arns: List[str]):
+        from botocore.exceptions import ClientError
+
+        for tg_arn in tg_arns:
+            try:
+                self.elbv2_client.delete_target_group(TargetGroupArn=tg_arn)
+            except ClientError as ce:
+                if ce.response["Error"]["Code"] != "TargetGroupNotFound":
+                    raise
+            logger.info("%s - Deleted target group %s", self, tg_arn)
+            self.state.remove(TARGET_GROUP, tg_arn)
+
+    def delete_all_auto_scaling(self, inventory: Optional[Inventory] = None):
+        run_steps(self._delete_all_auto_scaling_steps(inventory))
+
+    def _delete_all_auto_scaling_steps(self, inventory: Optional[Inventory]) -> Steps[None]:
+        yield from self._delete_auto_scaling_groups_steps(
+            self._known_ids(AUTO_SCALING, inventory)
+        )
+        # Alarms left over from groups deleted outside of thunder
+        self._delete_alarms(self.state.ids(ALARM))
 
-            # The elbv2 waiter calls describe_load_balancers after 15 seconds
-            time.sleep(15)
+    def _delete_auto_scaling_groups(self, as_names: List[str]):
+        run_steps(self._delete_auto_scaling_groups_steps(as_names))
 
-    def delete_all_auto_scaling(self):
-        # TODO this doesnt use tags so no external checks (.describe_...()) are done
-        as_names = os.listdir(self._as_path)
+    def _delete_auto_scaling_groups_steps(self, as_names: List[str]) -> Steps[None]:
+        if not as_names:
+            return
         for as_name in as_names:
             self.as_client.delete_auto_scaling_group(AutoScalingGroupName=as_name, ForceDelete=True)
             logger.info("%s - Deleting auto scaling %s", self, as_name)
-            os.remove(os.path.join(self._as_path, as_name))
-        while (
-            len(
-                self.as_client.describe_auto_scaling_groups(AutoScalingGroupNames=as_names)[
-                    "AutoScalingGroups"
-                ]
-            )
-            != 0
-        ):
+            self.state.remove(AUTO_SCALING, as_name)
+
+        # Deleting a group deletes its policies but not the alarms of step policies
+        alarms = self.state.keys(ALARM)
+        self._delete_alarms([name for name, as_name in alarms.items() if as_name in as_names])
 
-            time.sleep(1)
+        yield Wait(
+            lambda: not self._existing_auto_scaling_groups(as_names),
+            self.as_delete_backoff,
+            f"auto scaling groups {', '.join(as_names)} to be deleted",
+        )
+
+    def _delete_alarms(self, alarm_names: List[str]):
+        from botocore.exceptions import ClientError
+
+        for chunk in chunks(alarm_names, _MAX_ALARM_NAMES):
+            try:
+                self.cw_client.delete_alarms(AlarmNames=chunk)
+            except ClientError as ce:
+                if ce.response["Error"]["Code"] != "ResourceNotFound":
+                    raise
+                # Nothing is deleted when one alarm is missing, retry them one by one
+                for alarm_name in chunk:
+                    try:
+                        self.cw_client.delete_alarms(AlarmNames=[alarm_name])
+                    except ClientError as single:
+                        if single.response["Error"]["Code"] != "ResourceNotFound":
+                            raise
+            for alarm_name in chunk:
+                self.state.remove(ALARM, alarm_name)
+            logger.info("%s - Deleted alarms %s", self, ", ".join(chunk))
+
+    def scaling_group(self, as_name: str) -> ScalingGroup:
+        """Scaling policies, scheduled actions and capacity of the auto scaling group as_name"""
+        return ScalingGroup(self, as_name)
+
+    def _existing_auto_scaling_groups(self, as_names: List[str]) -> List[str]:
+        """Returns which of as_names exist, describing only those groups"""
+        existing: List[str] = []
+        paginator = self.as_client.get_paginator("describe_auto_scaling_groups")
+        for chunk in chunks(as_names, _MAX_AS_NAMES):
+            for page in paginator.paginate(AutoScalingGroupNames=chunk):
+                existing += [g["AutoScalingGroupName"] for g in page["AutoScalingGroups"]]
+        return existing
 
     def create_auto_scaling(
         self,
-        lc_name: str,
+        lc_name: Optional[str],
         lb_name: Optional[str] = None,
         min_size: int = 2,
         max_size: int = 10,
         desired: int = 2,
+        lt_id: Optional[str] = None,
+        itypes: Optional[List[str]] = None,
+        on_demand_base: int = 0,
+        on_demand_percentage: int = 100,
+        spot_strategy: str = "price-capacity-optimized",
+        target_group_arns: Optional[List[str]] = None,
+        health_check_grace: int = 60,
     ) -> str:
+        """
+        Creates an auto scaling group across every availability zone, from the
+        launch configuration lc_name or the launch template lt_id.
+        With a launch template and several itypes a mixed instances policy is
+        used: the first on_demand_base instances and on_demand_percentage percent
+        of the rest are on-demand, in itypes order of priority, the others are spot
+        instances allocated with spot_strategy. Any type with capacity left can
+        then be used when one runs out.
+        Instances are registered with the target groups of target_group_arns,
+        which then also decide their health: instances still failing their
+        health checks health_check_grace seconds after launch are replaced.
+        Returns once the group is described.
+        """
+        return run_steps(
+            self._create_auto_scaling_steps(
+                lc_name,
+                lb_name,
+                min_size,
+                max_size,
+                desired,
+                lt_id,
+                itypes,
+                on_demand_base,
+                on_demand_percentage,
+                spot_strategy,
+                target_group_arns,
+                health_check_grace,
+            )
+        )
+
+    def _create_auto_scaling_steps(
+        self,
+        lc_name: Optional[str],
+        lb_name: Optional[str],
+        min_size: int,
+        max_size: int,
+        desired: int,
+        lt_id: Optional[str],
+        itypes: Optional[List[str]],
+        on_demand_base: int,
+        on_demand_percentage: int,
+        spot_strategy: str,
+        target_group_arns: Optional[List[str]],
+        health_check_grace: int,
+    ) -> Steps[str]:
+        if (lc_name is None) == (lt_id is None):
+            raise ValueError("Thunder.create_auto_scaling needs either lc_name or lt_id")
         as_name = self._create_random_name()
 
         logger.info("%s - Creating auto scaling %s", self, as_name)
 
+        launch: Dict[str, Any]
+        template = {"LaunchTemplateId": lt_id, "Version": "$Latest"}
+        if lc_name is not None:
+            launch = {"LaunchConfigurationName": lc_name}
+        elif itypes:
+            launch = {
+                "MixedInstancesPolicy": {
+                    "LaunchTemplate": {
+                        "LaunchTemplateSpecification": template,
+                        "Overrides": [{"InstanceType": itype} for itype in itypes],
+                    },
+                    "InstancesDistribution": {
+                        "OnDemandAllocationStrategy": "prioritized",
+                        "OnDemandBaseCapacity": on_demand_base,
+                        "OnDemandPercentageAboveBaseCapacity": on_demand_percentage,
+                        "SpotAllocationStrategy": spot_strategy,
+                    },
+                },
+                # Replaces spot instances at risk of interruption ahead of time
+                "CapacityRebalance": on_demand_percentage < 100,
+            }
+        else:
+            launch = {"LaunchTemplate": template}
+        if target_group_arns:
+            launch.update(
+                TargetGroupARNs=list(target_group_arns),
+                HealthCheckType="ELB",
+                HealthCheckGracePeriod=health_check_grace,
+            )
+
         self.as_client.create_auto_scaling_group(
             AutoScalingGroupName=as_name,
-            LaunchConfigurationName=lc_name,
             MinSize=min_size,
             MaxSize=max_size,
+            DesiredCapacity=desired,
             LoadBalancerNames=[] if lb_name is None else [lb_name],
-            AvailabilityZones=[
-                z["ZoneName"]
-                for z in self.client.describe_availability_zones()["AvailabilityZones"]
-            ],
+            AvailabilityZones=self.availability_zones(),
             Tags=self.tags,  # not checked
+            **launch,
+        )
+        self.state.put(
+            AUTO_SCALING,
+            as_name,
+            {
+                "lc_name": lc_name,
+                "lb_name": lb_name,
+                "lt_id": lt_id,
+                "tg_arns": list(target_group_arns or []),
+            },
         )
 
-        while (
-            len(
-                self.as_client.describe_auto_scaling_groups(AutoScalingGroupNames=[as_name])[
-                    "AutoScalingGroups"
-                ]
-            )
-            == 0
-        ):
-            time.sleep(1)
-
+        yield Wait(
+            lambda: self._existing_auto_scaling_groups([as_name]),
+            self.as_backoff,
+            f"auto scaling group {as_name} to be created",
+        )
         logger.info("%s - Created auto scaling %s", self, as_name)
-        open(os.path.join(self._as_path, as_name), "w+").close()
-
         return as_name
 
     def create_launch_config(
@@ -619,15 +2028,11 @@ and start_script as arguments"
             InstanceMonitoring={"Enabled": monitoring},
         )
 
-        while (
-            len(
-                self.as_client.describe_launch_configurations(LaunchConfigurationNames=[lc_name])[
-                    "LaunchConfigurations"
-                ]
-            )
-            == 0
-        ):
-            time.sleep(1)
+        poll(
+            lambda: self._existing_launch_configs([lc_name]),
+            self.as_backoff,
+            f"launch configuration {lc_name} to be created",
+        )
 
         logger.info(
             "%s - Created launch configuration %s with type %s and monitoring %s",
@@ -637,46 +2042,126 @@ and start_script as arguments"
             "enabled" if monitoring else "disabled",
         )
 
-        with open(os.path.join(self._lc_path, lc_name), "w+") as f:
-            f.write(ami_id)
-            f.write("\n")
-            f.write(key_name)
-            f.write("\n")
-            f.write(sg_id)
-            f.write("\n")
-            f.write(itype)
-            f.write("\n")
+        self.state.put(
+            LAUNCH_CONFIG,
+            lc_name,
+            {"ami_id": ami_id, "key_name": key_name, "sg_id": sg_id, "itype": itype},
+        )
 
         return lc_name
 
-    def _delete_launch_configs(self, lc_names: List[str]):
+    def _delete_launch_configs_steps(self, lc_names: List[str]) -> Steps[None]:
+        if not lc_names:
+            return
         for lc_name in lc_names:
             self.as_client.delete_launch_configuration(LaunchConfigurationName=lc_name)
             logger.info("%s - Deleting launch config %s", self, lc_name)
 
-            lc_path = os.path.join(self._lc_path, lc_name)
-            if os.path.isfile(lc_path):
-                os.remove(lc_path)
+            self.state.remove(LAUNCH_CONFIG, lc_name)
 
-        time.sleep(1)
+        yield Wait(
+            lambda: not self._existing_launch_configs(lc_names),
+            self.as_backoff,
+            f"launch configurations {', '.join(lc_names)} to be deleted",
+        )
 
-        while (
-            len(
-                self.as_client.describe_launch_configurations(LaunchConfigurationNames=lc_names)[
-                    "LaunchConfigurations"
-                ]
-            )
-            != 0
-        ):
-            time.sleep(1)
+    def _existing_launch_configs(self, lc_names: List[str]) -> List[str]:
+        """Returns which of lc_names exist, describing only those launch configurations"""
+        existing: List[str] = []
+        paginator = self.as_client.get_paginator("describe_launch_configurations")
+        for chunk in chunks(lc_names, _MAX_AS_NAMES):
+            for page in paginator.paginate(LaunchConfigurationNames=chunk):
+                existing += [lc["LaunchConfigurationName"] for lc in page["LaunchConfigurations"]]
+        return existing
 
     def delete_launch_config(self, lc_name: str):
-        self._delete_launch_configs([lc_name])
+        run_steps(self._delete_launch_configs_steps([lc_name]))
+
+    def delete_all_launch_configs(self, inventory: Optional[Inventory] = None):
+        run_steps(self._delete_launch_configs_steps(self._known_launch_configs(inventory)))
+
+    def _known_launch_configs(self, inventory: Optional[Inventory]) -> List[str]:
+        # Launch configurations cannot be tagged, other than the local state
+        # only the auto scaling groups of the project know about them
+        lc_names = self._known_ids(LAUNCH_CONFIG, inventory)
+        if inventory is not None:
+            for group in inventory.of(AUTO_SCALING):
+                lc_name = group.data.get("lc_name")
+                if lc_name and lc_name not in lc_names:
+                    lc_names.append(lc_name)
+        return lc_names
+
+    def create_launch_template(
+        self,
+        ami_id: str,
+        tcp_ports: Iterator[int] = (8080,),
+        udp_ports: Iterator[int] = tuple(),
+        itype: str = "t2.micro",
+        monitoring: bool = False,
+        start_script_data: Optional[str] = None,
+    ) -> str:
+        """
+        Creates a launch template, the tagged replacement of launch configurations
+        needed for mixed instance types in create_auto_scaling. Returns its id.
+        """
+        import base64
 
-    def delete_all_launch_configs(self):
-        # TODO this doesnt use tags so no external checks (.describe_...()) are done
+        sg_id = self.require_security_group(tcp_ports, udp_ports)
+        lt_name = self._create_random_name()
+        self.require_key_pair()
+        key_name = self._pname  # Same key for whole project
 
-        lc_names = os.listdir(self._lc_path)
-        if len(lc_names) == 0:
-            return
-        self._delete_launch_configs(lc_names)
+        logger.info(
+            "%s - Creating launch template %s with type %s and monitoring %s",
+            self,
+            lt_name,
+            itype,
+            "enabled" if monitoring else "disabled",
+        )
+
+        data: Dict[str, Any] = {
+            "ImageId": ami_id,
+            "KeyName": key_name,
+            "SecurityGroupIds": [sg_id],
+            "InstanceType": itype,
+            "Monitoring": {"Enabled": monitoring},
+            "TagSpecifications": [{"ResourceType": "instance", "Tags": self.tags}],
+        }
+        if start_script_data:
+            data["UserData"] = base64.b64encode(start_script_data.encode()).decode()
+
+        response = self.client.create_launch_template(
+            LaunchTemplateName=lt_name,
+            LaunchTemplateData=data,
+            TagSpecifications=[{"ResourceType": "launch-template", "Tags": self.tags}],
+        )
+        lt_id = response["LaunchTemplate"]["LaunchTemplateId"]
+
+        logger.info("%s - Created launch template %s with id %s", self, lt_name, lt_id)
+        self.state.put(
+            LAUNCH_TEMPLATE,
+            lt_id,
+            {
+                "name": lt_name,
+                "ami_id": ami_id,
+                "key_name": key_name,
+                "sg_id": sg_id,
+                "itype": itype,
+            },
+        )
+        return lt_id
+
+    def delete_launch_template(self, lt_id: str):
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.delete_launch_template(LaunchTemplateId=lt_id)
+            logger.info("%s - Deleted launch template %s", self, lt_id)
+        except ClientError as ce:
+            if ce.response["Error"]["Code"] != "InvalidLaunchTemplateId.NotFound":
+                raise
+        self.state.remove(LAUNCH_TEMPLATE, lt_id)
+
+    def delete_all_launch_templates(self, inventory: Optional[Inventory] = None):
+        for lt_id in self._known_ids(LAUNCH_TEMPLATE, inventory):
+            self.delete_launch_template(lt_id)
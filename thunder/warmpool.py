@@ -0,0 +1,134 @@
+from typing import Optional, Dict, List, Any, Tuple, TYPE_CHECKING
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+
+from .digest import content_digest
+
+if TYPE_CHECKING:
+    from .thunder import Thunder
+
+logger = logging.getLogger("thunder")
+
+# Tag holding the key of the instances waiting in a warm pool
+WARM_POOL_TAG = "thunder_warm_pool"
+
+
+class WarmPool:
+    """
+    Stopped, already booted instances of a project, ready to be started instead
+    of launching new ones. Instances are pooled by a key of their image, type,
+    security group and start script, since the start script already ran on them.
+    The pool lives in the instance tags, so it is shared with other processes
+    and torn down with the rest of the project's instances.
+    """
+
+    size: int
+
+    def __init__(self, thunder: "Thunder", size: int):
+        self.thunder = thunder
+        self.size = size
+        self._lock = threading.Lock()
+        # Refills run one at a time, each one counts what the previous ones left
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._refills: List[Future] = []
+
+    def __repr__(self):
+        return f"WarmPool({self.thunder}, size={self.size})"
+
+    @staticmethod
+    def key(image_id: str, itype: str, sg_id: str, start_script_data: str) -> str:
+        return content_digest([image_id, itype, sg_id, start_script_data])
+
+    def _pooled(self, key: str, states: Tuple[str, ...]) -> List[str]:
+        """Ids of the instances of the pool with the given key in one of states"""
+        filters = [
+            {"Name": f"tag:{WARM_POOL_TAG}", "Values": [key]},
+            {"Name": "instance-state-name", "Values": list(states)},
+        ]
+        return [
+            record.id
+            for record in self.thunder.filter_instances(
+                instance_status=None, custom_filters=filters, warm_pool=True
+            )
+            if record.state in states
+        ]
+
+    def take(self, key: str, count: int) -> List[str]:
+        """
+        Starts up to count stopped instances of the pool with the given key and
+        removes them from it. Returns their ids, without waiting for them.
+        """
+        if count <= 0:
+            return []
+        # Held across processes, so two of them never start the same instances
+        with self.thunder._lock("warm_pool"):
+            ids = self._pooled(key, ("stopped",))[:count]
+            if not ids:
+                return []
+            client = self.thunder.client
+            client.delete_tags(Resources=ids, Tags=[{"Key": WARM_POOL_TAG}])
+            client.start_instances(InstanceIds=ids)
+        logger.info("%s - Started instances %s from the warm pool", self.thunder, ", ".join(ids))
+        return ids
+
+    def fill(
+        self,
+        key: str,
+        image_id: str,
+        start_script_data: str,
+        itype: str,
+        tcp_ports,
+        udp_ports,
+    ) -> List[str]:
+        """
+        Launches instances until the pool with the given key has size of them,
+        waits for them to be ok and stops them. Returns the ids launched.
+        """
+        missing = self.size - len(
+            self._pooled(key, ("pending", "running", "stopping", "stopped"))
+        )
+        if missing <= 0:
+            return []
+        instances = self.thunder._launch_instances(
+            image_id,
+            start_script_data,
+            None,
+            itype,
+            tcp_ports,
+            udp_ports,
+            (missing, missing),
+            tags=[{"Key": WARM_POOL_TAG, "Value": key}],
+        )
+        ids = [instance.id for instance in instances]
+        # Pending instances must be waited for too, they cannot be stopped yet
+        self.thunder.client.get_waiter("instance_status_ok").wait(
+            InstanceIds=ids, IncludeAllInstances=True
+        )
+        self.thunder.client.stop_instances(InstanceIds=ids)
+        logger.info("%s - Added instances %s to the warm pool", self.thunder, ", ".join(ids))
+        return ids
+
+    def refill(self, key: str, *args: Any) -> Future:
+        """Runs fill in the background, see wait()"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1)
+            future = self._executor.submit(self.fill, key, *args)
+            self._refills = [f for f in self._refills if not f.done()] + [future]
+        future.add_done_callback(self._log_error)
+        return future
+
+    def _log_error(self, future: Future):
+        error = future.exception()
+        if error is not None:
+            logger.error("%s - Failed refilling the warm pool: %s", self.thunder, error)
+
+    def wait(self) -> Dict[str, int]:
+        """Waits for the background refills, returns how many succeeded and failed"""
+        with self._lock:
+            refills, self._refills = self._refills, []
+        counts = {"ok": 0, "failed": 0}
+        for future in refills:
+            counts["ok" if future.exception() is None else "failed"] += 1
+        return counts